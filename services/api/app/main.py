@@ -1,16 +1,65 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from mangum import Mangum
+import atexit
 import os
-from app.routers import urls
+import signal
+import sys
+from app.routers import urls, metrics as metrics_router
+from app.services.click_pipeline import click_pipeline, flush_click_pipeline
+from app.services.code_filter import code_filter
+from app.services.trending import save_trending
+from app.storage.base import STORAGE_BACKEND
+from app.utils.dynamodb_client import get_dynamodb, run_blocking
+from app.utils.geolocation import close_geolocator
+from app.utils.logger import RequestContextMiddleware, flush_logs, log_stats
+from app.utils.metrics import METRICS_ENABLED, METRICS_EMF_ENABLED, MetricsMiddleware, emit_emf, metrics, stats_collector
+from app.utils.rate_limiter import RATE_LIMIT_ENABLED, RateLimitMiddleware
+
+IS_LAMBDA = bool(os.environ.get('AWS_LAMBDA_FUNCTION_NAME'))
+# Clicks are tracked off the request path. Lambda freezes the container between
+# invocations; events still queued resume draining in the background of the
+# next invocation, and the SIGTERM hook below (delivered because the image
+# registers the extensions/tinylinker-shutdown extension) flushes them before
+# the container is recycled. Flushing after every invocation is opt-in: it
+# makes every redirect wait for its analytics writes.
+CLICK_FLUSH_EACH_INVOCATION = os.environ.get('CLICK_FLUSH_EACH_INVOCATION', 'false').lower() == 'true'
+
+ENVIRONMENT = os.environ.get('ENVIRONMENT', 'development')
+# Docs and the OpenAPI schema are generated on first request to them; production
+# skips the routes entirely.
+ENABLE_DOCS = os.environ.get('ENABLE_DOCS', str(ENVIRONMENT != 'production')).lower() == 'true'
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Only runs under a server (app.server); Mangum has lifespan="off", and on
+    # Lambda these costs belong to the first request, not to the init phase.
+    if STORAGE_BACKEND == 'dynamodb':
+        # Builds the client and its connection pool before the first request.
+        await run_blocking(get_dynamodb)
+    code_filter.start()
+    yield
+    await click_pipeline.shutdown()
+    save_trending()
+    await close_geolocator()
+    flush_logs()
 
 app = FastAPI(
+    lifespan=lifespan,
     title="TinyLinker API",
-    docs_url="/docs",
-    redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    docs_url="/docs" if ENABLE_DOCS else None,
+    redoc_url="/redoc" if ENABLE_DOCS else None,
+    openapi_url="/openapi.json" if ENABLE_DOCS else None,
+    # JSON bodies are rendered by orjson instead of json.dumps.
+    default_response_class=ORJSONResponse
 )
 
+# Added before CORS so that CORS wraps it and 429 responses still carry CORS headers.
+if RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -19,6 +68,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(RequestContextMiddleware)
+
+# Outermost, so request latency covers the rate limiter and CORS too.
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    # Before the urls router, whose /{short_code} route would otherwise match.
+    app.include_router(metrics_router.router)
+    metrics.register_collector(stats_collector('tinylinker_log_queue', log_stats, "Async log queue"))
+
 app.include_router(urls.router)
 
-handler = Mangum(app, lifespan="off")
+mangum_handler = Mangum(app, lifespan="off")
+
+def handler(event, context):
+    response = mangum_handler(event, context)
+    if CLICK_FLUSH_EACH_INVOCATION:
+        flush_click_pipeline()
+    if METRICS_EMF_ENABLED:
+        emit_emf()
+    # Lambda freezes the container once the handler returns; drain the log
+    # queue first so records aren't held until the next invocation.
+    flush_logs()
+    return response
+
+def _flush_on_sigterm(signum, frame):
+    flush_click_pipeline()
+    save_trending()
+    flush_logs()
+    sys.exit(0)
+
+atexit.register(flush_click_pipeline)
+
+# Lambda only delivers SIGTERM to the runtime when an extension is registered,
+# which the image does; elsewhere the server's own lifespan handles shutdown.
+if IS_LAMBDA:
+    signal.signal(signal.SIGTERM, _flush_on_sigterm)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional, Dict
+from typing import Optional, Dict, Any
+from urllib.parse import quote
 
 class ShortUrl(BaseModel):
     shortCode: str
@@ -30,4 +31,31 @@ class RateLimit(BaseModel):
     identifier: str
     windowStart: int
     requestCount: int = 0
-    expiresAt: int
\ No newline at end of file
+    expiresAt: int
+
+class ResolvedLink:
+    # What a redirect needs from a stored URL, kept in the resolve cache.
+    # Items are validated as ShortUrl when they're written, so reads build
+    # this straight from the item without going through pydantic. The
+    # Location header value is encoded once, here, instead of per redirect.
+    __slots__ = ('short_code', 'original_url', 'expires_at', 'is_safe', 'location')
+
+    def __init__(self, short_code: str, original_url: str, expires_at: Optional[int] = None, is_safe: bool = True):
+        self.short_code = short_code
+        self.original_url = original_url
+        self.expires_at = expires_at
+        self.is_safe = is_safe
+        self.location = quote(original_url, safe=":/%#?=@[]!$&'()*+,;").encode('latin-1')
+
+    @classmethod
+    def from_item(cls, item: Dict[str, Any]) -> "ResolvedLink":
+        expires_at = item.get('expiresAt')
+        return cls(
+            item['shortCode'],
+            item['originalUrl'],
+            int(expires_at) if expires_at is not None else None,
+            item.get('isSafe', True)
+        )
+
+    def is_expired(self, now: int) -> bool:
+        return self.expires_at is not None and self.expires_at <= now
@@ -16,5 +16,24 @@ class CreateShortUrlRequest(BaseModel):
         return value
 
 class AnalyticsQueryParams(BaseModel):
-    timeRange: Optional[str] = Field(None, description="eg., 7d, 30d, 1h")
-    groupBy: Optional[str] = Field(None, pattern="^(hour|day|week|month|country|device|browser)$")
\ No newline at end of file
+    timeRange: Optional[str] = Field(None, pattern="^[1-9][0-9]*[mhdw]$", description="eg., 7d, 30d, 1h")
+    groupBy: Optional[str] = Field(None, pattern="^(hour|day|week|month|country|device|browser)$")
+
+class AnalyticsExportParams(BaseModel):
+    format: str = Field('ndjson', pattern="^(ndjson|csv|parquet)$")
+    from_: Optional[int] = Field(None, alias='from', ge=0, description="Epoch milliseconds, inclusive")
+    to: Optional[int] = Field(None, ge=0, description="Epoch milliseconds, inclusive")
+    after: Optional[int] = Field(None, ge=0, description="Resume after this event timestamp")
+    limit: Optional[int] = Field(None, gt=0)
+
+class UserLinksParams(BaseModel):
+    limit: int = Field(25, ge=1, le=100)
+    cursor: Optional[str] = Field(None, max_length=1024)
+    order: str = Field('desc', pattern="^(asc|desc)$", description="By createdAt; desc is newest first")
+    from_: Optional[int] = Field(None, alias='from', ge=0, description="createdAt lower bound, epoch milliseconds")
+    to: Optional[int] = Field(None, ge=0, description="createdAt upper bound, epoch milliseconds")
+    include: Optional[str] = Field(None, pattern="^clickCount$")
+
+class TrendingParams(BaseModel):
+    window: str = Field('1h', pattern="^(5m|1h|24h)$")
+    limit: int = Field(10, ge=1, le=100)
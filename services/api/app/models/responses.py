@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict
 
 class CreateShortUrlResponse(BaseModel):
@@ -9,6 +9,44 @@ class CreateShortUrlResponse(BaseModel):
     expiresAt: Optional[int] = None
     isSafe: bool = True
 
+class BatchShortUrlResult(BaseModel):
+    index: int
+    status: int
+    result: Optional[CreateShortUrlResponse] = None
+    error: Optional[str] = None
+
+class BatchCreateShortUrlResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchShortUrlResult]
+
+class UserLink(BaseModel):
+    shortCode: str
+    shortUrl: str
+    originalUrl: str
+    createdAt: int
+    expiresAt: Optional[int] = None
+    customAlias: bool = False
+    clickCount: Optional[int] = None
+
+class UserLinksResponse(BaseModel):
+    userId: str
+    links: List[UserLink]
+    nextCursor: Optional[str] = None
+
+class TrendingLink(BaseModel):
+    shortCode: str
+    clicks: int
+    minClicks: int
+
+class TrendingResponse(BaseModel):
+    window: str
+    from_: int = Field(alias='from')
+    to: int
+    totalClicks: int
+    errorBound: int
+    links: List[TrendingLink]
+
 class TimeSeriesData(BaseModel):
     timestamp: str
     clicks: int
@@ -21,6 +59,10 @@ class DeviceData(BaseModel):
     device: str
     clicks: int
 
+class BrowserData(BaseModel):
+    browser: str
+    clicks: int
+
 class ReferrerData(BaseModel):
     referrer: str
     clicks: int
@@ -33,6 +75,7 @@ class AnalyticsResponse(BaseModel):
     clicksByTime: Optional[List[TimeSeriesData]] = None
     clicksByCountry: Optional[List[CountryData]] = None
     clicksByDevice: Optional[List[DeviceData]] = None
+    clicksByBrowser: Optional[List[BrowserData]] = None
     topReferrers: Optional[List[ReferrerData]] = None
 
 class ErrorResponse(BaseModel):
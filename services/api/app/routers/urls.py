@@ -1,10 +1,21 @@
-from fastapi import APIRouter, HTTPException, Request
-from fastapi.responses import RedirectResponse
-from app.models.requests import CreateShortUrlRequest
-from app.models.responses import CreateShortUrlResponse
-from app.services.url_service import create_short_url, get_url_by_code
-from app.services.analytics_service import track_click, increment_click_counter, get_analytics
+import json
+from typing import Annotated, Any, List, Tuple
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from app.models.requests import CreateShortUrlRequest, AnalyticsQueryParams, AnalyticsExportParams, UserLinksParams, TrendingParams
+from app.models.responses import CreateShortUrlResponse, BatchCreateShortUrlResponse, BatchShortUrlResult, UserLinksResponse, TrendingResponse
+from app.services.url_service import (
+    SHORTEN_BATCH_MAX_ITEMS, create_short_url, create_short_urls, get_url_by_code, link_exists,
+    list_user_links, resolve_link
+)
+from app.services.analytics_service import get_analytics, get_time_series_analytics
+from app.services.analytics_export import EXPORT_FORMATS, export_limit, parquet_available, stream_export
+from app.services.click_pipeline import enqueue_click
+from app.services.trending import TRENDING_ENABLED, get_trending
+from app.utils.http_responses import PrebuiltRedirectResponse
 from app.utils.logger import logger
+from app.utils.rate_limiter import charge_rate_limit
 
 router = APIRouter()
 
@@ -18,23 +29,104 @@ async def shorten_url(request:CreateShortUrlRequest):
         result = await create_short_url(request)
         return result
     except ValueError as e:
-        logger.error(f"Validation error: {e}")
+        logger.info("Validation error: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Error creating short URL: {e}")
+        logger.error("Error creating short URL: %s", e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+async def _read_ndjson(request: Request) -> List[Any]:
+    # Parsed line by line as the body streams in; an unparseable line becomes
+    # that item's error rather than failing the batch.
+    entries: List[Any] = []
+    buffer = b""
+
+    def add_line(line: bytes) -> None:
+        if not line.strip():
+            return
+        if len(entries) >= SHORTEN_BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=413, detail=f"Batch exceeds {SHORTEN_BATCH_MAX_ITEMS} items")
+        try:
+            entries.append(json.loads(line))
+        except ValueError as e:
+            entries.append(ValueError(f"Invalid JSON: {e}"))
+
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            add_line(line)
+    add_line(buffer)
+    return entries
+
+async def _read_batch_entries(request: Request) -> List[Any]:
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        return await _read_ndjson(request)
+    try:
+        body = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+    entries = body.get("items") if isinstance(body, dict) else body
+    if not isinstance(entries, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or an object with an 'items' array")
+    if len(entries) > SHORTEN_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {SHORTEN_BATCH_MAX_ITEMS} items")
+    return entries
+
+@router.post("/shorten/batch", response_model=BatchCreateShortUrlResponse)
+async def shorten_batch(request: Request):
+    entries = await _read_batch_entries(request)
+    try:
+        valid: List[Tuple[int, CreateShortUrlRequest]] = []
+        results: List[BatchShortUrlResult] = []
+        for index, entry in enumerate(entries):
+            if isinstance(entry, ValueError):
+                results.append(BatchShortUrlResult(index=index, status=400, error=str(entry)))
+                continue
+            try:
+                valid.append((index, CreateShortUrlRequest.model_validate(entry)))
+            except ValidationError as e:
+                error = e.errors()[0]
+                field = ".".join(str(part) for part in error["loc"]) or "item"
+                results.append(BatchShortUrlResult(index=index, status=400, error=f"{field}: {error['msg']}"))
+
+        # The request itself paid for one link of the batch budget; every
+        # further link costs another, and a batch that doesn't fit what's left
+        # creates nothing. One bigger than the whole budget never will, so
+        # that's a 413 rather than a 429 to retry.
+        decision = await charge_rate_limit(request, len(valid) - 1)
+        if decision is not None and not decision.allowed:
+            if len(valid) > decision.limit:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Batch of {len(valid)} links exceeds the limit of {decision.limit} links per batch"
+                )
+            raise HTTPException(
+                status_code=429,
+                detail=f"Batch of {len(valid)} links exceeds the remaining batch allowance of {decision.remaining + 1}"
+            )
+
+        results.extend(await create_short_urls(valid))
+        results.sort(key=lambda result: result.index)
+        created = sum(1 for result in results if result.status == 201)
+        return BatchCreateShortUrlResponse(created=created, failed=len(results) - created, results=results)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Error creating short URLs in batch: %s", e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @router.get("/preview/{short_code}")
 async def preview_url(short_code: str):
     try:
-        logger.info(f"Preview request for short code: {short_code}")
+        logger.debug("Preview request for %s", short_code)
         url_data = await get_url_by_code(short_code)
 
         if not url_data:
-            logger.warning(f"Short code not found: {short_code}")
+            logger.debug("Short code not found: %s", short_code)
             raise HTTPException(status_code=404, detail="Short URL not found")
 
-        logger.info(f"Preview successful for: {short_code}")
         return {
             "shortCode": short_code,
             "originalUrl": url_data.originalUrl,
@@ -47,48 +139,96 @@ async def preview_url(short_code: str):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting URL preview for {short_code}: {e}")
+        logger.error("Error getting URL preview for %s: %s", short_code, e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@router.get("/users/{user_id}/links", response_model=UserLinksResponse)
+async def get_user_links(user_id: str, params: Annotated[UserLinksParams, Query()]):
+    try:
+        return await list_user_links(
+            user_id,
+            limit=params.limit,
+            cursor=params.cursor,
+            newest_first=params.order == 'desc',
+            start=params.from_,
+            end=params.to,
+            include_clicks=params.include == 'clickCount'
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Error listing links for %s: %s", user_id, e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.get("/trending", response_model=TrendingResponse)
+async def trending_links(params: Annotated[TrendingParams, Query()]):
+    if not TRENDING_ENABLED:
+        raise HTTPException(status_code=501, detail="Trending is disabled")
+    try:
+        return TrendingResponse(**await get_trending(params.window, params.limit))
+    except Exception as e:
+        logger.error("Error getting trending links for %s: %s", params.window, e)
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.get("/analytics/{short_code}/export")
+async def export_url_analytics(short_code: str, params: Annotated[AnalyticsExportParams, Query()]):
+    if params.format == 'parquet' and not parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow")
+    if not await link_exists(short_code):
+        raise HTTPException(status_code=404, detail="Short URL not found")
+
+    start = params.from_
+    if params.after is not None:
+        start = max(start or 0, params.after + 1)
+    limit = export_limit(params.limit)
+    media_type, extension = EXPORT_FORMATS[params.format]
+    headers = {"Content-Disposition": f'attachment; filename="{short_code}-clicks.{extension}"'}
+    if limit is not None:
+        # A full export of `limit` rows may have more behind it; resume with
+        # after=<last timestamp>.
+        headers["X-Export-Limit"] = str(limit)
+    return StreamingResponse(
+        stream_export(short_code, params.format, start, params.to, limit),
+        media_type=media_type,
+        headers=headers
+    )
+
 @router.get("/analytics/{short_code}")
-async def get_url_analytics(short_code: str):
+async def get_url_analytics(short_code: str, params: Annotated[AnalyticsQueryParams, Query()]):
     try:
-        logger.info(f"Analytics request for short code: {short_code}")
+        logger.debug("Analytics request for %s", short_code)
+        if params.timeRange or params.groupBy:
+            return await get_time_series_analytics(short_code, params.timeRange, params.groupBy)
+
         analytics = await get_analytics(short_code)
 
         if "error" in analytics:
-            logger.error(f"Analytics error for {short_code}: {analytics['error']}")
+            logger.error("Analytics error for %s: %s", short_code, analytics['error'])
             raise HTTPException(status_code=500, detail=analytics['error'])
 
-        logger.info(f"Analytics retrieved for {short_code}: {analytics['totalClicks']} clicks")
         return analytics
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error getting analytics for {short_code}: {e}")
+        logger.error("Error getting analytics for %s: %s", short_code, e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
 @router.get("/{short_code}", include_in_schema=False)
 async def redirect_url(short_code: str, request: Request):
     try:
-        logger.info(f"Redirect request for short code: {short_code}")
-        url_data = await get_url_by_code(short_code)
+        link = await resolve_link(short_code)
 
-        if not url_data:
-            logger.warning(f"Short code not found for redirect: {short_code}")
+        if link is None:
+            logger.debug("Short code not found for redirect: %s", short_code)
             raise HTTPException(status_code=404, detail="Short URL not found")
 
-        logger.info(f"Tracking click for: {short_code}")
-        await track_click(short_code, request)
-
-        logger.info(f"Incrementing counter for: {short_code}")
-        await increment_click_counter(short_code)
+        await enqueue_click(short_code, request)
 
-        logger.info(f"Redirecting {short_code} to: {url_data.originalUrl}")
-        return RedirectResponse(url=url_data.originalUrl, status_code=307)
+        logger.debug("Redirecting %s to %s", short_code, link.original_url)
+        return PrebuiltRedirectResponse(link.location)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error redirecting {short_code}: {e}")
+        logger.error("Error redirecting %s: %s", short_code, e)
         raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
@@ -0,0 +1,50 @@
+import os
+import uvicorn
+from app.utils.logger import logger
+from app.utils.shared_link_table import SharedLinkTable
+
+# Runs the app under uvicorn on our own hosts, as an alternative to the
+# Lambda handler in app.main:
+#
+#   python -m app.server
+#
+# The parent process owns the shared hot link table: it creates the segment
+# before starting the workers and removes it once they have all exited.
+SERVER_HOST = os.environ.get('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.environ.get('SERVER_PORT', '8000'))
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', str(os.cpu_count() or 1)))
+SERVER_ACCESS_LOG = os.environ.get('SERVER_ACCESS_LOG', 'false').lower() == 'true'
+SERVER_GRACEFUL_TIMEOUT = float(os.environ.get('SERVER_GRACEFUL_TIMEOUT', '10'))
+# Load balancers whose X-Forwarded-For is trusted for client addresses.
+SERVER_FORWARDED_ALLOW_IPS = os.environ.get('SERVER_FORWARDED_ALLOW_IPS', '127.0.0.1')
+# 0 disables the shared table; workers then each keep their own cache.
+HOT_LINK_TABLE_SLOTS = int(os.environ.get('HOT_LINK_TABLE_SLOTS', '65536'))
+HOT_LINK_TABLE_SLOT_BYTES = int(os.environ.get('HOT_LINK_TABLE_SLOT_BYTES', '512'))
+
+def main() -> None:
+    table = None
+    if HOT_LINK_TABLE_SLOTS:
+        table = SharedLinkTable.create(f"tinylinker-links-{os.getpid()}", HOT_LINK_TABLE_SLOTS, HOT_LINK_TABLE_SLOT_BYTES)
+        # Workers are spawned rather than forked, so they find the segment
+        # through the environment they inherit.
+        os.environ['HOT_LINK_TABLE_NAME'] = table.name
+        logger.info("Created hot link table %s: %d slots, %d bytes", table.name, table.slots, table.stats()["bytes"])
+    try:
+        uvicorn.run(
+            "app.main:app",
+            host=SERVER_HOST,
+            port=SERVER_PORT,
+            workers=SERVER_WORKERS,
+            lifespan="on",
+            access_log=SERVER_ACCESS_LOG,
+            proxy_headers=True,
+            forwarded_allow_ips=SERVER_FORWARDED_ALLOW_IPS,
+            timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT
+        )
+    finally:
+        if table is not None:
+            table.close()
+            table.unlink()
+
+if __name__ == "__main__":
+    main()
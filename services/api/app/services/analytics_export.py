@@ -0,0 +1,137 @@
+import csv
+import io
+import json
+import os
+from typing import Optional, Dict, Any, List, AsyncIterator
+from app.storage.base import get_storage
+from app.utils.logger import logger
+
+ANALYTICS_EXPORT_PAGE_SIZE = int(os.environ.get('ANALYTICS_EXPORT_PAGE_SIZE', '1000'))
+ANALYTICS_EXPORT_ROW_GROUP_SIZE = int(os.environ.get('ANALYTICS_EXPORT_ROW_GROUP_SIZE', '10000'))
+# Lambda buffers the whole response (and caps it at 6MB), so exports there are
+# cut into resumable pieces; a streaming server can send everything at once.
+ANALYTICS_EXPORT_MAX_EVENTS = int(os.environ.get(
+    'ANALYTICS_EXPORT_MAX_EVENTS', '20000' if os.environ.get('AWS_LAMBDA_FUNCTION_NAME') else '0'
+))
+
+EXPORT_FIELDS = ['shortCode', 'timestamp', 'country', 'region', 'city', 'device', 'browser', 'os', 'referrer', 'ipHash']
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+storage = get_storage()
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def export_limit(limit: Optional[int]) -> Optional[int]:
+    if ANALYTICS_EXPORT_MAX_EVENTS and (limit is None or limit > ANALYTICS_EXPORT_MAX_EVENTS):
+        return ANALYTICS_EXPORT_MAX_EVENTS
+    return limit
+
+async def iter_export_pages(
+    short_code: str, start: Optional[int], end: Optional[int], limit: Optional[int]
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    # Oldest first, so the last timestamp received is a cursor: passing it
+    # back as `after` resumes exactly where an export stopped.
+    async for page in storage.aiter_event_pages(
+        short_code, start=start, end=end, projection=EXPORT_FIELDS,
+        limit=limit, page_size=ANALYTICS_EXPORT_PAGE_SIZE
+    ):
+        for item in page:
+            item['timestamp'] = int(item['timestamp'])
+        yield page
+
+async def encode_ndjson(pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    async for page in pages:
+        yield ''.join(json.dumps(item, separators=(',', ':'), default=str) + '\n' for item in page).encode()
+
+async def encode_csv(pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    async for page in pages:
+        writer.writerows(page)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+class _ChunkSink:
+    # Write-only file for ParquetWriter that hands back whatever was written
+    # since the last drain, so encoded row groups leave memory as they're sent.
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+async def encode_parquet(pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        (name, pa.int64() if name == 'timestamp' else pa.string()) for name in EXPORT_FIELDS
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    rows: List[Dict[str, Any]] = []
+    try:
+        async for page in pages:
+            rows.extend(page)
+            if len(rows) >= ANALYTICS_EXPORT_ROW_GROUP_SIZE:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                rows = []
+                yield sink.drain()
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+    finally:
+        writer.close()
+    yield sink.drain()
+
+ENCODERS = {
+    'ndjson': encode_ndjson,
+    'csv': encode_csv,
+    'parquet': encode_parquet
+}
+
+async def stream_export(
+    short_code: str, export_format: str, start: Optional[int] = None,
+    end: Optional[int] = None, limit: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    logger.debug("Exporting %s analytics for %s", export_format, short_code)
+    try:
+        async for chunk in ENCODERS[export_format](iter_export_pages(short_code, start, end, limit)):
+            if chunk:
+                yield chunk
+    except Exception as e:
+        # Headers are already sent; all that's left is to end the stream early.
+        logger.error("Error exporting analytics for %s: %s", short_code, e)
+        raise
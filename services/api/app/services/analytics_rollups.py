@@ -0,0 +1,260 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urlsplit
+from app.storage.base import StorageBackend, get_storage
+from app.utils.time_utils import get_day_boundary, add_days
+from app.utils.logger import logger
+from app.utils.metrics import metrics, stats_collector, timed
+
+ROLLUP_FLUSH_INTERVAL = float(os.environ.get('ROLLUP_FLUSH_INTERVAL', '5.0'))
+ROLLUP_MAX_PENDING = int(os.environ.get('ROLLUP_MAX_PENDING', '1000'))
+ROLLUP_RETENTION_DAYS = int(os.environ.get('ROLLUP_RETENTION_DAYS', '90'))
+RECENT_CLICKS_SIZE = int(os.environ.get('RECENT_CLICKS_SIZE', '10'))
+RECENT_CLICKS_MAX_CODES = int(os.environ.get('RECENT_CLICKS_MAX_CODES', '10000'))
+# Distinct values kept per dimension on one rollup item; the rest are counted
+# under OTHER_VALUE so clients can't grow the item towards DynamoDB's 400KB cap.
+ROLLUP_MAX_VALUES = int(os.environ.get('ROLLUP_MAX_VALUES', '25'))
+ROLLUP_MAX_TRACKED_ITEMS = int(os.environ.get('ROLLUP_MAX_TRACKED_ITEMS', '10000'))
+
+# Rollups share the analytics table: daily counters live under
+# "<shortCode>#rollup" with the day start as the sort key, and the recent-click
+# ring under "<shortCode>#recent". One item per day keeps a link's retained
+# history to ROLLUP_RETENTION_DAYS items per read; hourly items written before
+# are still summed until their TTL removes them. Dimension counters are
+# flattened into top-level number attributes ("c:<country>", "d:<device>", ...)
+# so a single counter update can add all of them.
+ROLLUP_SUFFIX = '#rollup'
+RECENT_SUFFIX = '#recent'
+DIMENSIONS = {
+    'country': 'c:',
+    'device': 'd:',
+    'browser': 'b:',
+    'referrer': 'r:'
+}
+PREFIX_FIELDS = {prefix: field for field, prefix in DIMENSIONS.items()}
+OTHER_VALUE = '(other)'
+MAX_VALUE_LENGTH = 64
+RECENT_FIELDS = ('timestamp', 'country', 'city', 'device', 'browser', 'os', 'referrer')
+
+def rollup_key(short_code: str) -> str:
+    return f"{short_code}{ROLLUP_SUFFIX}"
+
+def recent_key(short_code: str) -> str:
+    return f"{short_code}{RECENT_SUFFIX}"
+
+def referrer_host(referrer: str) -> str:
+    # Rollups count referring sites, not the full header the client sent.
+    if not referrer or referrer == 'direct':
+        return 'direct'
+    try:
+        host = urlsplit(referrer).hostname
+    except ValueError:
+        host = None
+    return host[:MAX_VALUE_LENGTH] if host else OTHER_VALUE
+
+def dimension_value(event: Dict[str, Any], field: str) -> str:
+    if field == 'referrer':
+        return referrer_host(event[field])
+    return str(event[field])[:MAX_VALUE_LENGTH]
+
+class RecentClicks:
+    def __init__(self, capacity: int = RECENT_CLICKS_SIZE):
+        self.capacity = capacity
+        self._slots: List[Optional[Dict[str, Any]]] = [None] * capacity
+        self._head = 0
+        self._size = 0
+
+    def append(self, click: Dict[str, Any]) -> None:
+        self._slots[self._head] = click
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def items(self) -> List[Dict[str, Any]]:
+        # Newest first.
+        return [self._slots[(self._head - 1 - i) % self.capacity] for i in range(self._size)]
+
+class RollupAggregator:
+    def __init__(
+        self, storage: StorageBackend, flush_interval: float = ROLLUP_FLUSH_INTERVAL,
+        max_pending: int = ROLLUP_MAX_PENDING
+    ):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[Tuple[str, int], Dict[str, int]] = {}
+        self._recent: "OrderedDict[str, RecentClicks]" = OrderedDict()
+        self._dirty_recent: set = set()
+        # Dimension values already written per (code, day), so later flushes
+        # keep adding to them while new values beyond the cap go to OTHER_VALUE.
+        # Each process tracks its own, which bounds an item by the number of
+        # writers times ROLLUP_MAX_VALUES.
+        self._admitted: "OrderedDict[Tuple[str, int], Dict[str, set]]" = OrderedDict()
+        self._window_start: Optional[float] = None
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.failed = 0
+
+    def add(self, event: Dict[str, Any]) -> None:
+        short_code = event['shortCode']
+        day = get_day_boundary(event['timestamp'])
+        with self._lock:
+            if not self._pending:
+                self._window_start = time.monotonic()
+            counters = self._pending.setdefault((short_code, day), {})
+            counters['clicks'] = counters.get('clicks', 0) + 1
+            for field, prefix in DIMENSIONS.items():
+                name = prefix + dimension_value(event, field)
+                counters[name] = counters.get(name, 0) + 1
+
+            ring = self._recent.get(short_code)
+            if ring is None:
+                ring = self._recent[short_code] = RecentClicks()
+                if len(self._recent) > RECENT_CLICKS_MAX_CODES:
+                    evicted, _ = self._recent.popitem(last=False)
+                    self._dirty_recent.discard(evicted)
+            else:
+                self._recent.move_to_end(short_code)
+            ring.append({field: event[field] for field in RECENT_FIELDS})
+            self._dirty_recent.add(short_code)
+
+    def due(self) -> bool:
+        with self._lock:
+            if not self._pending:
+                return False
+            return len(self._pending) >= self.max_pending or time.monotonic() - self._window_start >= self.flush_interval
+
+    def flush(self, force: bool = True) -> Dict[str, int]:
+        if not force and not self.due():
+            return {"updates": 0, "failed": 0}
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._window_start = None
+            recent = {code: self._recent[code].items() for code in self._dirty_recent if code in self._recent}
+            self._dirty_recent = set()
+
+        updates = 0
+        failed = 0
+        for (short_code, day), counters in pending.items():
+            counters = self._cap_values((short_code, day), counters)
+            unwritten = self._write_rollup(short_code, day, counters)
+            if not unwritten:
+                updates += 1
+                continue
+            # Put back whatever didn't reach the table so the next flush retries it.
+            failed += 1
+            with self._lock:
+                if not self._pending:
+                    self._window_start = time.monotonic()
+                retry = self._pending.setdefault((short_code, day), {})
+                for name in unwritten:
+                    retry[name] = retry.get(name, 0) + counters[name]
+        for short_code, clicks in recent.items():
+            if self._write_recent(short_code, clicks):
+                updates += 1
+                continue
+            # The ring is still in memory; mark it so the next flush writes it.
+            failed += 1
+            with self._lock:
+                if short_code in self._recent:
+                    self._dirty_recent.add(short_code)
+
+        self.updates += updates
+        self.failed += failed
+        logger.debug("Rollup flush: %d updates, %d failed", updates, failed)
+        return {"updates": updates, "failed": failed}
+
+    def _cap_values(self, key: Tuple[str, int], counters: Dict[str, int]) -> Dict[str, int]:
+        # Values seen before stay; new ones are admitted busiest first while
+        # the dimension has room, and the rest fold into OTHER_VALUE.
+        with self._lock:
+            admitted = self._admitted.get(key)
+            if admitted is None:
+                admitted = self._admitted[key] = {prefix: set() for prefix in PREFIX_FIELDS}
+                if len(self._admitted) > ROLLUP_MAX_TRACKED_ITEMS:
+                    self._admitted.popitem(last=False)
+            else:
+                self._admitted.move_to_end(key)
+            capped: Dict[str, int] = {}
+            for name, value in sorted(counters.items(), key=lambda item: item[1], reverse=True):
+                values = admitted.get(name[:2])
+                if values is not None and name not in values:
+                    if len(values) < ROLLUP_MAX_VALUES:
+                        values.add(name)
+                    else:
+                        name = name[:2] + OTHER_VALUE
+                capped[name] = capped.get(name, 0) + value
+        return capped
+
+    def _write_rollup(self, short_code: str, day: int, counters: Dict[str, int]) -> List[str]:
+        # The storage layer only handles ClientError; a timeout or connection
+        # error leaves the whole rollup unwritten rather than ending the flush.
+        try:
+            with timed('storage.add_event_counters'):
+                return self.storage.add_event_counters(
+                    rollup_key(short_code), day, counters, add_days(day, ROLLUP_RETENTION_DAYS)
+                )
+        except Exception as e:
+            logger.error("Error writing rollup for %s: %s", short_code, e)
+            return list(counters)
+
+    def _write_recent(self, short_code: str, clicks: List[Dict[str, Any]]) -> bool:
+        # Last writer wins, unless another worker already stored newer clicks.
+        item = {'shortCode': recent_key(short_code), 'timestamp': 0, 'clicks': clicks, 'newest': clicks[0]['timestamp']}
+        try:
+            with timed('storage.put_event_if_newer'):
+                written = self.storage.put_event_if_newer(item, 'newest')
+        except Exception as e:
+            logger.error("Error updating recent clicks for %s: %s", short_code, e)
+            return False
+        if written is None:
+            logger.error("Error updating recent clicks for %s", short_code)
+            return False
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "updates": self.updates,
+            "failed": self.failed,
+            "pending": pending
+        }
+
+async def read_rollups(short_code: str) -> Optional[Dict[str, Any]]:
+    totals: Dict[str, Dict[str, int]] = {field: {} for field in DIMENSIONS}
+    total_clicks = 0
+    found = False
+    storage = get_storage()
+    async for item in storage.aiter_events(rollup_key(short_code)):
+        found = True
+        total_clicks += int(item.get('clicks', 0))
+        for name, value in item.items():
+            field = PREFIX_FIELDS.get(name[:2])
+            if field is not None:
+                bucket = totals[field]
+                bucket[name[2:]] = bucket.get(name[2:], 0) + int(value)
+
+    if not found:
+        return None
+
+    recent = await storage.aget_event(recent_key(short_code), 0)
+    recent_clicks = [
+        {field: (int(click[field]) if field == 'timestamp' else click[field]) for field in RECENT_FIELDS}
+        for click in (recent or {}).get('clicks', [])
+    ]
+
+    return {
+        "shortCode": short_code,
+        "totalClicks": total_clicks,
+        "clicksByCountry": totals['country'],
+        "clicksByDevice": totals['device'],
+        "clicksByBrowser": totals['browser'],
+        "clicksByReferrer": totals['referrer'],
+        "recentClicks": recent_clicks
+    }
+
+rollup_aggregator = RollupAggregator(get_storage())
+metrics.register_collector(stats_collector('tinylinker_rollups', rollup_aggregator.stats, "Daily rollup aggregator"))
@@ -1,75 +1,81 @@
-import httpx
+import os
+from array import array
 from typing import Optional, Dict, Any, List
 from fastapi import Request
 from collections import Counter
 from app.models.database import analyticsEvent
-from app.utils.dynamodb_client import ANALYTICS_TABLE, URLS_TABLE, put_item, increment_counter, query_items
+from app.models.responses import (
+    AnalyticsResponse, TimeSeriesData, CountryData, DeviceData, BrowserData, ReferrerData
+)
+from app.services.analytics_rollups import RecentClicks, RECENT_FIELDS, rollup_aggregator, read_rollups
+from app.services.trending import record_trending_click
+from app.storage.base import get_storage
+from app.utils.dynamodb_client import BatchWriter, CounterAggregator, run_blocking
+from app.utils.geolocation import get_geolocator
 from app.utils.hashing import hash_ip
+from app.utils.hyperloglog import HyperLogLog
 from app.utils.user_agent_parser import parse_user_agent
-from app.utils.time_utils import get_current_timestamp, add_days
+from app.utils.time_utils import (
+    get_current_timestamp, add_days, parse_time_range, bucket_timestamps, to_iso, DAY_MS
+)
 from app.utils.logger import logger
-from boto3.dynamodb.conditions import Key
+from app.utils.metrics import metrics, stats_collector, timed
 
-async def get_geolocation(ip: str) -> Dict[str, str]:
-    ip_hash = hash_ip(ip)
-    logger.info(f"Getting geolocation for IP hash: {ip_hash[:16]}...")
-    if ip.startswith(('127.', '10.', '172.', '192.168.', '::1', 'localhost')):
-        logger.info(f"Private/local IP detected: {ip_hash[:16]}...")
-        return {
-            "country": "Unknown",
-            "region": "Unknown",
-            "city": "Unknown"
-        }
+ANALYTICS_BATCH_MAX_DELAY = float(os.environ.get('ANALYTICS_BATCH_MAX_DELAY', '1.0'))
+CLICK_COUNTER_FLUSH_INTERVAL = float(os.environ.get('CLICK_COUNTER_FLUSH_INTERVAL', '1.0'))
+CLICK_COUNTER_MAX_PENDING = int(os.environ.get('CLICK_COUNTER_MAX_PENDING', '1000'))
+DEFAULT_ANALYTICS_TIME_RANGE = os.environ.get('DEFAULT_ANALYTICS_TIME_RANGE', '7d')
 
-    try:
-        async with httpx.AsyncClient(timeout=2.0) as client:
-            response = await client.get(f"http://ip-api.com/json/{ip}")
-            logger.info(f"IP geolocation API response status: {response.status_code}")
-
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"API response data: {data}")
-                if data.get("status") == "success":
-                    logger.info(f"Geolocation retrieved successfully for: {ip_hash[:16]}...")
-                    return {
-                        "country": data.get("country", "Unknown"),
-                        "region": data.get("regionName", "Unknown"),
-                        "city": data.get("city", "Unknown")
-                    }
-                else:
-                    logger.warning(f"API returned non-success status: {data.get('status')} - {data.get('message', 'No message')}")
-    except Exception as e:
-        logger.error(f"Error getting geolocation for {ip_hash[:16]}...: {e}")
+TIME_GROUPS = ('hour', 'day', 'week', 'month')
+
+storage = get_storage()
 
-    logger.warning(f"Returning unknown geolocation for: {ip_hash[:16]}...")
-    return {
-        "country": "Unknown",
-        "region": "Unknown",
-        "city": "Unknown"
-    }
+analytics_writer = BatchWriter(
+    storage.write_events,
+    key_names=('shortCode', 'timestamp'),
+    max_delay=ANALYTICS_BATCH_MAX_DELAY
+)
+
+click_counter = CounterAggregator(
+    storage.add_clicks,
+    flush_interval=CLICK_COUNTER_FLUSH_INTERVAL,
+    max_pending=CLICK_COUNTER_MAX_PENDING
+)
+metrics.register_collector(stats_collector('tinylinker_analytics_writer', analytics_writer.stats, "Click event batch writer"))
+metrics.register_collector(stats_collector('tinylinker_click_counter', click_counter.stats, "Click count aggregator"))
+
+async def get_geolocation(ip: str) -> Dict[str, str]:
+    with timed('geolocation'):
+        location = await get_geolocator().lookup(ip)
+    return location
 
 async def track_click(short_code: str, request: Request) -> bool:
-    logger.info(f"Tracking click for short code: {short_code}")
+    ip = request.client.host if request.client else "unknown"
+    user_agent = request.headers.get("user-agent", "")
+    referrer = request.headers.get("referer", "direct")
+    return await record_click(short_code, ip, user_agent, referrer)
+
+async def record_click(
+    short_code: str, ip: str, user_agent: str, referrer: str,
+    timestamp: Optional[int] = None
+) -> bool:
+    logger.debug("Tracking click for %s", short_code)
     try:
-        ip = request.client.host if request.client else "unknown"
-        ip_hash = hash_ip(ip)
-        logger.info(f"Client IP hash: {ip_hash[:16]}...")
+        with timed('hash_ip'):
+            ip_hash = hash_ip(ip)
 
         geo = await get_geolocation(ip)
 
-        user_agent = request.headers.get("user-agent", "")
-        device_info = parse_user_agent(user_agent)
-        logger.info(f"Device info: {device_info['device']}, Browser: {device_info['browser']}")
+        with timed('user_agent'):
+            device_info = parse_user_agent(user_agent)
 
-        referrer = request.headers.get("referer", "direct")
-        logger.info(f"Referrer: {referrer}")
-
-        timestamp = get_current_timestamp()
+        if timestamp is None:
+            timestamp = get_current_timestamp()
 
         event = analyticsEvent(
             shortCode=short_code,
             timestamp=timestamp,
-            ipHash=hash_ip(ip),
+            ipHash=ip_hash,
             country=geo["country"],
             region=geo["region"],
             city=geo["city"],
@@ -80,66 +86,77 @@ async def track_click(short_code: str, request: Request) -> bool:
             expiresAt=add_days(timestamp, 15)
         )
 
-        logger.info(f"Saving analytics event to DynamoDB for: {short_code}")
-        success = put_item(ANALYTICS_TABLE, event.model_dump())
-
-        if success:
-            logger.info(f"Click tracked successfully for: {short_code}")
-        else:
-            logger.error(f"Failed to save analytics event for: {short_code}")
+        item = event.model_dump()
+        analytics_writer.add(item)
+        rollup_aggregator.add(item)
+        if analytics_writer.due():
+            await flush_analytics_events()
 
-        return success
+        logger.debug("Click tracked for %s", short_code, extra={"country": geo["country"], "device": device_info["device"], "browser": device_info["browser"]})
+        return True
 
     except Exception as e:
-        logger.error(f"Error tracking click for {short_code}: {e}")
+        logger.error("Error tracking click for %s: %s", short_code, e)
         return False
 
-async def increment_click_counter(short_code: str) -> bool:
-    logger.info(f"Incrementing click counter for: {short_code}")
+async def flush_analytics_events(force: bool = False) -> Dict[str, int]:
+    # Forced flushes happen at shutdown, when the interpreter may no longer hand
+    # out worker threads; routine flushes keep retry sleeps off the event loop.
+    if force:
+        return analytics_writer.flush(force)
+    return await run_blocking(analytics_writer.flush, force)
+
+async def flush_analytics_rollups(force: bool = False) -> Dict[str, int]:
+    if force:
+        return rollup_aggregator.flush(force)
+    return await run_blocking(rollup_aggregator.flush, force)
+
+async def increment_click_counter(short_code: str, timestamp: Optional[int] = None) -> bool:
+    logger.debug("Incrementing click counter for %s", short_code)
     try:
-        result = increment_counter(
-            URLS_TABLE,
-            {'shortCode': short_code},
-            'clickCount'
-        )
-        if result is not None:
-            logger.info(f"Click counter incremented to {result} for: {short_code}")
-            return True
-        else:
-            logger.error(f"Failed to increment click counter for: {short_code}")
-            return False
+        if timestamp is None:
+            timestamp = get_current_timestamp()
+        click_counter.add(short_code, timestamp=timestamp)
+        record_trending_click(short_code, timestamp)
+        if click_counter.due():
+            await flush_click_counters()
+        return True
     except Exception as e:
-        logger.error(f"Error incrementing click counter for {short_code}: {e}")
+        logger.error("Error incrementing click counter for %s: %s", short_code, e)
         return False
 
+async def flush_click_counters(force: bool = False) -> Dict[str, int]:
+    if force:
+        return click_counter.flush(force)
+    return await run_blocking(click_counter.flush, force)
+
 async def get_analytics(short_code: str) -> Dict[str, Any]:
-    logger.info(f"Fetching analytics for short code: {short_code}")
+    logger.debug("Fetching analytics for %s", short_code)
     try:
-        items = query_items(
-            ANALYTICS_TABLE,
-            'shortCode = :code',
-            {':code': short_code}
-        )
-
-        if not items:
-            logger.info(f"No analytics data found for: {short_code}")
-            return {
-                "shortCode": short_code,
-                'totalClicks': 0,
-                'clicksByCountry': {},
-                "clicksByDevice": {},
-                "clicksByBrowser": {},
-                "clicksByReferrer": {},
-                "recentClicks": []
-            }
+        rollups = await read_rollups(short_code)
+        if rollups is not None:
+            logger.debug("Analytics read from rollups for %s", short_code)
+            return rollups
+
+        # Links clicked before rollups existed only have raw events; stream
+        # them in timestamp order so the ring ends up holding the newest.
+        total_clicks = 0
+        countries = Counter()
+        devices = Counter()
+        browsers = Counter()
+        referrers = Counter()
+        recent = RecentClicks()
+        async for item in storage.aiter_events(short_code, projection=list(RECENT_FIELDS)):
+            total_clicks += 1
+            countries[item['country']] += 1
+            devices[item['device']] += 1
+            browsers[item['browser']] += 1
+            referrers[item['referrer']] += 1
+            recent.append(item)
+
+        if not total_clicks:
+            logger.debug("No analytics data found for %s", short_code)
 
-        logger.info(f"Processing {len(items)} analytics events for: {short_code}")
-        countries = Counter(item['country'] for item in items)
-        devices = Counter(item['device'] for item in items)
-        browsers = Counter(item['browser'] for item in items)
-        referrers = Counter(item['referrer'] for item in items)
-
-        recent = sorted(items, key=lambda x: x['timestamp'], reverse=True)[:10]
         recent_clicks = [
             {
                 "timestamp": item['timestamp'],
@@ -150,13 +167,13 @@ async def get_analytics(short_code: str) -> Dict[str, Any]:
                 "os": item['os'],
                 'referrer': item['referrer']
             }
-            for item in recent
+            for item in recent.items()
         ]
 
-        logger.info(f"Analytics aggregated successfully for: {short_code}")
+        logger.debug("Analytics aggregated for %s", short_code)
         return {
             "shortCode": short_code,
-            "totalClicks": len(items),
+            "totalClicks": total_clicks,
             "clicksByCountry": dict(countries),
             "clicksByDevice": dict(devices),
             "clicksByBrowser": dict(browsers),
@@ -164,9 +181,64 @@ async def get_analytics(short_code: str) -> Dict[str, Any]:
             "recentClicks": recent_clicks
         }
     except Exception as e:
-        logger.error(f"Error getting analytics for {short_code}: {e}")
+        logger.error("Error getting analytics for %s: %s", short_code, e)
         return {
             "shortCode": short_code,
             "totalClicks": 0,
             "error": str(e)
-        }
\ No newline at end of file
+        }
+
+async def get_time_series_analytics(
+    short_code: str, time_range: Optional[str] = None, group_by: Optional[str] = None
+) -> AnalyticsResponse:
+    end = get_current_timestamp()
+    start = end - parse_time_range(time_range or DEFAULT_ANALYTICS_TIME_RANGE)
+    logger.debug("Fetching analytics for %s between %s and %s", short_code, start, end)
+
+    # With no groupBy every breakdown is returned, with time buckets sized to the range.
+    time_group = group_by if group_by in TIME_GROUPS else None
+    if group_by is None:
+        time_group = 'hour' if end - start <= 2 * DAY_MS else 'day'
+
+    timestamps = array('q')
+    countries = Counter()
+    devices = Counter()
+    browsers = Counter()
+    referrers = Counter()
+    unique_ips = HyperLogLog()
+
+    async for item in storage.aiter_events(
+        short_code, start=start, end=end,
+        projection=['timestamp', 'ipHash', 'country', 'device', 'browser', 'referrer']
+    ):
+        timestamps.append(int(item['timestamp']))
+        countries[item['country']] += 1
+        devices[item['device']] += 1
+        browsers[item['browser']] += 1
+        referrers[item['referrer']] += 1
+        unique_ips.add_hex(item['ipHash'])
+
+    response = AnalyticsResponse(
+        shortCode=short_code,
+        totalClicks=len(timestamps),
+        uniqueIPs=unique_ips.count() if timestamps else 0,
+        timeRange={"start": start, "end": end},
+        topReferrers=[
+            ReferrerData(referrer=referrer, clicks=clicks)
+            for referrer, clicks in referrers.most_common(10)
+        ]
+    )
+    if time_group:
+        response.clicksByTime = [
+            TimeSeriesData(timestamp=to_iso(bucket), clicks=clicks)
+            for bucket, clicks in bucket_timestamps(timestamps, time_group)
+        ]
+    if group_by in (None, 'country'):
+        response.clicksByCountry = [CountryData(country=k, clicks=v) for k, v in countries.most_common()]
+    if group_by in (None, 'device'):
+        response.clicksByDevice = [DeviceData(device=k, clicks=v) for k, v in devices.most_common()]
+    if group_by in (None, 'browser'):
+        response.clicksByBrowser = [BrowserData(browser=k, clicks=v) for k, v in browsers.most_common()]
+
+    logger.debug("Time-bucketed analytics computed for %s: %d clicks", short_code, len(timestamps))
+    return response
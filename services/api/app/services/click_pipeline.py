@@ -0,0 +1,197 @@
+import asyncio
+import contextvars
+import os
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Callable, Awaitable
+from fastapi import Request
+from app.services.analytics_service import (
+    record_click, increment_click_counter,
+    flush_analytics_events, flush_analytics_rollups, flush_click_counters
+)
+from app.services.trending import checkpoint_trending
+from app.utils.time_utils import get_current_timestamp
+from app.utils.logger import logger
+from app.utils.metrics import metrics, stats_collector
+
+OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest', 'block')
+
+CLICK_QUEUE_MAX_SIZE = int(os.environ.get('CLICK_QUEUE_MAX_SIZE', '10000'))
+CLICK_QUEUE_OVERFLOW_POLICY = os.environ.get('CLICK_QUEUE_OVERFLOW_POLICY', 'drop_oldest')
+CLICK_QUEUE_WORKERS = int(os.environ.get('CLICK_QUEUE_WORKERS', '4'))
+CLICK_QUEUE_FLUSH_TIMEOUT = float(os.environ.get('CLICK_QUEUE_FLUSH_TIMEOUT', '5.0'))
+CLICK_QUEUE_FLUSH_INTERVAL = float(os.environ.get('CLICK_QUEUE_FLUSH_INTERVAL', '0.5'))
+
+@dataclass
+class ClickEvent:
+    short_code: str
+    ip: str
+    user_agent: str
+    referrer: str
+    timestamp: int
+
+async def process_click(event: ClickEvent) -> None:
+    await record_click(event.short_code, event.ip, event.user_agent, event.referrer, event.timestamp)
+    await increment_click_counter(event.short_code, event.timestamp)
+
+async def flush_click_writes(force: bool) -> None:
+    await flush_analytics_events(force)
+    await flush_click_counters(force)
+    await flush_analytics_rollups(force)
+    await checkpoint_trending(force)
+
+class ClickPipeline:
+    def __init__(
+        self, handler: Callable[[ClickEvent], Awaitable[None]],
+        max_size: int = CLICK_QUEUE_MAX_SIZE,
+        overflow_policy: str = CLICK_QUEUE_OVERFLOW_POLICY,
+        workers: int = CLICK_QUEUE_WORKERS,
+        flush_hook: Optional[Callable[[bool], Awaitable[None]]] = None,
+        flush_interval: float = CLICK_QUEUE_FLUSH_INTERVAL
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}', expected one of {OVERFLOW_POLICIES}")
+        self.handler = handler
+        self.max_size = max_size
+        self.overflow_policy = overflow_policy
+        self.workers = max(1, workers)
+        self.flush_hook = flush_hook
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+        self._ticker_task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self._outstanding = 0
+
+    def _bind(self) -> asyncio.Queue:
+        # The queue and its workers belong to the running loop. Mangum reuses one
+        # loop across invocations, but a new loop (tests, server reloads) gets a
+        # fresh queue with any events still pending on the old one carried over.
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            pending = []
+            if self._queue is not None:
+                while not self._queue.empty():
+                    pending.append(self._queue.get_nowait())
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._loop = loop
+            self._tasks = []
+            self._ticker_task = None
+            for event in pending[-self.max_size:]:
+                self._queue.put_nowait(event)
+            self._outstanding = self._queue.qsize()
+        # Long-lived tasks get an empty context rather than a copy of the
+        # request that happened to start them (and its logging fields).
+        if len(self._tasks) < self.workers or any(task.done() for task in self._tasks):
+            self._tasks = [task for task in self._tasks if not task.done()]
+            while len(self._tasks) < self.workers:
+                self._tasks.append(loop.create_task(self._worker(), context=contextvars.Context()))
+        if self.flush_hook is not None and (self._ticker_task is None or self._ticker_task.done()):
+            self._ticker_task = loop.create_task(self._ticker(), context=contextvars.Context())
+        return self._queue
+
+    async def enqueue(self, event: ClickEvent) -> bool:
+        queue = self._bind()
+        if self.overflow_policy == 'block':
+            await queue.put(event)
+        elif queue.full():
+            self.dropped += 1
+            if self.overflow_policy == 'drop_newest':
+                logger.warning("Click queue full, dropping newest event for %s", event.short_code)
+                return False
+            dropped = queue.get_nowait()
+            queue.task_done()
+            self._outstanding -= 1
+            logger.warning("Click queue full, dropping oldest event for %s", dropped.short_code)
+            queue.put_nowait(event)
+        else:
+            queue.put_nowait(event)
+        self.enqueued += 1
+        self._outstanding += 1
+        return True
+
+    async def _worker(self) -> None:
+        queue = self._queue
+        while True:
+            event = await queue.get()
+            try:
+                await self.handler(event)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error("Error processing click for %s: %s", event.short_code, e)
+            finally:
+                queue.task_done()
+                self._outstanding -= 1
+
+    async def _ticker(self) -> None:
+        # Downstream writers batch their output; give them a chance to flush
+        # partially filled batches once they are old enough.
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._run_flush_hook(False)
+
+    async def _run_flush_hook(self, force: bool) -> None:
+        if self.flush_hook is None:
+            return
+        try:
+            await self.flush_hook(force)
+        except Exception as e:
+            logger.error("Error flushing click writes: %s", e)
+
+    def pending(self) -> int:
+        return self._outstanding
+
+    async def flush(self, timeout: Optional[float] = CLICK_QUEUE_FLUSH_TIMEOUT) -> bool:
+        if self._queue is None:
+            return True
+        queue = self._bind()
+        try:
+            await asyncio.wait_for(queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error("Click queue flush timed out with %d events pending", queue.qsize())
+            return False
+        await self._run_flush_hook(True)
+        return True
+
+    async def shutdown(self, timeout: Optional[float] = CLICK_QUEUE_FLUSH_TIMEOUT) -> bool:
+        flushed = await self.flush(timeout)
+        for task in self._tasks:
+            task.cancel()
+        if self._ticker_task is not None:
+            self._ticker_task.cancel()
+        self._tasks = []
+        self._ticker_task = None
+        return flushed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "enqueued": self.enqueued,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "pending": self.pending()
+        }
+
+click_pipeline = ClickPipeline(process_click, flush_hook=flush_click_writes)
+metrics.register_collector(stats_collector('tinylinker_click_pipeline', click_pipeline.stats, "Click processing queue"))
+
+async def enqueue_click(short_code: str, request: Request) -> bool:
+    event = ClickEvent(
+        short_code=short_code,
+        ip=request.client.host if request.client else "unknown",
+        user_agent=request.headers.get("user-agent", ""),
+        referrer=request.headers.get("referer", "direct"),
+        timestamp=get_current_timestamp()
+    )
+    return await click_pipeline.enqueue(event)
+
+def flush_click_pipeline(timeout: Optional[float] = CLICK_QUEUE_FLUSH_TIMEOUT) -> bool:
+    # Synchronous flush for callers outside the event loop (Lambda handler, SIGTERM, atexit).
+    loop = click_pipeline._loop
+    if loop is None or loop.is_closed() or loop.is_running():
+        return True
+    return loop.run_until_complete(click_pipeline.flush(timeout))
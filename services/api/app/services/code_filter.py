@@ -0,0 +1,160 @@
+import os
+import tempfile
+import threading
+import time
+from typing import Optional, Dict, Any, Iterable, List
+from app.storage.base import StorageBackend, get_storage
+from app.utils.bloom_filter import BloomFilter, file_lock, optimal_geometry
+from app.utils.logger import logger
+from app.utils.metrics import metrics, stats_collector
+
+# off: no filter.
+# allocate: generated codes the filter already knows are redrawn before the
+#   conditional write, so crowded code spaces cost fewer failed puts.
+# authoritative: additionally, a code the filter has never seen is a 404
+#   without a table read. Only safe when every writer shares the snapshot
+#   file (workers of one host); separate Lambda containers each keep their
+#   own and would miss each other's creates.
+BLOOM_FILTER_MODE = os.environ.get('BLOOM_FILTER_MODE', 'off')
+BLOOM_FILTER_PATH = os.environ.get('BLOOM_FILTER_PATH', os.path.join(tempfile.gettempdir(), 'tinylinker-codes.bloom'))
+BLOOM_FILTER_CAPACITY = int(os.environ.get('BLOOM_FILTER_CAPACITY', '1000000'))
+BLOOM_FILTER_FP_RATE = float(os.environ.get('BLOOM_FILTER_FP_RATE', '0.001'))
+# Caps the bit array (0 = uncapped); a cap below what the target rate needs
+# trades a higher false-positive rate for memory.
+BLOOM_FILTER_MAX_BYTES = int(os.environ.get('BLOOM_FILTER_MAX_BYTES', '0'))
+BLOOM_FILTER_SCAN_PAGE_SIZE = int(os.environ.get('BLOOM_FILTER_SCAN_PAGE_SIZE', '1000'))
+# In authoritative mode a snapshot left on disk is only reused while it's
+# younger than this (0 = always). An older one may predate codes that other
+# writers created while nothing here had it open, so it's rebuilt instead.
+BLOOM_FILTER_MAX_AGE_SECONDS = float(os.environ.get('BLOOM_FILTER_MAX_AGE_SECONDS', '3600'))
+
+class CodeFilter:
+    # Knows every shortCode that exists, with false positives. The snapshot
+    # is loaded (or built by scanning the URLs table) on a background thread
+    # the first time it's needed; until then every code "might exist" and
+    # callers fall back to the table.
+    def __init__(
+        self, storage: StorageBackend, mode: str = BLOOM_FILTER_MODE, path: str = BLOOM_FILTER_PATH,
+        capacity: int = BLOOM_FILTER_CAPACITY, fp_rate: float = BLOOM_FILTER_FP_RATE,
+        max_bytes: int = BLOOM_FILTER_MAX_BYTES, max_age: float = BLOOM_FILTER_MAX_AGE_SECONDS
+    ):
+        if mode not in ('off', 'allocate', 'authoritative'):
+            raise ValueError(f"Unknown bloom filter mode '{mode}'")
+        self.storage = storage
+        self.mode = mode
+        self.path = path
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.max_bytes = max_bytes or None
+        self.max_age = max_age
+        self.filter: Optional[BloomFilter] = None
+        self.lookups = 0
+        self.negatives = 0
+        self.redraws = 0
+        # Codes created while the snapshot is loading, added once it's ready.
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        self._loader: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != 'off'
+
+    def start(self) -> None:
+        with self._lock:
+            if self._loader is None and self.enabled:
+                self._loader = threading.Thread(target=self._load, name='code-filter-loader', daemon=True)
+                self._loader.start()
+
+    def _load(self) -> None:
+        try:
+            bloom = self._open_existing()
+            if bloom is None:
+                # One process scans; the others wait on the lock and then open
+                # the snapshot it wrote.
+                with file_lock(f"{self.path}.build"):
+                    bloom = self._open_existing()
+                    if bloom is None:
+                        bloom = self.rebuild()
+            with self._lock:
+                pending, self._pending = self._pending, []
+                self.filter = bloom
+            bloom.add_many(pending)
+        except Exception as e:
+            logger.error("Error loading short code filter from %s: %s", self.path, e)
+
+    def _open_existing(self) -> Optional[BloomFilter]:
+        try:
+            bloom = BloomFilter(self.path)
+        except (FileNotFoundError, ValueError):
+            return None
+        # A snapshot with a different geometry than configured, or one that
+        # has outgrown its capacity, is rebuilt instead of reused.
+        if (bloom.bits, bloom.hashes) != optimal_geometry(self.capacity, self.fp_rate, self.max_bytes) or bloom.count > bloom.capacity:
+            bloom.close()
+            return None
+        age = time.time() - bloom.built_at / 1000
+        if self.mode == 'authoritative' and self.max_age and age > self.max_age:
+            logger.info("Short code filter snapshot %s is %.0fs old, rebuilding", self.path, age)
+            bloom.close()
+            return None
+        return bloom
+
+    def rebuild(self) -> BloomFilter:
+        pages = self.storage.iter_short_codes(page_size=BLOOM_FILTER_SCAN_PAGE_SIZE)
+        bloom = BloomFilter.build(self.path, pages, self.capacity, self.fp_rate, self.max_bytes)
+        logger.info("Built short code filter: %d codes, %d bytes", bloom.count, bloom.stats()["bytes"])
+        if bloom.count > self.capacity:
+            logger.warning("Short code filter holds %d codes, over its capacity of %d", bloom.count, self.capacity)
+        return bloom
+
+    def contains(self, short_code: str) -> Optional[bool]:
+        # None while the snapshot isn't loaded yet.
+        bloom = self.filter
+        if bloom is None:
+            self.start()
+            return None
+        return short_code in bloom
+
+    def might_exist(self, short_code: str) -> bool:
+        return self.contains(short_code) is not False
+
+    def definitely_absent(self, short_code: str) -> bool:
+        if self.mode != 'authoritative':
+            return False
+        self.lookups += 1
+        if self.might_exist(short_code):
+            return False
+        self.negatives += 1
+        return True
+
+    def add_many(self, short_codes: Iterable[str]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            bloom = self.filter
+            if bloom is None:
+                self._pending.extend(short_codes)
+                return
+        try:
+            bloom.add_many(short_codes)
+        except OSError as e:
+            logger.error("Error adding to short code filter: %s", e)
+
+    def add(self, short_code: str) -> None:
+        self.add_many((short_code,))
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "ready": int(self.filter is not None),
+            "lookups": self.lookups,
+            "negatives": self.negatives,
+            "redraws": self.redraws
+        }
+        if self.filter is not None:
+            stats.update(self.filter.stats())
+        return stats
+
+code_filter = CodeFilter(get_storage())
+if code_filter.enabled:
+    metrics.register_collector(stats_collector('tinylinker_code_filter', code_filter.stats, "Short code bloom filter"))
@@ -0,0 +1,375 @@
+import glob
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections import defaultdict
+from typing import Optional, Dict, Any, List, Tuple
+from app.utils.bloom_filter import file_lock
+from app.utils.dynamodb_client import run_blocking
+from app.utils.heavy_hitters import CountMinSketch, SpaceSaving, key_hashes
+from app.utils.logger import logger
+from app.utils.metrics import metrics, stats_collector
+from app.utils.time_utils import MINUTE_MS, HOUR_MS, get_current_timestamp
+
+# Trending links from clicks as they're processed, without touching the
+# analytics table. Each minute and each hour gets a Count-Min sketch and a
+# Space-Saving summary; a window is answered by combining the buckets it
+# covers. Memory is fixed by the settings below, not by the number of links:
+# (60 + 24) buckets of width * depth 4-byte counters plus CAPACITY keys.
+#
+# Error bounds for a window with N clicks, for every link returned:
+# - clicks >= true count (neither structure undercounts);
+# - clicks <= true count + errorBound, where errorBound is the sum of the
+#   buckets' Space-Saving minimums and is at most N / TRENDING_CAPACITY;
+# - clicks <= true count + TRENDING_EPSILON * N with probability at least
+#   1 - TRENDING_DELTA (Count-Min);
+# - minClicks <= true count.
+# Any link with more than errorBound clicks in the window is a candidate, so
+# a true top link is only missing if it's within errorBound of the cut-off.
+TRENDING_ENABLED = os.environ.get('TRENDING_ENABLED', 'true').lower() == 'true'
+TRENDING_EPSILON = float(os.environ.get('TRENDING_EPSILON', '0.002'))
+TRENDING_DELTA = float(os.environ.get('TRENDING_DELTA', '0.01'))
+TRENDING_CAPACITY = int(os.environ.get('TRENDING_CAPACITY', '200'))
+TRENDING_CACHE_TTL = float(os.environ.get('TRENDING_CACHE_TTL', '5'))
+# Each process checkpoints its buckets to its own file. Queries merge in the
+# other live workers' files; a restarted process adopts files whose owner is
+# gone, so a restart doesn't reset trending. 0 disables checkpoints.
+TRENDING_CHECKPOINT_DIR = os.environ.get('TRENDING_CHECKPOINT_DIR', os.path.join(tempfile.gettempdir(), 'tinylinker-trending'))
+TRENDING_CHECKPOINT_INTERVAL = float(os.environ.get('TRENDING_CHECKPOINT_INTERVAL', '30'))
+
+# window -> (bucket size, buckets). The newest bucket is the one still
+# filling, so a window covers between n - 1 and n bucket sizes.
+WINDOWS = {
+    '5m': (MINUTE_MS, 6),
+    '1h': (MINUTE_MS, 60),
+    '24h': (HOUR_MS, 24)
+}
+# Buckets kept per size.
+RETENTION = {MINUTE_MS: 60, HOUR_MS: 24}
+
+MAGIC = b'TLTR'
+VERSION = 1
+HEADER = struct.Struct('<4sHxx8sIIIqI')  # magic, version, instance, pid, width, depth, saved_at, buckets
+BUCKET = struct.Struct('<IqII')  # size, start, summaries, counter bytes follow
+SUMMARY = struct.Struct('<QI')  # total, entries
+ENTRY = struct.Struct('<QQH')  # count, error, key length; the key follows
+
+class Bucket:
+    # One sketch, plus the live summary first and any adopted from a
+    # checkpoint after it. Summaries can't be merged without losing their
+    # bound, so they're kept apart and combined per key at query time.
+    __slots__ = ('size', 'start', 'sketch', 'summaries')
+
+    def __init__(self, size: int, start: int, sketch: CountMinSketch, summaries: List[SpaceSaving]):
+        self.size = size
+        self.start = start
+        self.sketch = sketch
+        self.summaries = summaries
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class TrendingTracker:
+    def __init__(
+        self, epsilon: float = TRENDING_EPSILON, delta: float = TRENDING_DELTA,
+        capacity: int = TRENDING_CAPACITY, checkpoint_dir: Optional[str] = TRENDING_CHECKPOINT_DIR,
+        checkpoint_interval: float = TRENDING_CHECKPOINT_INTERVAL, cache_ttl: float = TRENDING_CACHE_TTL
+    ):
+        probe = CountMinSketch.for_error(epsilon, delta)
+        self.width = probe.width
+        self.depth = probe.depth
+        self.capacity = capacity
+        self.checkpoint_dir = checkpoint_dir if checkpoint_interval > 0 else None
+        self.checkpoint_interval = checkpoint_interval
+        self.cache_ttl = cache_ttl
+        self.buckets: Dict[Tuple[int, int], Bucket] = {}
+        self._newest = {size: 0 for size in RETENTION}
+        self._lock = threading.Lock()
+        self._instance = os.urandom(8)
+        self._restored = self.checkpoint_dir is None
+        self._next_checkpoint = time.monotonic() + checkpoint_interval
+        self._cache: Dict[Tuple[str, int], Tuple[float, Dict[str, Any]]] = {}
+        self._copies: Dict[Tuple[int, int], Bucket] = {}
+        self.added = 0
+        self.late = 0
+        self.checkpoints = 0
+        self.checkpoint_errors = 0
+        self.adopted = 0
+
+    def _new_bucket(self, size: int, start: int) -> Bucket:
+        return Bucket(size, start, CountMinSketch(self.width, self.depth), [SpaceSaving(self.capacity)])
+
+    def _bucket_for(self, size: int, start: int) -> Optional[Bucket]:
+        # Called under the lock. Opening a newer bucket retires the oldest.
+        bucket = self.buckets.get((size, start))
+        if bucket is not None:
+            return bucket
+        retention = RETENTION[size]
+        if start <= self._newest[size] - retention * size:
+            return None
+        if start > self._newest[size]:
+            self._newest[size] = start
+            cutoff = start - retention * size
+            for key in [key for key in self.buckets if key[0] == size and key[1] <= cutoff]:
+                del self.buckets[key]
+        bucket = self.buckets[(size, start)] = self._new_bucket(size, start)
+        return bucket
+
+    def add(self, short_code: str, timestamp: int) -> None:
+        if not self._restored:
+            self.restore()
+        h1, h2 = key_hashes(short_code)
+        with self._lock:
+            for size in RETENTION:
+                bucket = self._bucket_for(size, timestamp - timestamp % size)
+                if bucket is None:
+                    self.late += 1
+                    continue
+                bucket.sketch.add_hashes(h1, h2)
+                bucket.summaries[0].add(short_code)
+            self.added += 1
+
+    def _snapshot(self, size: int, first: int, now: int) -> List[Bucket]:
+        # Called under the lock. Copies what add() changes (the counters and
+        # the live summary) so the window can be combined without the lock;
+        # adopted summaries no longer change and are shared. Copies are kept
+        # until their bucket changes, which is mostly just the newest one.
+        snapshot = []
+        for key, bucket in self.buckets.items():
+            if bucket.size != size or not first <= bucket.start <= now:
+                continue
+            copy = self._copies.get(key)
+            if copy is None or copy.sketch.total != bucket.sketch.total or len(copy.summaries) != len(bucket.summaries):
+                live = bucket.summaries[0]
+                copy = self._copies[key] = Bucket(
+                    size, bucket.start,
+                    CountMinSketch(self.width, self.depth, bucket.sketch.counters[:], bucket.sketch.total),
+                    [SpaceSaving.from_entries(self.capacity, live.entries(), live.total)] + bucket.summaries[1:]
+                )
+            snapshot.append(copy)
+        for key in [key for key in self._copies if key not in self.buckets]:
+            del self._copies[key]
+        return snapshot
+
+    def _window(self, buckets: List[Bucket], size: int, first: int, now: int, limit: int) -> Dict[str, Any]:
+        sketch = CountMinSketch(self.width, self.depth)
+        floors = 0
+        upper: Dict[str, int] = defaultdict(int)
+        lower: Dict[str, int] = defaultdict(int)
+        for bucket in buckets:
+            if bucket.size != size or not first <= bucket.start <= now:
+                continue
+            sketch.merge(bucket.sketch)
+            # A link missing from a summary occurred at most its minimum
+            # there: upper bounds add each summary's minimum, and the links
+            # present replace it with their own count.
+            for summary in bucket.summaries:
+                floor = summary.min_count()
+                floors += floor
+                for key, key_count, error in summary.entries():
+                    upper[key] += key_count - floor
+                    lower[key] += key_count - error
+        ranked = sorted(
+            ((key, min(floors + extra, sketch.estimate(key))) for key, extra in upper.items()),
+            key=lambda item: item[1], reverse=True
+        )[:limit]
+        return {
+            "from": first,
+            "to": now,
+            "totalClicks": sketch.total,
+            "errorBound": floors,
+            "links": [{"shortCode": key, "clicks": clicks, "minClicks": lower[key]} for key, clicks in ranked]
+        }
+
+    def top(self, window: str, limit: int = 10, now: Optional[int] = None) -> Dict[str, Any]:
+        size, count = WINDOWS[window]
+        use_cache = now is None
+        if use_cache:
+            cached = self._cache.get((window, limit))
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+            now = get_current_timestamp()
+        if not self._restored:
+            self.restore()
+        first = now - now % size - (count - 1) * size
+        others = self._read_live_checkpoints()
+        with self._lock:
+            buckets = self._snapshot(size, first, now)
+        result = self._window(buckets + others, size, first, now, limit)
+        result["window"] = window
+        if use_cache:
+            self._cache[(window, limit)] = (time.monotonic() + self.cache_ttl, result)
+        return result
+
+    def _serialize(self) -> bytes:
+        with self._lock:
+            parts = [HEADER.pack(
+                MAGIC, VERSION, self._instance, os.getpid(), self.width, self.depth,
+                get_current_timestamp(), len(self.buckets)
+            )]
+            for bucket in self.buckets.values():
+                parts.append(BUCKET.pack(bucket.size, bucket.start, len(bucket.summaries), len(bucket.sketch.counters) * 4))
+                counters = bucket.sketch.counters
+                if sys.byteorder != 'little':
+                    counters = array('I', counters)
+                    counters.byteswap()
+                parts.append(counters.tobytes())
+                for summary in bucket.summaries:
+                    entries = summary.entries()
+                    parts.append(SUMMARY.pack(summary.total, len(entries)))
+                    for key, count, error in entries:
+                        encoded = key.encode()
+                        parts.append(ENTRY.pack(count, error, len(encoded)))
+                        parts.append(encoded)
+        return b''.join(parts)
+
+    def _parse(self, data: bytes) -> Optional[Tuple[bytes, int, List[Bucket]]]:
+        # (instance, pid, buckets), or None for a file written with other
+        # settings.
+        magic, version, instance, pid, width, depth, _, bucket_count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a trending checkpoint")
+        if (width, depth) != (self.width, self.depth):
+            return None
+        offset = HEADER.size
+        buckets: List[Bucket] = []
+        for _ in range(bucket_count):
+            size, start, summary_count, counter_bytes = BUCKET.unpack_from(data, offset)
+            offset += BUCKET.size
+            counters = array('I')
+            counters.frombytes(data[offset:offset + counter_bytes])
+            if sys.byteorder != 'little':
+                counters.byteswap()
+            offset += counter_bytes
+            summaries: List[SpaceSaving] = []
+            for _ in range(summary_count):
+                total, entry_count = SUMMARY.unpack_from(data, offset)
+                offset += SUMMARY.size
+                entries: List[Tuple[str, int, int]] = []
+                for _ in range(entry_count):
+                    count, error, key_length = ENTRY.unpack_from(data, offset)
+                    offset += ENTRY.size
+                    entries.append((data[offset:offset + key_length].decode(), count, error))
+                    offset += key_length
+                summaries.append(SpaceSaving.from_entries(self.capacity, entries, total))
+            if size in RETENTION:
+                buckets.append(Bucket(size, start, CountMinSketch(self.width, self.depth, counters, sum(s.total for s in summaries)), summaries))
+        return instance, pid, buckets
+
+    def _checkpoint_files(self) -> List[Tuple[str, bytes, int, List[Bucket]]]:
+        files = []
+        for path in glob.glob(os.path.join(self.checkpoint_dir, 'trending-*.bin')):
+            try:
+                with open(path, 'rb') as file:
+                    parsed = self._parse(file.read())
+            except FileNotFoundError:
+                continue
+            except (OSError, ValueError, struct.error, UnicodeDecodeError) as e:
+                logger.warning("Skipping unreadable trending checkpoint %s: %s", path, e)
+                continue
+            if parsed is not None:
+                files.append((path,) + parsed)
+        return files
+
+    def _read_live_checkpoints(self) -> List[Bucket]:
+        if self.checkpoint_dir is None:
+            return []
+        buckets: List[Bucket] = []
+        for _, instance, pid, file_buckets in self._checkpoint_files():
+            if instance != self._instance and pid != os.getpid() and _pid_alive(pid):
+                buckets.extend(file_buckets)
+        return buckets
+
+    def restore(self) -> None:
+        # Adopts the checkpoints of processes that are gone (including an
+        # earlier run under this pid): their sketches are added into ours and
+        # their summaries kept alongside, then their files are removed so
+        # nothing is counted twice.
+        self._restored = True
+        if self.checkpoint_dir is None:
+            return
+        try:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            with file_lock(os.path.join(self.checkpoint_dir, 'trending')):
+                for path, instance, pid, file_buckets in self._checkpoint_files():
+                    if instance == self._instance or (pid != os.getpid() and _pid_alive(pid)):
+                        continue
+                    with self._lock:
+                        for adopted in file_buckets:
+                            bucket = self._bucket_for(adopted.size, adopted.start)
+                            if bucket is not None:
+                                bucket.sketch.merge(adopted.sketch)
+                                bucket.summaries.extend(adopted.summaries)
+                    os.remove(path)
+                    self.adopted += 1
+                    logger.info("Adopted trending checkpoint %s", path)
+        except OSError as e:
+            logger.error("Error restoring trending checkpoints from %s: %s", self.checkpoint_dir, e)
+
+    def checkpoint_due(self) -> bool:
+        return self.checkpoint_dir is not None and time.monotonic() >= self._next_checkpoint
+
+    def checkpoint(self) -> bool:
+        if self.checkpoint_dir is None:
+            return False
+        self._next_checkpoint = time.monotonic() + self.checkpoint_interval
+        path = os.path.join(self.checkpoint_dir, f"trending-{os.getpid()}.bin")
+        temp_path = f"{path}.tmp"
+        try:
+            data = self._serialize()
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            with open(temp_path, 'wb') as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.checkpoint_errors += 1
+            logger.error("Error writing trending checkpoint %s: %s", path, e)
+            return False
+        self.checkpoints += 1
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buckets": len(self.buckets),
+            "added": self.added,
+            "late": self.late,
+            "checkpoints": self.checkpoints,
+            "checkpointErrors": self.checkpoint_errors,
+            "adopted": self.adopted
+        }
+
+trending = TrendingTracker()
+if TRENDING_ENABLED:
+    metrics.register_collector(stats_collector('tinylinker_trending', trending.stats, "Trending link sketches"))
+
+def record_trending_click(short_code: str, timestamp: int) -> None:
+    if TRENDING_ENABLED:
+        trending.add(short_code, timestamp)
+
+async def get_trending(window: str, limit: int = 10) -> Dict[str, Any]:
+    # Combining up to 60 buckets is a few ms of CPU; results are cached for
+    # TRENDING_CACHE_TTL, and the work runs off the event loop.
+    return await run_blocking(trending.top, window, limit)
+
+async def checkpoint_trending(force: bool = False) -> bool:
+    # Forced flushes also follow every Lambda invocation with
+    # CLICK_FLUSH_EACH_INVOCATION, so they too wait for the interval;
+    # shutdown paths call save_trending instead.
+    if not TRENDING_ENABLED or not trending.checkpoint_due():
+        return False
+    if force:
+        return trending.checkpoint()
+    return await run_blocking(trending.checkpoint)
+
+def save_trending() -> bool:
+    return TRENDING_ENABLED and trending.checkpoint()
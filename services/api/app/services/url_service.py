@@ -1,57 +1,162 @@
-from typing import Optional
+from typing import Optional, Dict, List, Tuple, Any
+import asyncio
+import base64
+import binascii
+import json
 import os
-from app.models.database import ShortUrl
+from app.models.database import ShortUrl, ResolvedLink
 from app.models.requests import CreateShortUrlRequest
-from app.models.responses import CreateShortUrlResponse
-from app.utils.dynamodb_client import URLS_TABLE, put_item, get_item
-from app.utils.code_generator import generate_short_code, is_valid_short_code
+from app.models.responses import CreateShortUrlResponse, BatchShortUrlResult, UserLink, UserLinksResponse
+from app.services.code_filter import code_filter
+from app.storage.base import get_storage
+from app.utils.cache import LRUCache, MISSING
+from app.utils.code_allocator import CodeAllocator
+from app.utils.code_generator import is_valid_short_code
 from app.utils.time_utils import get_current_timestamp, add_seconds
 from app.utils.logger import logger
+from app.utils.metrics import metrics, stats_collector
+from app.utils.shared_link_table import SharedLinkTable
 
 BASE_URL = os.environ.get('BASE_URL', 'https://tinylinker.ly')
+URL_CACHE_SIZE = int(os.environ.get('URL_CACHE_SIZE', '10000'))
+URL_CACHE_TTL = float(os.environ.get('URL_CACHE_TTL', '60'))
+URL_NEGATIVE_CACHE_TTL = float(os.environ.get('URL_NEGATIVE_CACHE_TTL', '5'))
+URL_PREVIEW_CACHE_SIZE = int(os.environ.get('URL_PREVIEW_CACHE_SIZE', '1000'))
+SHORTEN_BATCH_MAX_ITEMS = int(os.environ.get('SHORTEN_BATCH_MAX_ITEMS', '10000'))
+SHORTEN_BATCH_CONCURRENCY = int(os.environ.get('SHORTEN_BATCH_CONCURRENCY', '8'))
+# Set by app.server for its workers: the shared table takes the place of the
+# per-process cache, so every worker reads (and invalidates) one copy.
+HOT_LINK_TABLE_NAME = os.environ.get('HOT_LINK_TABLE_NAME')
+
+# Path segments the API routes itself. An alias equal to one would never be
+# reachable, since the route wins over /{short_code}.
+RESERVED_ALIASES = frozenset({
+    'analytics', 'docs', 'health', 'metrics', 'openapi', 'preview', 'redoc', 'shorten', 'trending', 'users'
+})
+
+# What the dashboard list view shows; the rest of the item stays on the index.
+USER_LINK_FIELDS = ['shortCode', 'originalUrl', 'createdAt', 'expiresAt', 'customAlias']
+
+# ResolvedLink records keyed by shortCode; None marks a code known not to exist.
+# Under app.server this only holds what doesn't fit the shared table.
+url_cache = LRUCache(URL_CACHE_SIZE, URL_CACHE_TTL)
+metrics.register_collector(stats_collector('tinylinker_url_cache', url_cache.stats, "Resolved link cache"))
+
+# Full ShortUrl items for previews, so their click count is up to
+# URL_CACHE_TTL old. An entry is only served while the link is still in the
+# resolve cache, which is where deletes (from any worker) take effect.
+preview_cache = LRUCache(URL_PREVIEW_CACHE_SIZE, URL_CACHE_TTL)
+metrics.register_collector(stats_collector('tinylinker_preview_cache', preview_cache.stats, "Link preview cache"))
+
+def _attach_hot_links() -> Optional[SharedLinkTable]:
+    if not HOT_LINK_TABLE_NAME:
+        return None
+    try:
+        return SharedLinkTable.attach(HOT_LINK_TABLE_NAME)
+    except (FileNotFoundError, ValueError) as e:
+        logger.error("Error attaching hot link table %s, using the local cache: %s", HOT_LINK_TABLE_NAME, e)
+        return None
+
+hot_links = _attach_hot_links()
+if hot_links is not None:
+    metrics.register_collector(stats_collector('tinylinker_hot_links', hot_links.stats, "Shared hot link table"))
+
+storage = get_storage()
+code_allocator = CodeAllocator(storage, code_filter=code_filter)
+
+def _cache_ttl(expires_at: Optional[int]) -> float:
+    if expires_at is None:
+        return URL_CACHE_TTL
+    return min(URL_CACHE_TTL, (expires_at - get_current_timestamp()) / 1000)
+
+def _cached_link(short_code: str) -> Any:
+    # ResolvedLink, None for a code known not to exist, or MISSING. Links too
+    # long for a shared slot are kept in the local cache instead.
+    if hot_links is None:
+        return url_cache.get(short_code)
+    entry = hot_links.get(short_code)
+    if entry is MISSING:
+        return url_cache.get(short_code) if len(url_cache) else MISSING
+    if entry is None:
+        return None
+    return ResolvedLink(short_code, *entry)
+
+def _cache_link(link: ResolvedLink) -> None:
+    ttl = _cache_ttl(link.expires_at)
+    if hot_links is not None:
+        if hot_links.set(link.short_code, link.original_url, link.expires_at, link.is_safe, ttl):
+            return
+        hot_links.delete(link.short_code)
+    url_cache.set(link.short_code, link, ttl=ttl)
+
+# Bumped whenever this process creates or invalidates links, so a read that
+# missed doesn't cache "not found" over a link created while it was waiting.
+_local_generation = 0
+
+def _miss_token(short_code: str) -> Tuple[int, Optional[int]]:
+    return _local_generation, (hot_links.generation(short_code) if hot_links is not None else None)
+
+def _cache_missing(short_code: str, ttl: float, token: Optional[Tuple[int, Optional[int]]] = None) -> None:
+    local_generation, generation = token if token is not None else (None, None)
+    if hot_links is not None and hot_links.set_missing(short_code, ttl, generation):
+        return
+    if local_generation is None or local_generation == _local_generation:
+        url_cache.set(short_code, None, ttl=ttl)
+
+def _links_changed() -> None:
+    global _local_generation
+    _local_generation += 1
+
+def _forget(short_codes: List[str]) -> None:
+    _links_changed()
+    if hot_links is not None and short_codes:
+        hot_links.delete_many(short_codes)
+    for short_code in short_codes:
+        url_cache.delete(short_code)
+        preview_cache.delete(short_code)
+
+def get_url_cache_stats() -> Dict[str, int]:
+    return url_cache.stats()
 
 async def create_short_url(request: CreateShortUrlRequest, user_id: str = "anonymous") -> CreateShortUrlResponse:
-    logger.info(f"Creating short URL for: {request.url}")
-    
+    logger.debug("Creating short URL for %s", request.url)
+
+    created_at = get_current_timestamp()
+    expires_at = add_seconds(created_at, request.expiresIn) if request.expiresIn else None
+
+    def build_item(short_code: str, is_custom: bool = False) -> ShortUrl:
+        return ShortUrl(
+            shortCode=short_code,
+            originalUrl=str(request.url),
+            userId=user_id,
+            createdAt=created_at,
+            expiresAt=expires_at,
+            clickCount=0,
+            customAlias=is_custom,
+            isSafe=True
+        )
+
     if request.customAlias:
-        logger.info(f"Custom alias requested: {request.customAlias}")
         if not is_valid_short_code(request.customAlias):
-            logger.warning(f"Invalid custom alias format: {request.customAlias}")
+            logger.info("Invalid custom alias format: %s", request.customAlias)
             raise ValueError("Invalid custom alias format")
+        if request.customAlias.lower() in RESERVED_ALIASES:
+            logger.info("Reserved custom alias: %s", request.customAlias)
+            raise ValueError(f"Custom alias '{request.customAlias}' is reserved")
 
-        existing = get_item(URLS_TABLE, {'shortCode': request.customAlias})
-        if existing:
-            logger.warning(f"Custom alias already taken: {request.customAlias}")
+        url_item = build_item(request.customAlias, is_custom=True)
+        if not await code_allocator.claim(url_item.model_dump()):
+            logger.info("Custom alias already taken: %s", request.customAlias)
             raise ValueError(f"Custom alias '{request.customAlias}' is already taken")
-
-        short_code = request.customAlias
-        is_custom = True
     else:
-        logger.info("Generating random short code")
-        short_code = await generate_unique_short_code()
-        is_custom = False
-
-    created_at = get_current_timestamp()
-    expires_at = add_seconds(created_at, request.expiresIn) if request.expiresIn else None
-
-    url_item = ShortUrl(
-        shortCode=short_code,
-        originalUrl=str(request.url),
-        userId=user_id,
-        createdAt=created_at,
-        expiresAt=expires_at,
-        clickCount=0,
-        customAlias=is_custom,
-        isSafe=True
-    )
+        item = await code_allocator.claim_generated(lambda code: build_item(code).model_dump())
+        url_item = ShortUrl(**item)
 
-    logger.info(f"Saving short URL to DynamoDB: {short_code}")
-    success = put_item(URLS_TABLE, url_item.model_dump())
-    if not success:
-        logger.error(f"Failed to save short URL: {short_code}")
-        raise Exception("Failed to create short URL")
+    short_code = url_item.shortCode
+    _links_changed()
+    _cache_link(ResolvedLink(short_code, url_item.originalUrl, expires_at, url_item.isSafe))
 
-    logger.info(f"Short URL created successfully: {short_code}")
+    logger.info("Short URL created: %s", short_code)
     return CreateShortUrlResponse(
         shortCode=short_code,
         shortUrl=f"{BASE_URL}/{short_code}",
@@ -61,26 +166,217 @@ async def create_short_url(request: CreateShortUrlRequest, user_id: str = "anony
         isSafe=True
     )
 
-async def generate_unique_short_code(max_attempts: int = 3) -> str:
-    logger.info(f"Generating unique short code (max attempts: {max_attempts})")
-    for attempt in range(max_attempts):
-        code = generate_short_code()
-        logger.info(f"Attempt {attempt + 1}: Generated code {code}")
-        existing = get_item(URLS_TABLE, {'shortCode': code})
-        if not existing:
-            logger.info(f"Unique code found: {code}")
-            return code
-        logger.warning(f"Code collision detected: {code}")
+async def _put_new_urls(items: List[Dict[str, Any]]) -> List[Optional[bool]]:
+    semaphore = asyncio.Semaphore(SHORTEN_BATCH_CONCURRENCY)
 
-    logger.warning(f"Max attempts reached, generating 8-character code")
-    return generate_short_code(length=8)
+    async def write_chunk(chunk: List[Dict[str, Any]]) -> List[Optional[bool]]:
+        async with semaphore:
+            try:
+                return await storage.aput_urls_if_absent(chunk)
+            except Exception as e:
+                # A failed chunk only fails its own items.
+                logger.error("Error writing batch chunk of %d URLs: %s", len(chunk), e)
+                return [None] * len(chunk)
 
-async def get_url_by_code(short_code: str) -> Optional[ShortUrl]:
-    logger.info(f"Fetching URL data for short code: {short_code}")
-    item = get_item(URLS_TABLE, {'shortCode': short_code})
+    size = storage.transaction_size
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    outcomes: List[Optional[bool]] = []
+    for chunk_outcomes in await asyncio.gather(*(write_chunk(chunk) for chunk in chunks)):
+        outcomes.extend(chunk_outcomes)
+    return outcomes
+
+async def create_short_urls(
+    requests: List[Tuple[int, CreateShortUrlRequest]], user_id: str = "anonymous"
+) -> List[BatchShortUrlResult]:
+    # Bulk counterpart of create_short_url: codes are allocated for the whole
+    # batch up front and written with chunked conditional transactions.
+    # Generated codes that collide are reallocated and retried; every request
+    # gets its own result, so one bad item never fails the batch.
+    logger.debug("Creating %d short URLs in batch", len(requests))
+    created_at = get_current_timestamp()
+    by_index = dict(requests)
+    results: List[BatchShortUrlResult] = []
+    custom: List[Tuple[int, str]] = []
+    generated: List[int] = []
+    aliases = set()
+
+    for index, request in requests:
+        alias = request.customAlias
+        if not alias:
+            generated.append(index)
+        elif not is_valid_short_code(alias):
+            results.append(BatchShortUrlResult(index=index, status=400, error="Invalid custom alias format"))
+        elif alias.lower() in RESERVED_ALIASES:
+            results.append(BatchShortUrlResult(index=index, status=400, error=f"Custom alias '{alias}' is reserved"))
+        elif alias in aliases:
+            results.append(BatchShortUrlResult(index=index, status=409, error=f"Custom alias '{alias}' is already taken"))
+        else:
+            aliases.add(alias)
+            custom.append((index, alias))
+
+    def build_item(index: int, short_code: str) -> ShortUrl:
+        request = by_index[index]
+        return ShortUrl(
+            shortCode=short_code,
+            originalUrl=str(request.url),
+            userId=user_id,
+            createdAt=created_at,
+            expiresAt=add_seconds(created_at, request.expiresIn) if request.expiresIn else None,
+            clickCount=0,
+            customAlias=bool(request.customAlias),
+            isSafe=True
+        )
+
+    pending = custom + list(zip(generated, await code_allocator.next_codes(len(generated))))
+    attempt = 0
+    while pending:
+        url_items = [build_item(index, short_code) for index, short_code in pending]
+        outcomes = await _put_new_urls([url_item.model_dump() for url_item in url_items])
+
+        retry: List[int] = []
+        created: List[str] = []
+        for url_item, (index, short_code), outcome in zip(url_items, pending, outcomes):
+            if outcome:
+                created.append(short_code)
+                results.append(BatchShortUrlResult(index=index, status=201, result=CreateShortUrlResponse(
+                    shortCode=short_code,
+                    shortUrl=f"{BASE_URL}/{short_code}",
+                    originalUrl=url_item.originalUrl,
+                    createdAt=created_at,
+                    expiresAt=url_item.expiresAt,
+                    isSafe=True
+                )))
+            elif outcome is None:
+                results.append(BatchShortUrlResult(index=index, status=500, error="Failed to create short URL"))
+            elif by_index[index].customAlias:
+                results.append(BatchShortUrlResult(index=index, status=409, error=f"Custom alias '{short_code}' is already taken"))
+            else:
+                retry.append(index)
+
+        # Drops "not found" entries other workers may hold for the new codes.
+        _forget(created)
+        code_filter.add_many(created)
+        attempt += 1
+        if retry and attempt >= code_allocator.max_attempts:
+            logger.error("Could not allocate unique short codes for %d batch items", len(retry))
+            results.extend(
+                BatchShortUrlResult(index=index, status=500, error="Could not allocate a unique short code")
+                for index in retry
+            )
+            retry = []
+        pending = list(zip(retry, await code_allocator.next_codes(len(retry), attempt))) if retry else []
+
+    logger.info("Batch created %d of %d short URLs", sum(1 for r in results if r.status == 201), len(requests))
+    return results
+
+async def _read_url(short_code: str) -> Optional[Dict[str, Any]]:
+    if not is_valid_short_code(short_code) or code_filter.definitely_absent(short_code):
+        return None
+
+    token = _miss_token(short_code)
+    item = await storage.aget_url(short_code)
     if not item:
-        logger.warning(f"Short code not found in database: {short_code}")
+        logger.debug("Short code not found in database: %s", short_code)
+        _cache_missing(short_code, URL_NEGATIVE_CACHE_TTL, token)
         return None
+    return item
 
-    logger.info(f"URL data retrieved for: {short_code}")
-    return ShortUrl(**item)
\ No newline at end of file
+def _cache_if_live(link: ResolvedLink) -> bool:
+    # Expired items stay in the table until TTL deletion gets to them; until
+    # then they're cached as missing rather than read on every request.
+    if link.is_expired(get_current_timestamp()):
+        _cache_missing(link.short_code, URL_CACHE_TTL)
+        return False
+    _cache_link(link)
+    return True
+
+async def resolve_link(short_code: str) -> Optional[ResolvedLink]:
+    # The redirect path: a cache hit is a dict lookup and an expiry check.
+    link = _cached_link(short_code)
+    if link is MISSING:
+        logger.debug("URL cache miss for %s", short_code)
+        item = await _read_url(short_code)
+        if item is None:
+            return None
+        link = ResolvedLink.from_item(item)
+        if _cache_if_live(link):
+            return link
+        return None
+    if link is None or link.is_expired(get_current_timestamp()):
+        return None
+    return link
+
+async def get_url_by_code(short_code: str) -> Optional[ShortUrl]:
+    # Full item for previews, cached alongside the resolved link.
+    link = _cached_link(short_code)
+    if link is None:
+        return None
+    if link is not MISSING:
+        if link.is_expired(get_current_timestamp()):
+            return None
+        url = preview_cache.get(short_code)
+        if url is not MISSING:
+            return url
+    item = await _read_url(short_code)
+    if item is None:
+        return None
+    link = ResolvedLink.from_item(item)
+    if not _cache_if_live(link):
+        return None
+    url = ShortUrl.model_construct(**item)
+    preview_cache.set(short_code, url, ttl=_cache_ttl(link.expires_at))
+    return url
+
+async def link_exists(short_code: str) -> bool:
+    # Whether the table has the code at all, expired or not: analytics for a
+    # link outlive the link. Not cached, unlike the redirect path.
+    if not is_valid_short_code(short_code) or code_filter.definitely_absent(short_code):
+        return False
+    return await storage.aget_url(short_code) is not None
+
+def encode_cursor(key: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str, user_id: str) -> Dict[str, Any]:
+    # Cursors are opaque to clients but not trusted: a malformed one, or one
+    # issued for another user's listing, is rejected rather than passed on
+    # as the query's start key.
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise ValueError("Invalid cursor")
+    if (
+        not isinstance(key, dict) or set(key) != {'userId', 'createdAt', 'shortCode'}
+        or key['userId'] != user_id or not isinstance(key['createdAt'], int)
+        or not isinstance(key['shortCode'], str)
+    ):
+        raise ValueError("Invalid cursor")
+    return key
+
+async def list_user_links(
+    user_id: str, limit: int = 25, cursor: Optional[str] = None, newest_first: bool = True,
+    start: Optional[int] = None, end: Optional[int] = None, include_clicks: bool = False
+) -> UserLinksResponse:
+    start_key = decode_cursor(cursor, user_id) if cursor else None
+    items, last_key = await storage.alist_user_urls(user_id, start, end, newest_first, limit, start_key, USER_LINK_FIELDS)
+
+    # Click counts change on every redirect, so they're read from the table
+    # (one batch get for the page) rather than from the lagging index.
+    clicks: Dict[str, int] = {}
+    if include_clicks and items:
+        for item in await storage.aget_urls([item['shortCode'] for item in items], ['shortCode', 'clickCount']):
+            clicks[item['shortCode']] = int(item.get('clickCount', 0))
+
+    links = [
+        UserLink(
+            shortUrl=f"{BASE_URL}/{item['shortCode']}",
+            clickCount=clicks.get(item['shortCode'], 0) if include_clicks else None,
+            **item
+        )
+        for item in items
+    ]
+    return UserLinksResponse(
+        userId=user_id,
+        links=links,
+        nextCursor=encode_cursor(last_key) if last_key else None
+    )
@@ -0,0 +1,187 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, Any, List, Tuple, Iterator, AsyncIterator
+from app.utils.dynamodb_client import run_blocking
+from app.utils.metrics import timed
+
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'dynamodb')
+STORAGE_SQLITE_PATH = os.environ.get('STORAGE_SQLITE_PATH', 'tinylinker.sqlite3')
+
+class StorageBackend(ABC):
+    # Everything the services read or write goes through these calls. URLs are
+    # keyed by shortCode; analytics items by (partition, timestamp), where the
+    # partition is a shortCode or one of the rollup keys built from it; rate
+    # limit windows by (identifier, windowStart).
+    #
+    # Methods are synchronous so the flush paths can call them from worker
+    # threads and at shutdown. The async wrappers offload them to the shared
+    # executor when the backend does network or disk I/O, and call straight
+    # through for in-process engines.
+    blocking = True
+    # Largest batch put_urls_if_absent accepts in one call.
+    transaction_size = 100
+
+    @abstractmethod
+    def get_url(self, short_code: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def put_url_if_absent(self, item: Dict[str, Any]) -> Optional[bool]:
+        # True when written, False when the shortCode is taken, None on error.
+        ...
+
+    @abstractmethod
+    def put_urls_if_absent(self, items: List[Dict[str, Any]]) -> List[Optional[bool]]:
+        ...
+
+    @abstractmethod
+    def get_urls(self, short_codes: List[str], projection: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        # Batch read; codes that don't exist are left out, order isn't kept.
+        ...
+
+    @abstractmethod
+    def list_user_urls(
+        self, user_id: str, start: Optional[int] = None, end: Optional[int] = None,
+        newest_first: bool = True, limit: int = 25, cursor: Optional[Dict[str, Any]] = None,
+        projection: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        # One page of a user's URLs ordered by createdAt, optionally within
+        # [start, end]. Returns the page and the key to resume after (None
+        # when there's nothing more); keys are {userId, createdAt, shortCode}.
+        ...
+
+    @abstractmethod
+    def iter_short_codes(self, page_size: Optional[int] = None) -> Iterator[List[str]]:
+        # Every stored shortCode, in pages, in no particular order.
+        ...
+
+    @abstractmethod
+    def lease_ids(self, size: int) -> Optional[int]:
+        # Atomically advances the code counter by size; returns the new end.
+        ...
+
+    @abstractmethod
+    def add_clicks(self, short_code: str, amount: int, last_clicked_at: Optional[int] = None) -> bool:
+        # lastClickedAt is only ever moved forward.
+        ...
+
+    @abstractmethod
+    def write_events(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Puts analytics items, last write wins per key. Returns the items that
+        # weren't written so the caller can retry them.
+        ...
+
+    @abstractmethod
+    def iter_event_pages(
+        self, partition: str, start: Optional[int] = None, end: Optional[int] = None,
+        projection: Optional[List[str]] = None, newest_first: bool = False,
+        limit: Optional[int] = None, page_size: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        ...
+
+    @abstractmethod
+    def get_event(self, partition: str, timestamp: int) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def add_event_counters(
+        self, partition: str, timestamp: int, counters: Dict[str, int], expires_at: int
+    ) -> List[str]:
+        # Adds to number attributes, creating the item if needed. Returns the
+        # counter names that weren't applied and are worth retrying; updates
+        # the store rejects outright are dropped.
+        ...
+
+    @abstractmethod
+    def put_event_if_newer(self, item: Dict[str, Any], attribute: str) -> Optional[bool]:
+        # Puts the item unless the stored one has a larger value for attribute.
+        # True when written, False when skipped, None on error.
+        ...
+
+    @abstractmethod
+    def acquire_rate_limit(
+        self, identifier: str, window_start: int, amount: int, limit: int, expires_at: int
+    ) -> Optional[int]:
+        # Adds amount to the window's count if it stays within limit and
+        # returns the new count; None when it doesn't fit. Raises on errors.
+        ...
+
+    async def _call(self, stage: str, func, *args):
+        # Timed here, so offloaded calls include any wait for an executor thread.
+        with timed(stage):
+            if self.blocking:
+                return await run_blocking(func, *args)
+            return func(*args)
+
+    async def aget_url(self, short_code: str) -> Optional[Dict[str, Any]]:
+        return await self._call('storage.get_url', self.get_url, short_code)
+
+    async def aput_url_if_absent(self, item: Dict[str, Any]) -> Optional[bool]:
+        return await self._call('storage.put_url_if_absent', self.put_url_if_absent, item)
+
+    async def aput_urls_if_absent(self, items: List[Dict[str, Any]]) -> List[Optional[bool]]:
+        return await self._call('storage.put_urls_if_absent', self.put_urls_if_absent, items)
+
+    async def aget_urls(self, short_codes: List[str], projection: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return await self._call('storage.get_urls', self.get_urls, short_codes, projection)
+
+    async def alist_user_urls(
+        self, user_id: str, start: Optional[int] = None, end: Optional[int] = None,
+        newest_first: bool = True, limit: int = 25, cursor: Optional[Dict[str, Any]] = None,
+        projection: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        return await self._call(
+            'storage.list_user_urls', self.list_user_urls,
+            user_id, start, end, newest_first, limit, cursor, projection
+        )
+
+    async def alease_ids(self, size: int) -> Optional[int]:
+        return await self._call('storage.lease_ids', self.lease_ids, size)
+
+    async def aget_event(self, partition: str, timestamp: int) -> Optional[Dict[str, Any]]:
+        return await self._call('storage.get_event', self.get_event, partition, timestamp)
+
+    async def aacquire_rate_limit(
+        self, identifier: str, window_start: int, amount: int, limit: int, expires_at: int
+    ) -> Optional[int]:
+        return await self._call('storage.acquire_rate_limit', self.acquire_rate_limit, identifier, window_start, amount, limit, expires_at)
+
+    async def aiter_event_pages(self, partition: str, **kwargs) -> AsyncIterator[List[Dict[str, Any]]]:
+        # Fetches one page at a time, so only the current page is in memory.
+        pages = self.iter_event_pages(partition, **kwargs)
+        while True:
+            page = await self._call('storage.iter_event_pages', next, pages, None)
+            if page is None:
+                return
+            yield page
+
+    async def aiter_events(self, partition: str, **kwargs) -> AsyncIterator[Dict[str, Any]]:
+        async for page in self.aiter_event_pages(partition, **kwargs):
+            for item in page:
+                yield item
+
+def build_storage(kind: str = STORAGE_BACKEND) -> StorageBackend:
+    # Implementations are imported on demand so a memory or SQLite run never
+    # loads boto3.
+    if kind == 'dynamodb':
+        from app.storage.dynamodb import DynamoDBStorage
+        return DynamoDBStorage()
+    if kind == 'memory':
+        from app.storage.memory import MemoryStorage
+        return MemoryStorage()
+    if kind == 'sqlite':
+        from app.storage.sqlite import SQLiteStorage
+        return SQLiteStorage(STORAGE_SQLITE_PATH)
+    raise ValueError(f"Unknown storage backend '{kind}'")
+
+_storage: Optional[StorageBackend] = None
+_storage_lock = threading.Lock()
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = build_storage()
+    return _storage
@@ -0,0 +1,184 @@
+from decimal import Decimal
+from typing import Optional, Dict, Any, List, Tuple, Iterator
+from botocore.exceptions import BotoCoreError, ClientError
+from app.storage.base import StorageBackend
+from app.utils.dynamodb_client import (
+    URLS_TABLE, ANALYTICS_TABLE, RATE_LIMITS_TABLE, TRANSACT_WRITE_SIZE,
+    batch_get_items, batch_write_items, get_item, put_item_if_absent, transact_put_items_if_absent, update_item,
+    increment_counter, iter_query_pages, iter_scan_pages, range_key_condition
+)
+from app.utils.logger import logger
+
+# Counter state lives in the URLs table under a key that can never be a valid
+# short code (underscores are outside the base62 alphabet).
+COUNTER_KEY = '__code_counter__'
+COUNTER_ATTRIBUTE = 'nextId'
+
+USER_INDEX = 'userId-createdAt-index'
+
+# UpdateExpression is capped at 4KB, so wide counter sets are split across updates.
+MAX_ATTRIBUTES_PER_UPDATE = 50
+
+class DynamoDBStorage(StorageBackend):
+    transaction_size = TRANSACT_WRITE_SIZE
+
+    def __init__(self, urls_table=URLS_TABLE, analytics_table=ANALYTICS_TABLE, rate_limits_table=RATE_LIMITS_TABLE):
+        self.urls_table = urls_table
+        self.analytics_table = analytics_table
+        self.rate_limits_table = rate_limits_table
+
+    def get_url(self, short_code: str) -> Optional[Dict[str, Any]]:
+        return get_item(self.urls_table, {'shortCode': short_code})
+
+    def put_url_if_absent(self, item: Dict[str, Any]) -> Optional[bool]:
+        return put_item_if_absent(self.urls_table, item, 'shortCode')
+
+    def put_urls_if_absent(self, items: List[Dict[str, Any]]) -> List[Optional[bool]]:
+        results: List[Optional[bool]] = []
+        for start in range(0, len(items), TRANSACT_WRITE_SIZE):
+            results.extend(transact_put_items_if_absent(
+                self.urls_table, items[start:start + TRANSACT_WRITE_SIZE], 'shortCode'
+            ))
+        return results
+
+    def get_urls(self, short_codes: List[str], projection: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        # BatchGetItem rejects duplicate keys.
+        keys = [{'shortCode': short_code} for short_code in dict.fromkeys(short_codes)]
+        return batch_get_items(self.urls_table, keys, projection)
+
+    def list_user_urls(
+        self, user_id: str, start: Optional[int] = None, end: Optional[int] = None,
+        newest_first: bool = True, limit: int = 25, cursor: Optional[Dict[str, Any]] = None,
+        projection: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        # A single Query page on the GSI; LastEvaluatedKey is the resume key,
+        # so each page costs the same however deep into the list it is.
+        key_condition, values, names = range_key_condition('userId', user_id, 'createdAt', start, end)
+        pages = iter_query_pages(
+            self.urls_table, key_condition, values, index_name=USER_INDEX,
+            expression_names=names, projection=projection,
+            scan_index_forward=not newest_first, limit=limit, exclusive_start_key=cursor
+        )
+        items, last_key = next(pages, ([], None))
+        if last_key is not None:
+            last_key = {name: int(value) if isinstance(value, Decimal) else value for name, value in last_key.items()}
+        return items, last_key
+
+    def iter_short_codes(self, page_size: Optional[int] = None) -> Iterator[List[str]]:
+        for items in iter_scan_pages(self.urls_table, projection=['shortCode'], page_size=page_size):
+            yield [item['shortCode'] for item in items if item['shortCode'] != COUNTER_KEY]
+
+    def lease_ids(self, size: int) -> Optional[int]:
+        end = increment_counter(self.urls_table, {'shortCode': COUNTER_KEY}, COUNTER_ATTRIBUTE, size)
+        return int(end) if end is not None else None
+
+    def add_clicks(self, short_code: str, amount: int, last_clicked_at: Optional[int] = None) -> bool:
+        key = {'shortCode': short_code}
+        if last_clicked_at is not None:
+            # lastClickedAt only moves forward: another container may flush
+            # older clicks after ours. When it's already newer, the count is
+            # added on its own.
+            try:
+                self.urls_table.update_item(
+                    Key=key,
+                    UpdateExpression="ADD clickCount :n SET lastClickedAt = :t",
+                    ConditionExpression="attribute_not_exists(lastClickedAt) OR lastClickedAt < :t",
+                    ExpressionAttributeValues={':n': amount, ':t': last_clicked_at}
+                )
+                return True
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    logger.error("Error adding clicks for %s: %s", short_code, e)
+                    return False
+        return update_item(self.urls_table, key, "ADD clickCount :n", {':n': amount})
+
+    def write_events(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # One BatchWriteItem call (callers send at most 25 items); throttled
+        # or failed items, including a timed-out call's, come back for the
+        # caller's retry loop.
+        try:
+            return batch_write_items(self.analytics_table, items)
+        except (ClientError, BotoCoreError) as e:
+            logger.error("Error batch writing items: %s", e)
+            return items
+
+    def iter_event_pages(
+        self, partition: str, start: Optional[int] = None, end: Optional[int] = None,
+        projection: Optional[List[str]] = None, newest_first: bool = False,
+        limit: Optional[int] = None, page_size: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        key_condition, values, names = range_key_condition('shortCode', partition, 'timestamp', start, end)
+        for items, _ in iter_query_pages(
+            self.analytics_table, key_condition, values,
+            expression_names=names, projection=projection,
+            scan_index_forward=not newest_first, limit=limit, page_size=page_size
+        ):
+            yield items
+
+    def get_event(self, partition: str, timestamp: int) -> Optional[Dict[str, Any]]:
+        return get_item(self.analytics_table, {'shortCode': partition, 'timestamp': timestamp})
+
+    def add_event_counters(
+        self, partition: str, timestamp: int, counters: Dict[str, int], expires_at: int
+    ) -> List[str]:
+        names = list(counters)
+        for start in range(0, len(names), MAX_ATTRIBUTES_PER_UPDATE):
+            chunk = names[start:start + MAX_ATTRIBUTES_PER_UPDATE]
+            attribute_names = {f"#a{i}": name for i, name in enumerate(chunk)}
+            expression_values: Dict[str, Any] = {f":v{i}": counters[name] for i, name in enumerate(chunk)}
+            expression_values[':e'] = expires_at
+            update_expression = "ADD " + ", ".join(f"#a{i} :v{i}" for i in range(len(chunk))) + " SET expiresAt = :e"
+            try:
+                self.analytics_table.update_item(
+                    Key={'shortCode': partition, 'timestamp': timestamp},
+                    UpdateExpression=update_expression,
+                    ExpressionAttributeNames=attribute_names,
+                    ExpressionAttributeValues=expression_values
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'ValidationException':
+                    # Retrying can't fix a rejected update (an item at the size
+                    # limit, say), so these counters are dropped.
+                    logger.error("Dropping %d counters for %s: %s", len(chunk), partition, e)
+                    continue
+                logger.error("Error updating counters for %s: %s", partition, e)
+                return names[start:]
+        return []
+
+    def put_event_if_newer(self, item: Dict[str, Any], attribute: str) -> Optional[bool]:
+        try:
+            self.analytics_table.put_item(
+                Item=item,
+                ConditionExpression='attribute_not_exists(#a) OR #a <= :n',
+                ExpressionAttributeNames={'#a': attribute},
+                ExpressionAttributeValues={':n': item[attribute]}
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            logger.error("Error putting item for %s: %s", item['shortCode'], e)
+            return None
+
+    def acquire_rate_limit(
+        self, identifier: str, window_start: int, amount: int, limit: int, expires_at: int
+    ) -> Optional[int]:
+        # The ADD only applies while the window still has room for the whole
+        # amount, so concurrent instances can never push the row past the limit.
+        # More than the limit never fits; the condition alone would let it
+        # through on a fresh row.
+        if amount > limit:
+            return None
+        try:
+            response = self.rate_limits_table.update_item(
+                Key={'identifier': identifier, 'windowStart': window_start},
+                UpdateExpression='ADD requestCount :n SET expiresAt = :e',
+                ConditionExpression='attribute_not_exists(requestCount) OR requestCount <= :max',
+                ExpressionAttributeValues={':n': amount, ':e': expires_at, ':max': limit - amount},
+                ReturnValues='UPDATED_NEW'
+            )
+            return int(response['Attributes']['requestCount'])
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return None
+            raise
@@ -0,0 +1,213 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+from app.storage.base import StorageBackend
+
+DEFAULT_PAGE_SIZE = 1000
+
+class EventSeries:
+    # One partition's items ordered by timestamp: a sorted array of the keys
+    # for bisect plus the items in the same order. Clicks arrive roughly in
+    # time order, so inserts are almost always appends.
+    __slots__ = ('timestamps', 'items')
+
+    def __init__(self):
+        self.timestamps = array('q')
+        self.items: List[Dict[str, Any]] = []
+
+    def put(self, item: Dict[str, Any]) -> None:
+        timestamp = int(item['timestamp'])
+        timestamps = self.timestamps
+        if not timestamps or timestamp > timestamps[-1]:
+            timestamps.append(timestamp)
+            self.items.append(item)
+            return
+        index = bisect_left(timestamps, timestamp)
+        if index < len(timestamps) and timestamps[index] == timestamp:
+            self.items[index] = item
+        else:
+            timestamps.insert(index, timestamp)
+            self.items.insert(index, item)
+
+    def get(self, timestamp: int) -> Optional[Dict[str, Any]]:
+        index = bisect_left(self.timestamps, timestamp)
+        if index < len(self.timestamps) and self.timestamps[index] == timestamp:
+            return self.items[index]
+        return None
+
+    def range(self, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+        low = 0 if start is None else bisect_left(self.timestamps, start)
+        high = len(self.timestamps) if end is None else bisect_right(self.timestamps, end)
+        return low, high
+
+class MemoryStorage(StorageBackend):
+    # Process-local engine for load tests, benchmarks and local development.
+    # Items are stored as given; reads return copies so callers can't alias
+    # stored state.
+    blocking = False
+    transaction_size = 1000
+
+    def __init__(self):
+        self._urls: Dict[str, Dict[str, Any]] = {}
+        # Per user, (createdAt, shortCode) sorted: the in-memory counterpart
+        # of the userId-createdAt GSI.
+        self._user_urls: Dict[str, List[Tuple[int, str]]] = {}
+        self._events: Dict[str, EventSeries] = {}
+        self._rate_limits: Dict[Tuple[str, int], Tuple[int, int]] = {}
+        self._next_id = 0
+        self._next_prune = 0
+        self._lock = threading.RLock()
+
+    def get_url(self, short_code: str) -> Optional[Dict[str, Any]]:
+        item = self._urls.get(short_code)
+        return dict(item) if item is not None else None
+
+    def put_url_if_absent(self, item: Dict[str, Any]) -> Optional[bool]:
+        with self._lock:
+            if item['shortCode'] in self._urls:
+                return False
+            self._urls[item['shortCode']] = dict(item)
+            if item.get('userId') is not None:
+                insort(self._user_urls.setdefault(item['userId'], []), (int(item['createdAt']), item['shortCode']))
+            return True
+
+    def put_urls_if_absent(self, items: List[Dict[str, Any]]) -> List[Optional[bool]]:
+        return [self.put_url_if_absent(item) for item in items]
+
+    def get_urls(self, short_codes: List[str], projection: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        items = [self._urls[short_code] for short_code in dict.fromkeys(short_codes) if short_code in self._urls]
+        if projection is not None:
+            return [{name: item[name] for name in projection if name in item} for item in items]
+        return [dict(item) for item in items]
+
+    def list_user_urls(
+        self, user_id: str, start: Optional[int] = None, end: Optional[int] = None,
+        newest_first: bool = True, limit: int = 25, cursor: Optional[Dict[str, Any]] = None,
+        projection: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        with self._lock:
+            entries = self._user_urls.get(user_id, [])
+            low = 0 if start is None else bisect_left(entries, (start, ''))
+            high = len(entries) if end is None else bisect_left(entries, (end + 1, ''))
+            if cursor is not None:
+                position = (int(cursor['createdAt']), cursor['shortCode'])
+                if newest_first:
+                    high = min(high, bisect_left(entries, position))
+                else:
+                    low = max(low, bisect_right(entries, position))
+            if newest_first:
+                page = entries[max(low, high - limit):high][::-1]
+                more = high - limit > low
+            else:
+                page = entries[low:min(high, low + limit)]
+                more = low + limit < high
+            items = self.get_urls([short_code for _, short_code in page], projection)
+        last_key = None
+        if more and page:
+            created_at, short_code = page[-1]
+            last_key = {'userId': user_id, 'createdAt': created_at, 'shortCode': short_code}
+        return items, last_key
+
+    def iter_short_codes(self, page_size: Optional[int] = None) -> Iterator[List[str]]:
+        codes = list(self._urls)
+        page_size = page_size or DEFAULT_PAGE_SIZE
+        for offset in range(0, len(codes), page_size):
+            yield codes[offset:offset + page_size]
+
+    def lease_ids(self, size: int) -> Optional[int]:
+        with self._lock:
+            self._next_id += size
+            return self._next_id
+
+    def add_clicks(self, short_code: str, amount: int, last_clicked_at: Optional[int] = None) -> bool:
+        with self._lock:
+            item = self._urls.get(short_code)
+            if item is None:
+                return True
+            item['clickCount'] = item.get('clickCount', 0) + amount
+            if last_clicked_at is not None and last_clicked_at > (item.get('lastClickedAt') or 0):
+                item['lastClickedAt'] = last_clicked_at
+            return True
+
+    def write_events(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            for item in items:
+                series = self._events.get(item['shortCode'])
+                if series is None:
+                    series = self._events[item['shortCode']] = EventSeries()
+                series.put(dict(item))
+        return []
+
+    def iter_event_pages(
+        self, partition: str, start: Optional[int] = None, end: Optional[int] = None,
+        projection: Optional[List[str]] = None, newest_first: bool = False,
+        limit: Optional[int] = None, page_size: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        series = self._events.get(partition)
+        if series is None:
+            return
+        with self._lock:
+            low, high = series.range(start, end)
+            if limit is not None:
+                if newest_first:
+                    low = max(low, high - limit)
+                else:
+                    high = min(high, low + limit)
+            items = series.items[low:high]
+        if newest_first:
+            items.reverse()
+        page_size = page_size or DEFAULT_PAGE_SIZE
+        for offset in range(0, len(items), page_size):
+            page = items[offset:offset + page_size]
+            if projection is not None:
+                yield [{name: item[name] for name in projection if name in item} for item in page]
+            else:
+                yield [dict(item) for item in page]
+
+    def get_event(self, partition: str, timestamp: int) -> Optional[Dict[str, Any]]:
+        series = self._events.get(partition)
+        item = series.get(timestamp) if series is not None else None
+        return dict(item) if item is not None else None
+
+    def add_event_counters(
+        self, partition: str, timestamp: int, counters: Dict[str, int], expires_at: int
+    ) -> List[str]:
+        with self._lock:
+            series = self._events.get(partition)
+            if series is None:
+                series = self._events[partition] = EventSeries()
+            item = series.get(timestamp)
+            if item is None:
+                item = {'shortCode': partition, 'timestamp': timestamp}
+                series.put(item)
+            for name, value in counters.items():
+                item[name] = item.get(name, 0) + value
+            item['expiresAt'] = expires_at
+        return []
+
+    def put_event_if_newer(self, item: Dict[str, Any], attribute: str) -> Optional[bool]:
+        with self._lock:
+            existing = self.get_event(item['shortCode'], item['timestamp'])
+            if existing is not None and attribute in existing and existing[attribute] > item[attribute]:
+                return False
+            self.write_events([item])
+            return True
+
+    def acquire_rate_limit(
+        self, identifier: str, window_start: int, amount: int, limit: int, expires_at: int
+    ) -> Optional[int]:
+        with self._lock:
+            now = int(time.time())
+            if now >= self._next_prune:
+                expired = [key for key, (_, expires) in self._rate_limits.items() if expires <= now]
+                for key in expired:
+                    del self._rate_limits[key]
+                self._next_prune = now + 1
+            key = (identifier, window_start)
+            count = self._rate_limits.get(key, (0, 0))[0]
+            if count + amount > limit:
+                return None
+            self._rate_limits[key] = (count + amount, expires_at)
+            return count + amount
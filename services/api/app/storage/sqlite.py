@@ -0,0 +1,276 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple, Iterator
+from app.storage.base import StorageBackend
+
+DEFAULT_PAGE_SIZE = 1000
+
+# Items are kept as JSON documents, with the columns the queries filter or
+# sort on pulled out beside them. The events table is clustered on
+# (partition, timestamp), so a time-range read is a single index range scan.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    short_code TEXT PRIMARY KEY,
+    user_id TEXT,
+    created_at INTEGER,
+    item TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS urls_user_created ON urls (user_id, created_at);
+CREATE TABLE IF NOT EXISTS events (
+    partition TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    item TEXT NOT NULL,
+    PRIMARY KEY (partition, timestamp)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rate_limits (
+    identifier TEXT NOT NULL,
+    window_start INTEGER NOT NULL,
+    request_count INTEGER NOT NULL,
+    expires_at INTEGER NOT NULL,
+    PRIMARY KEY (identifier, window_start)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS rate_limits_expiry ON rate_limits (expires_at);
+"""
+
+class SQLiteStorage(StorageBackend):
+    # Single-file engine for local development and offline load tests. One
+    # connection is shared behind a lock; WAL keeps readers of the file (e.g.
+    # the sqlite3 shell) from blocking the app.
+    transaction_size = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _put_url(self, item: Dict[str, Any]) -> bool:
+        cursor = self._connection.execute(
+            "INSERT OR IGNORE INTO urls (short_code, user_id, created_at, item) VALUES (?, ?, ?, ?)",
+            (item['shortCode'], item.get('userId'), item.get('createdAt'), json.dumps(item))
+        )
+        return cursor.rowcount == 1
+
+    def get_url(self, short_code: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute("SELECT item FROM urls WHERE short_code = ?", (short_code,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_url_if_absent(self, item: Dict[str, Any]) -> Optional[bool]:
+        with self._lock:
+            return self._put_url(item)
+
+    def put_urls_if_absent(self, items: List[Dict[str, Any]]) -> List[Optional[bool]]:
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                results: List[Optional[bool]] = [self._put_url(item) for item in items]
+                self._connection.execute("COMMIT")
+            except sqlite3.Error:
+                self._connection.execute("ROLLBACK")
+                raise
+        return results
+
+    def get_urls(self, short_codes: List[str], projection: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        short_codes = list(dict.fromkeys(short_codes))
+        if not short_codes:
+            return []
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT item FROM urls WHERE short_code IN ({', '.join('?' * len(short_codes))})", short_codes
+            ).fetchall()
+        items = [json.loads(row[0]) for row in rows]
+        if projection is not None:
+            items = [{name: item[name] for name in projection if name in item} for item in items]
+        return items
+
+    def list_user_urls(
+        self, user_id: str, start: Optional[int] = None, end: Optional[int] = None,
+        newest_first: bool = True, limit: int = 25, cursor: Optional[Dict[str, Any]] = None,
+        projection: Optional[List[str]] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        # Keyset pagination over the (user_id, created_at) index; the table is
+        # WITHOUT ROWID, so the index entries end in short_code and the
+        # tie-break needs no extra lookup.
+        conditions = ["user_id = ?"]
+        params: List[Any] = [user_id]
+        if start is not None:
+            conditions.append("created_at >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("created_at <= ?")
+            params.append(end)
+        if cursor is not None:
+            conditions.append(f"(created_at, short_code) {'<' if newest_first else '>'} (?, ?)")
+            params.extend([int(cursor['createdAt']), cursor['shortCode']])
+        order = "DESC" if newest_first else "ASC"
+        params.append(limit + 1)
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT created_at, short_code, item FROM urls WHERE {' AND '.join(conditions)} "
+                f"ORDER BY created_at {order}, short_code {order} LIMIT ?",
+                params
+            ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        items = [json.loads(row[2]) for row in rows]
+        if projection is not None:
+            items = [{name: item[name] for name in projection if name in item} for item in items]
+        last_key = None
+        if more:
+            last_key = {'userId': user_id, 'createdAt': rows[-1][0], 'shortCode': rows[-1][1]}
+        return items, last_key
+
+    def iter_short_codes(self, page_size: Optional[int] = None) -> Iterator[List[str]]:
+        page_size = page_size or DEFAULT_PAGE_SIZE
+        after = ''
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT short_code FROM urls WHERE short_code > ? ORDER BY short_code LIMIT ?", (after, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            yield [row[0] for row in rows]
+            after = rows[-1][0]
+
+    def lease_ids(self, size: int) -> Optional[int]:
+        with self._lock:
+            row = self._connection.execute(
+                "INSERT INTO counters (name, value) VALUES ('code', ?) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value RETURNING value",
+                (size,)
+            ).fetchone()
+        return row[0]
+
+    def add_clicks(self, short_code: str, amount: int, last_clicked_at: Optional[int] = None) -> bool:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE urls SET item = json_set(item, '$.clickCount', coalesce(json_extract(item, '$.clickCount'), 0) + ?, "
+                "'$.lastClickedAt', nullif(max(coalesce(?, -1), coalesce(json_extract(item, '$.lastClickedAt'), -1)), -1)) "
+                "WHERE short_code = ?",
+                (amount, last_clicked_at, short_code)
+            )
+        return True
+
+    def write_events(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO events (partition, timestamp, item) VALUES (?, ?, ?)",
+                    [(item['shortCode'], int(item['timestamp']), json.dumps(item)) for item in items]
+                )
+                self._connection.execute("COMMIT")
+            except sqlite3.Error:
+                self._connection.execute("ROLLBACK")
+                return items
+        return []
+
+    def iter_event_pages(
+        self, partition: str, start: Optional[int] = None, end: Optional[int] = None,
+        projection: Optional[List[str]] = None, newest_first: bool = False,
+        limit: Optional[int] = None, page_size: Optional[int] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        page_size = page_size or DEFAULT_PAGE_SIZE
+        order = "DESC" if newest_first else "ASC"
+        remaining = limit
+        # Keyset pagination: each page resumes after the last timestamp seen,
+        # so no statement stays open between pages.
+        cursor_start, cursor_end = start, end
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            conditions = ["partition = ?"]
+            params: List[Any] = [partition]
+            if cursor_start is not None:
+                conditions.append("timestamp >= ?")
+                params.append(cursor_start)
+            if cursor_end is not None:
+                conditions.append("timestamp <= ?")
+                params.append(cursor_end)
+            params.append(size)
+            with self._lock:
+                rows = self._connection.execute(
+                    f"SELECT timestamp, item FROM events WHERE {' AND '.join(conditions)} "
+                    f"ORDER BY timestamp {order} LIMIT ?",
+                    params
+                ).fetchall()
+            if not rows:
+                return
+            items = [json.loads(row[1]) for row in rows]
+            if projection is not None:
+                items = [{name: item[name] for name in projection if name in item} for item in items]
+            yield items
+            if remaining is not None:
+                remaining -= len(rows)
+            if len(rows) < size:
+                return
+            if newest_first:
+                cursor_end = rows[-1][0] - 1
+            else:
+                cursor_start = rows[-1][0] + 1
+
+    def get_event(self, partition: str, timestamp: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT item FROM events WHERE partition = ? AND timestamp = ?", (partition, timestamp)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_event_counters(
+        self, partition: str, timestamp: int, counters: Dict[str, int], expires_at: int
+    ) -> List[str]:
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._connection.execute(
+                    "SELECT item FROM events WHERE partition = ? AND timestamp = ?", (partition, timestamp)
+                ).fetchone()
+                item = json.loads(row[0]) if row else {'shortCode': partition, 'timestamp': timestamp}
+                for name, value in counters.items():
+                    item[name] = item.get(name, 0) + value
+                item['expiresAt'] = expires_at
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO events (partition, timestamp, item) VALUES (?, ?, ?)",
+                    (partition, timestamp, json.dumps(item))
+                )
+                self._connection.execute("COMMIT")
+            except sqlite3.Error:
+                self._connection.execute("ROLLBACK")
+                return list(counters)
+        return []
+
+    def put_event_if_newer(self, item: Dict[str, Any], attribute: str) -> Optional[bool]:
+        with self._lock:
+            cursor = self._connection.execute(
+                "INSERT INTO events (partition, timestamp, item) VALUES (?, ?, ?) "
+                "ON CONFLICT (partition, timestamp) DO UPDATE SET item = excluded.item "
+                f"WHERE coalesce(json_extract(events.item, '$.{attribute}'), json_extract(excluded.item, '$.{attribute}')) "
+                f"<= json_extract(excluded.item, '$.{attribute}')",
+                (item['shortCode'], int(item['timestamp']), json.dumps(item))
+            )
+        return cursor.rowcount == 1
+
+    def acquire_rate_limit(
+        self, identifier: str, window_start: int, amount: int, limit: int, expires_at: int
+    ) -> Optional[int]:
+        with self._lock:
+            self._connection.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (int(time.time()),))
+            row = self._connection.execute(
+                "INSERT INTO rate_limits (identifier, window_start, request_count, expires_at) "
+                "SELECT ?, ?, ?, ? WHERE ? <= ? "
+                "ON CONFLICT (identifier, window_start) DO UPDATE SET "
+                "request_count = request_count + excluded.request_count, expires_at = excluded.expires_at "
+                "WHERE request_count + excluded.request_count <= ? "
+                "RETURNING request_count",
+                (identifier, window_start, amount, expires_at, amount, limit, limit)
+            ).fetchone()
+        return row[0] if row else None
@@ -0,0 +1,202 @@
+import fcntl
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from hashlib import blake2b
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
+
+# Snapshot layout: a fixed header followed by the bit array. The file is
+# mapped shared, so every process that opens it reads the same pages from the
+# page cache and sees bits set by the others without copying anything.
+MAGIC = b'TLBF'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQQdQQ')  # magic, version, hashes, bits, capacity, fp_rate, count, built_at
+HEADER_SIZE = 64
+COUNT_OFFSET = 4 + 2 + 2 + 8 + 8 + 8
+
+# How often a reader checks whether the snapshot file was replaced.
+REMAP_INTERVAL = 1.0
+
+def optimal_geometry(capacity: int, fp_rate: float, max_bytes: Optional[int] = None) -> Tuple[int, int]:
+    # m = -n ln p / (ln 2)^2 bits and k = (m / n) ln 2 hashes minimise the
+    # false-positive rate for n items. A byte cap shrinks m and raises the rate.
+    if capacity <= 0 or not 0 < fp_rate < 1:
+        raise ValueError("Bloom filter needs a positive capacity and 0 < fp_rate < 1")
+    bits = math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))
+    if max_bytes:
+        bits = min(bits, max_bytes * 8)
+    bits = max(64, (bits + 63) // 64 * 64)
+    hashes = max(1, min(30, round(bits / capacity * math.log(2))))
+    return bits, hashes
+
+def estimated_fp_rate(bits: int, hashes: int, count: int) -> float:
+    return (1 - math.exp(-hashes * count / bits)) ** hashes
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    # Lock on a side file: the snapshot itself is swapped by rename, and a
+    # lock on a replaced inode would no longer exclude anyone.
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+def _positions(key: str, bits: int, hashes: int) -> Iterator[int]:
+    # Kirsch-Mitzenmacher double hashing: k positions from one 128-bit digest.
+    digest = blake2b(key.encode(), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    for i in range(hashes):
+        yield (h1 + i * h2) % bits
+
+class BloomFilter:
+    # Membership filter over a memory-mapped snapshot. Lookups read the shared
+    # map without locking (bits only ever go from 0 to 1). Adds take an
+    # exclusive flock so writers in different processes don't lose each
+    # other's bits in the read-modify-write of a byte.
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._inode = 0
+        self._next_check = 0.0
+        self._open()
+
+    def _open(self) -> None:
+        file = open(self.path, 'r+b')
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_WRITE)
+        except ValueError:
+            file.close()
+            raise ValueError(f"Bloom filter snapshot {self.path} is empty")
+        magic, version, hashes, bits, capacity, fp_rate, _, built_at = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or version != VERSION or len(mapped) < HEADER_SIZE + bits // 8:
+            mapped.close()
+            file.close()
+            raise ValueError(f"{self.path} is not a bloom filter snapshot")
+        old_map, old_file = self._map, self._file
+        self._file, self._map = file, mapped
+        self._inode = os.fstat(file.fileno()).st_ino
+        self.hashes, self.bits, self.capacity, self.fp_rate, self.built_at = hashes, bits, capacity, fp_rate, built_at
+        if old_map is not None:
+            old_map.close()
+            old_file.close()
+
+    def _refresh(self) -> None:
+        # Picks up a snapshot that a rebuild swapped in under the same path.
+        try:
+            inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return
+        if inode != self._inode:
+            self._open()
+
+    def __contains__(self, key: str) -> bool:
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + REMAP_INTERVAL
+            with self._lock:
+                self._refresh()
+        mapped = self._map
+        for position in _positions(key, self.bits, self.hashes):
+            if not mapped[HEADER_SIZE + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def _set(self, key: str) -> None:
+        mapped = self._map
+        for position in _positions(key, self.bits, self.hashes):
+            index = HEADER_SIZE + (position >> 3)
+            mapped[index] = mapped[index] | (1 << (position & 7))
+
+    def add_many(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        if not keys:
+            return
+        with self._lock, file_lock(self.path):
+            # Under the file lock the mapped snapshot is the current one, so
+            # no add can land in a file that a rebuild has already replaced.
+            self._refresh()
+            for key in keys:
+                self._set(key)
+            count = struct.unpack_from('<Q', self._map, COUNT_OFFSET)[0]
+            struct.pack_into('<Q', self._map, COUNT_OFFSET, count + len(keys))
+
+    def add(self, key: str) -> None:
+        self.add_many((key,))
+
+    @property
+    def count(self) -> int:
+        return struct.unpack_from('<Q', self._map, COUNT_OFFSET)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        count = self.count
+        return {
+            "bits": self.bits,
+            "hashes": self.hashes,
+            "bytes": HEADER_SIZE + self.bits // 8,
+            "capacity": self.capacity,
+            "items": count,
+            "targetFpRate": self.fp_rate,
+            "estimatedFpRate": estimated_fp_rate(self.bits, self.hashes, count),
+            "builtAt": self.built_at
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._file.close()
+                self._map = None
+
+    @classmethod
+    def build(
+        cls, path: str, pages: Iterable[List[str]], capacity: int, fp_rate: float,
+        max_bytes: Optional[int] = None
+    ) -> "BloomFilter":
+        # Fills a new file next to the snapshot, then renames it into place.
+        # Bits set in the old snapshot while the scan ran (creates by other
+        # processes) are OR-ed in under the lock, so none are lost.
+        bits, hashes = optimal_geometry(capacity, fp_rate, max_bytes)
+        size = HEADER_SIZE + bits // 8
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w+b') as file:
+            file.truncate(size)
+            with mmap.mmap(file.fileno(), size) as mapped:
+                count = 0
+                for page in pages:
+                    for key in page:
+                        for position in _positions(key, bits, hashes):
+                            index = HEADER_SIZE + (position >> 3)
+                            mapped[index] = mapped[index] | (1 << (position & 7))
+                    count += len(page)
+                with file_lock(path):
+                    previous = _read_bits_if_compatible(path, bits, hashes)
+                    if previous is not None:
+                        current = int.from_bytes(mapped[HEADER_SIZE:size], 'little')
+                        mapped[HEADER_SIZE:size] = (current | int.from_bytes(previous, 'little')).to_bytes(size - HEADER_SIZE, 'little')
+                    HEADER.pack_into(mapped, 0, MAGIC, VERSION, hashes, bits, capacity, fp_rate, count, int(time.time() * 1000))
+                    mapped.flush()
+                    os.replace(temp_path, path)
+        return cls(path)
+
+def _read_bits_if_compatible(path: str, bits: int, hashes: int) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as file:
+            header = file.read(HEADER_SIZE)
+            if len(header) < HEADER_SIZE:
+                return None
+            magic, version, old_hashes, old_bits = HEADER.unpack_from(header, 0)[:4]
+            if (magic, version, old_hashes, old_bits) != (MAGIC, VERSION, hashes, bits):
+                return None
+            return file.read(bits // 8)
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,116 @@
+import os
+import threading
+from typing import Optional, Dict, Any, Callable, List
+from app.utils.code_generator import BASE62_CHARS, generate_short_code
+from app.utils.logger import logger
+
+CODE_ALLOCATOR_MODE = os.environ.get('CODE_ALLOCATOR_MODE', 'random')
+CODE_BLOCK_SIZE = int(os.environ.get('CODE_BLOCK_SIZE', '1000'))
+CODE_MAX_ATTEMPTS = int(os.environ.get('CODE_MAX_ATTEMPTS', '5'))
+# Random codes the membership filter reports as taken are redrawn up to this
+# many times before the conditional write gets to decide.
+CODE_FILTER_REDRAWS = int(os.environ.get('CODE_FILTER_REDRAWS', '3'))
+
+# Counter codes are always 7 characters, so they can't collide with the 6/8
+# character random codes; only a custom alias can take one, and the
+# conditional write skips it. Multiplying by a constant coprime to 62**7
+# permutes the ID space so consecutive IDs don't yield guessable neighbours.
+COUNTER_CODE_LENGTH = 7
+COUNTER_SPACE = 62 ** COUNTER_CODE_LENGTH
+COUNTER_MULTIPLIER = 1580030173
+
+def encode_base62(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, remainder = divmod(value, 62)
+        chars.append(BASE62_CHARS[remainder])
+    return ''.join(reversed(chars))
+
+def counter_code(counter_id: int) -> str:
+    return encode_base62((counter_id * COUNTER_MULTIPLIER) % COUNTER_SPACE, COUNTER_CODE_LENGTH)
+
+class CodeAllocator:
+    def __init__(
+        self, storage, mode: str = CODE_ALLOCATOR_MODE,
+        block_size: int = CODE_BLOCK_SIZE, max_attempts: int = CODE_MAX_ATTEMPTS,
+        code_filter=None
+    ):
+        if mode not in ('random', 'counter'):
+            raise ValueError(f"Unknown code allocator mode '{mode}'")
+        self.storage = storage
+        self.mode = mode
+        self.block_size = block_size
+        self.max_attempts = max_attempts
+        self.code_filter = code_filter if code_filter is not None and code_filter.enabled else None
+        self._next_id = 0
+        self._end_id = 0
+        self._lock = threading.Lock()
+
+    async def _lease_block(self, size: Optional[int] = None) -> None:
+        # Concurrent leases may each take a block; the later one wins and the
+        # rest of the earlier block is skipped, so IDs are never handed out twice.
+        size = max(size or 0, self.block_size)
+        end = await self.storage.alease_ids(size)
+        if end is None:
+            raise Exception("Failed to lease short code block")
+        with self._lock:
+            self._next_id, self._end_id = int(end) - size, int(end)
+        logger.info("Leased short code block [%d, %d)", int(end) - size, int(end))
+
+    async def next_code(self, attempt: int = 0) -> str:
+        if self.mode == 'counter':
+            while True:
+                with self._lock:
+                    if self._next_id < self._end_id:
+                        counter_id = self._next_id
+                        self._next_id += 1
+                        return counter_code(counter_id)
+                await self._lease_block()
+        # Random mode: widen the last attempt so a crowded 6-char space can't exhaust it.
+        return self._draw(8 if attempt == self.max_attempts - 1 else 6)
+
+    def _draw(self, length: int) -> str:
+        code = generate_short_code(length=length)
+        if self.code_filter is not None:
+            for _ in range(CODE_FILTER_REDRAWS):
+                if not self.code_filter.contains(code):
+                    break
+                self.code_filter.redraws += 1
+                code = generate_short_code(length=length)
+        return code
+
+    async def next_codes(self, count: int, attempt: int = 0) -> List[str]:
+        if self.mode == 'counter':
+            codes: List[str] = []
+            while len(codes) < count:
+                with self._lock:
+                    take = min(count - len(codes), self._end_id - self._next_id)
+                    start = self._next_id
+                    self._next_id += take
+                codes.extend(counter_code(counter_id) for counter_id in range(start, start + take))
+                if len(codes) < count:
+                    # One lease covers the whole remainder of a large batch.
+                    await self._lease_block(count - len(codes))
+            return codes
+        length = 8 if attempt == self.max_attempts - 1 else 6
+        codes_set = set()
+        while len(codes_set) < count:
+            codes_set.add(self._draw(length))
+        return list(codes_set)
+
+    async def claim(self, item: Dict[str, Any]) -> bool:
+        # One conditional PutItem both checks and reserves the code.
+        result = await self.storage.aput_url_if_absent(item)
+        if result is None:
+            raise Exception("Failed to create short URL")
+        if result and self.code_filter is not None:
+            self.code_filter.add(item['shortCode'])
+        return result
+
+    async def claim_generated(self, build_item: Callable[[str], Dict[str, Any]]) -> Dict[str, Any]:
+        for attempt in range(self.max_attempts):
+            item = build_item(await self.next_code(attempt))
+            if await self.claim(item):
+                return item
+            logger.warning("Code collision detected: %s", item['shortCode'])
+        raise Exception(f"Could not allocate a unique short code after {self.max_attempts} attempts")
@@ -1,31 +1,151 @@
+import asyncio
 import os
-import boto3
-from typing import Optional, Dict, Any, List
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional, Dict, Any, List, Tuple, Iterator, AsyncIterator, Callable, TypeVar
 from botocore.exceptions import ClientError
 from .logger import logger
+from .metrics import timed
 
-dynamodb = boto3.resource('dynamodb')
+T = TypeVar('T')
 
-URLS_TABLE = dynamodb.Table(os.environ.get('URLS_TABLE_NAME', 'tinylinker-urls'))
-ANALYTICS_TABLE = dynamodb.Table(os.environ.get('ANALYTICS_TABLE_NAME', 'tinylinker-analytics'))
-RATE_LIMITS_TABLE = dynamodb.Table(os.environ.get('RATE_LIMITS_TABLE_NAME', 'tinylinker-rate-limits'))
+DYNAMODB_ENDPOINT_URL = os.environ.get('DYNAMODB_ENDPOINT_URL')
+DYNAMODB_REGION = os.environ.get('DYNAMODB_REGION') or os.environ.get('AWS_REGION')
+DYNAMODB_MAX_POOL_CONNECTIONS = int(os.environ.get('DYNAMODB_MAX_POOL_CONNECTIONS', '50'))
+DYNAMODB_CONNECT_TIMEOUT = float(os.environ.get('DYNAMODB_CONNECT_TIMEOUT', '1.0'))
+DYNAMODB_READ_TIMEOUT = float(os.environ.get('DYNAMODB_READ_TIMEOUT', '2.0'))
+DYNAMODB_RETRY_MODE = os.environ.get('DYNAMODB_RETRY_MODE', 'standard')
+DYNAMODB_MAX_ATTEMPTS = int(os.environ.get('DYNAMODB_MAX_ATTEMPTS', '3'))
+DYNAMODB_TCP_KEEPALIVE = os.environ.get('DYNAMODB_TCP_KEEPALIVE', 'true').lower() == 'true'
+
+_dynamodb = None
+_dynamodb_lock = threading.Lock()
+_serializer = None
+_deserializer = None
+
+def get_dynamodb():
+    # Importing boto3 and building the client costs a few hundred ms, so it
+    # happens on first use rather than at import (requests like /health never
+    # touch DynamoDB). One low-level client and its connection pool are shared
+    # by every executor thread: boto3 clients are thread-safe, resources and
+    # their Table objects aren't, so values are (de)serialized here instead.
+    global _dynamodb, _serializer, _deserializer
+    if _dynamodb is None:
+        with _dynamodb_lock:
+            if _dynamodb is None:
+                import boto3
+                from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+                from botocore.config import Config
+                _serializer = TypeSerializer()
+                _deserializer = TypeDeserializer()
+                _dynamodb = boto3.client(
+                    'dynamodb',
+                    region_name=DYNAMODB_REGION,
+                    endpoint_url=DYNAMODB_ENDPOINT_URL,
+                    config=Config(
+                        max_pool_connections=DYNAMODB_MAX_POOL_CONNECTIONS,
+                        connect_timeout=DYNAMODB_CONNECT_TIMEOUT,
+                        read_timeout=DYNAMODB_READ_TIMEOUT,
+                        retries={'mode': DYNAMODB_RETRY_MODE, 'max_attempts': DYNAMODB_MAX_ATTEMPTS},
+                        tcp_keepalive=DYNAMODB_TCP_KEEPALIVE
+                    )
+                )
+    return _dynamodb
+
+def serialize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    get_dynamodb()
+    return {name: _serializer.serialize(value) for name, value in item.items()}
+
+def deserialize_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    get_dynamodb()
+    return {name: _deserializer.deserialize(value) for name, value in item.items()}
+
+SERIALIZED_PARAMETERS = ('Item', 'Key', 'ExpressionAttributeValues', 'ExclusiveStartKey')
+DESERIALIZED_RESULTS = ('Item', 'Attributes', 'LastEvaluatedKey')
+
+class LazyTable:
+    # The Table resource calls this module uses, with plain Python values in
+    # and out, made through the shared client.
+    def __init__(self, name: str):
+        self.name = name
+
+    def _call(self, operation: str, **kwargs) -> Dict[str, Any]:
+        for parameter in SERIALIZED_PARAMETERS:
+            if parameter in kwargs:
+                kwargs[parameter] = serialize_item(kwargs[parameter])
+        response = getattr(get_dynamodb(), operation)(TableName=self.name, **kwargs)
+        for result in DESERIALIZED_RESULTS:
+            if result in response:
+                response[result] = deserialize_item(response[result])
+        if 'Items' in response:
+            response['Items'] = [deserialize_item(item) for item in response['Items']]
+        return response
+
+    def get_item(self, **kwargs) -> Dict[str, Any]:
+        return self._call('get_item', **kwargs)
+
+    def put_item(self, **kwargs) -> Dict[str, Any]:
+        return self._call('put_item', **kwargs)
+
+    def update_item(self, **kwargs) -> Dict[str, Any]:
+        return self._call('update_item', **kwargs)
+
+    def query(self, **kwargs) -> Dict[str, Any]:
+        return self._call('query', **kwargs)
+
+    def scan(self, **kwargs) -> Dict[str, Any]:
+        return self._call('scan', **kwargs)
+
+# The executor is sized to the connection pool so offloaded calls never queue
+# for a connection.
+dynamodb_executor = ThreadPoolExecutor(
+    max_workers=DYNAMODB_MAX_POOL_CONNECTIONS,
+    thread_name_prefix='dynamodb'
+)
+
+URLS_TABLE = LazyTable(os.environ.get('URLS_TABLE_NAME', 'tinylinker-urls'))
+ANALYTICS_TABLE = LazyTable(os.environ.get('ANALYTICS_TABLE_NAME', 'tinylinker-analytics'))
+RATE_LIMITS_TABLE = LazyTable(os.environ.get('RATE_LIMITS_TABLE_NAME', 'tinylinker-rate-limits'))
+
+BATCH_WRITE_SIZE = 25
+BATCH_GET_SIZE = 100
+BATCH_GET_MAX_RETRIES = int(os.environ.get('BATCH_GET_MAX_RETRIES', '5'))
+TRANSACT_WRITE_SIZE = 100
 
 def put_item(table, item: Dict[str, Any]) -> bool:
     try:
         table.put_item(Item=item)
-        logger.info(f"Item added successfully")
         return True
     except ClientError as e:
-        logger.error(f"Error putting item: {e}")
+        logger.error("Error putting item: %s", e)
         return False
     
+def put_item_if_absent(table, item: Dict[str, Any], key_name: str) -> Optional[bool]:
+    # True when written, False when an item with the same key already exists,
+    # None on any other error.
+    try:
+        table.put_item(
+            Item=item,
+            ConditionExpression='attribute_not_exists(#k)',
+            ExpressionAttributeNames={'#k': key_name}
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logger.debug("Item already exists")
+            return False
+        logger.error("Error putting item: %s", e)
+        return None
+
 def get_item(table, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     try:
         response = table.get_item(Key=key)
-        logger.info(f"Item retrieved successfully")
         return response.get('Item')
     except ClientError as e:
-        logger.error(f"Error getting item: {e}")
+        logger.error("Error getting item: %s", e)
         return None
 
 def update_item(
@@ -38,10 +158,9 @@ def update_item(
             UpdateExpression=update_expression,
             ExpressionAttributeValues=expression_values
         )
-        logger.info(f"Item updated successfully")
         return True
     except ClientError as e:
-        logger.error(f"Error updating item: {e}")
+        logger.error("Error updating item: %s", e)
         return False
 
 def increment_counter(
@@ -55,28 +174,413 @@ def increment_counter(
             ExpressionAttributeValues={':inc': increment_by},
             ReturnValues='UPDATED_NEW'
         )
-        logger.info(f"Successfully incremented counter")
         return response['Attributes'].get(attribute)
     except ClientError as e:
-        logger.error(f"Error incrementing counter: {e}")
+        logger.error("Error incrementing counter: %s", e)
         return None
 
+def transact_put_items_if_absent(
+    table, items: List[Dict[str, Any]], key_name: str
+) -> List[Optional[bool]]:
+    # Conditional puts for up to TRANSACT_WRITE_SIZE items in one round trip,
+    # with the same per-item results as put_item_if_absent. A transaction is
+    # all-or-nothing, so when it is cancelled the items whose condition failed
+    # are reported as taken and the rest are written one at a time.
+    try:
+        get_dynamodb().transact_write_items(TransactItems=[
+            {
+                'Put': {
+                    'TableName': table.name,
+                    'Item': serialize_item(item),
+                    'ConditionExpression': 'attribute_not_exists(#k)',
+                    'ExpressionAttributeNames': {'#k': key_name}
+                }
+            }
+            for item in items
+        ])
+        logger.debug("Transaction wrote %d items", len(items))
+        return [True] * len(items)
+    except ClientError as e:
+        reasons = e.response.get('CancellationReasons') or []
+        logger.warning("Transaction of %d items failed, writing individually: %s", len(items), e)
+
+    results: List[Optional[bool]] = []
+    for i, item in enumerate(items):
+        if i < len(reasons) and reasons[i].get('Code') == 'ConditionalCheckFailed':
+            results.append(False)
+        else:
+            results.append(put_item_if_absent(table, item, key_name))
+    return results
+
+def batch_get_items(
+    table, keys: List[Dict[str, Any]], projection: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    # BatchGetItem in chunks of 100 keys. Keys DynamoDB leaves unprocessed
+    # (throttling, 16MB response cap) are re-requested with backoff. Missing
+    # items are simply absent from the result, which is unordered.
+    request: Dict[str, Any] = {}
+    if projection:
+        request['ProjectionExpression'] = ', '.join(f'#p{i}' for i in range(len(projection)))
+        request['ExpressionAttributeNames'] = {f'#p{i}': attribute for i, attribute in enumerate(projection)}
+    items: List[Dict[str, Any]] = []
+    for start in range(0, len(keys), BATCH_GET_SIZE):
+        # UnprocessedKeys come back serialized and are sent again as they are.
+        pending = [serialize_item(key) for key in keys[start:start + BATCH_GET_SIZE]]
+        for attempt in range(BATCH_GET_MAX_RETRIES + 1):
+            response = get_dynamodb().batch_get_item(RequestItems={table.name: {**request, 'Keys': pending}})
+            items.extend(deserialize_item(item) for item in response.get('Responses', {}).get(table.name, []))
+            pending = response.get('UnprocessedKeys', {}).get(table.name, {}).get('Keys', [])
+            if not pending:
+                break
+            if attempt < BATCH_GET_MAX_RETRIES:
+                time.sleep(min(1.0, 0.05 * (2 ** attempt)) * random.random())
+        if pending:
+            logger.error("Batch get left %d keys unprocessed after %d retries", len(pending), BATCH_GET_MAX_RETRIES)
+    return items
+
+def batch_write_items(table, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # One BatchWriteItem call of up to BATCH_WRITE_SIZE puts; returns the
+    # items DynamoDB left unprocessed.
+    response = get_dynamodb().batch_write_item(
+        RequestItems={table.name: [{'PutRequest': {'Item': serialize_item(item)}} for item in items]}
+    )
+    return [
+        deserialize_item(request['PutRequest']['Item'])
+        for request in response.get('UnprocessedItems', {}).get(table.name, [])
+    ]
+
+def range_key_condition(
+    partition_name: str, partition_value: Any, sort_name: str,
+    start: Optional[Any] = None, end: Optional[Any] = None
+) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+    # Sort keys like "timestamp" are reserved words, so both keys go through
+    # name placeholders. Returns (expression, values, names).
+    names = {'#pk': partition_name, '#sk': sort_name}
+    values: Dict[str, Any] = {':pk': partition_value}
+    expression = '#pk = :pk'
+    if start is not None and end is not None:
+        expression += ' AND #sk BETWEEN :start AND :end'
+        values[':start'] = start
+        values[':end'] = end
+    elif start is not None:
+        expression += ' AND #sk >= :start'
+        values[':start'] = start
+    elif end is not None:
+        expression += ' AND #sk <= :end'
+        values[':end'] = end
+    else:
+        names.pop('#sk')
+    return expression, values, names
+
+def iter_query_pages(
+    table, key_condition_expression: str,
+    expression_values: Dict[str, Any],
+    index_name: Optional[str] = None,
+    expression_names: Optional[Dict[str, str]] = None,
+    projection: Optional[List[str]] = None,
+    scan_index_forward: bool = True,
+    limit: Optional[int] = None,
+    page_size: Optional[int] = None,
+    exclusive_start_key: Optional[Dict[str, Any]] = None
+) -> Iterator[Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+    # Yields (items, last_evaluated_key) per page, following LastEvaluatedKey
+    # until the query is exhausted or `limit` items have been returned.
+    kwargs: Dict[str, Any] = {
+        'KeyConditionExpression': key_condition_expression,
+        'ExpressionAttributeValues': expression_values,
+        'ScanIndexForward': scan_index_forward
+    }
+    names = dict(expression_names or {})
+    if projection:
+        placeholders = []
+        for i, attribute in enumerate(projection):
+            names[f'#p{i}'] = attribute
+            placeholders.append(f'#p{i}')
+        kwargs['ProjectionExpression'] = ', '.join(placeholders)
+    if names:
+        kwargs['ExpressionAttributeNames'] = names
+    if index_name:
+        kwargs['IndexName'] = index_name
+    if exclusive_start_key:
+        kwargs['ExclusiveStartKey'] = exclusive_start_key
+
+    remaining = limit
+    while remaining is None or remaining > 0:
+        page_limit = page_size
+        if remaining is not None:
+            page_limit = min(page_limit, remaining) if page_limit else remaining
+        if page_limit:
+            kwargs['Limit'] = page_limit
+
+        response = table.query(**kwargs)
+        items = response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if remaining is not None:
+            remaining -= len(items)
+        yield items, last_key
+
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+def iter_scan_pages(
+    table, projection: Optional[List[str]] = None, page_size: Optional[int] = None
+) -> Iterator[List[Dict[str, Any]]]:
+    # Full-table scan, one page per yield; each page reads up to 1MB.
+    kwargs: Dict[str, Any] = {}
+    if projection:
+        kwargs['ProjectionExpression'] = ', '.join(f'#p{i}' for i in range(len(projection)))
+        kwargs['ExpressionAttributeNames'] = {f'#p{i}': attribute for i, attribute in enumerate(projection)}
+    if page_size:
+        kwargs['Limit'] = page_size
+    while True:
+        response = table.scan(**kwargs)
+        yield response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+def iter_query(table, key_condition_expression: str, expression_values: Dict[str, Any], **kwargs) -> Iterator[Dict[str, Any]]:
+    for items, _ in iter_query_pages(table, key_condition_expression, expression_values, **kwargs):
+        yield from items
+
+async def aiter_query(table, key_condition_expression: str, expression_values: Dict[str, Any], **kwargs) -> AsyncIterator[Dict[str, Any]]:
+    # Each page is fetched on a worker thread, so the event loop keeps serving
+    # requests while only one page is held in memory.
+    pages = iter_query_pages(table, key_condition_expression, expression_values, **kwargs)
+    while True:
+        page = await run_blocking(next, pages, None)
+        if page is None:
+            return
+        for item in page[0]:
+            yield item
+
 def query_items(
     table, key_condition_expression: str,
     expression_values: Dict[str, Any],
-    index_name: Optional[str] = None
+    index_name: Optional[str] = None,
+    **kwargs
 ) -> List[Dict[str,Any]]:
     try:
-        kwargs = {
-            'KeyConditionExpression': key_condition_expression,
-            'ExpressionAttributeValues': expression_values
-        }
-        if index_name:
-            kwargs['IndexName'] = index_name
-
-        response = table.query(**kwargs)
-        logger.info(f"Successfully queried items")
-        return response.get('Items', [])
+        items = list(iter_query(
+            table, key_condition_expression, expression_values,
+            index_name=index_name, **kwargs
+        ))
+        return items
     except ClientError as e:
-        logger.error(f"Error querying items: {e}")
+        logger.error("Error querying items: %s", e)
         return []
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(dynamodb_executor, partial(func, *args, **kwargs))
+
+async def aput_item(table, item: Dict[str, Any]) -> bool:
+    return await run_blocking(put_item, table, item)
+
+async def aput_item_if_absent(table, item: Dict[str, Any], key_name: str) -> Optional[bool]:
+    return await run_blocking(put_item_if_absent, table, item, key_name)
+
+async def aget_item(table, key: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    return await run_blocking(get_item, table, key)
+
+async def aupdate_item(
+    table, key: Dict[str, Any], update_expression: str,
+    expression_values: Dict[str, Any]
+) -> bool:
+    return await run_blocking(update_item, table, key, update_expression, expression_values)
+
+async def aincrement_counter(
+    table, key: Dict[str, Any], attribute: str,
+    increment_by: int = 1
+) -> Optional[int]:
+    return await run_blocking(increment_counter, table, key, attribute, increment_by)
+
+async def atransact_put_items_if_absent(
+    table, items: List[Dict[str, Any]], key_name: str
+) -> List[Optional[bool]]:
+    return await run_blocking(transact_put_items_if_absent, table, items, key_name)
+
+async def aquery_items(
+    table, key_condition_expression: str,
+    expression_values: Dict[str, Any],
+    index_name: Optional[str] = None,
+    **kwargs
+) -> List[Dict[str, Any]]:
+    return await run_blocking(query_items, table, key_condition_expression, expression_values, index_name, **kwargs)
+
+class BatchWriter:
+    # write_batch puts up to BATCH_WRITE_SIZE items and returns the ones it
+    # couldn't write (e.g. BatchWriteItem's UnprocessedItems).
+    def __init__(
+        self, write_batch: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+        key_names: Tuple[str, ...],
+        max_delay: float = 1.0, max_retries: int = 5,
+        base_backoff: float = 0.05, max_backoff: float = 2.0
+    ):
+        self.write_batch = write_batch
+        self.key_names = key_names
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._pending: List[Dict[str, Any]] = []
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+        self.flushed = 0
+        self.retried = 0
+        self.dropped = 0
+
+    def add(self, item: Dict[str, Any]) -> None:
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.append(item)
+
+    def due(self) -> bool:
+        with self._lock:
+            return self._due()
+
+    def _due(self) -> bool:
+        if not self._pending:
+            return False
+        return len(self._pending) >= BATCH_WRITE_SIZE or time.monotonic() - self._oldest >= self.max_delay
+
+    def flush(self, force: bool = True) -> Dict[str, int]:
+        with self._lock:
+            if not (force and self._pending) and not self._due():
+                return {"flushed": 0, "retried": 0, "dropped": 0}
+            items, self._pending, self._oldest = self._pending, [], None
+
+        result = {"flushed": 0, "retried": 0, "dropped": 0}
+        for start in range(0, len(items), BATCH_WRITE_SIZE):
+            flushed, retried, dropped = self._write_batch(items[start:start + BATCH_WRITE_SIZE])
+            result["flushed"] += flushed
+            result["retried"] += retried
+            result["dropped"] += dropped
+
+        self.flushed += result["flushed"]
+        self.retried += result["retried"]
+        self.dropped += result["dropped"]
+        logger.debug("Batch flush: %d flushed, %d retried, %d dropped", result['flushed'], result['retried'], result['dropped'])
+        return result
+
+    def _write_batch(self, items: List[Dict[str, Any]]) -> Tuple[int, int, int]:
+        # BatchWriteItem rejects duplicate keys within one request; the last
+        # write wins, same as consecutive PutItems would.
+        unique = {tuple(item[name] for name in self.key_names): item for item in items}
+        requests = list(unique.values())
+        total = len(requests)
+        retried = 0
+
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                retried += len(requests)
+                time.sleep(random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt))))
+            try:
+                with timed('storage.write_events'):
+                    requests = self.write_batch(requests)
+            except Exception as e:
+                # Whatever a backend lets through goes the retry and drop
+                # route too, and the other chunks still get written.
+                logger.error("Error writing batch of %d items: %s", len(requests), e)
+            if not requests:
+                return total, retried, 0
+
+        logger.error("Dropping %d items after %d retries", len(requests), self.max_retries)
+        return total - len(requests), retried, len(requests)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            "flushed": self.flushed,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "pending": pending
+        }
+
+class CounterAggregator:
+    # apply(key, amount, latest_timestamp) writes one key's accumulated delta
+    # and returns whether it succeeded.
+    def __init__(
+        self, apply: Callable[[str, int, Optional[int]], bool],
+        flush_interval: float = 1.0, max_pending: int = 1000
+    ):
+        self.apply = apply
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._deltas: Dict[str, int] = {}
+        self._timestamps: Dict[str, int] = {}
+        self._window_start: Optional[float] = None
+        self._lock = threading.Lock()
+        self.increments = 0
+        self.updates = 0
+        self.failed = 0
+
+    def add(self, key_value: str, amount: int = 1, timestamp: Optional[int] = None) -> None:
+        with self._lock:
+            self._add(key_value, amount, timestamp)
+            self.increments += 1
+
+    def _add(self, key_value: str, amount: int, timestamp: Optional[int]) -> None:
+        if not self._deltas:
+            self._window_start = time.monotonic()
+        self._deltas[key_value] = self._deltas.get(key_value, 0) + amount
+        if timestamp is not None and timestamp > self._timestamps.get(key_value, 0):
+            self._timestamps[key_value] = timestamp
+
+    def due(self) -> bool:
+        with self._lock:
+            return self._due()
+
+    def _due(self) -> bool:
+        if not self._deltas:
+            return False
+        return len(self._deltas) >= self.max_pending or time.monotonic() - self._window_start >= self.flush_interval
+
+    def flush(self, force: bool = True) -> Dict[str, int]:
+        with self._lock:
+            if not (force and self._deltas) and not self._due():
+                return {"updates": 0, "failed": 0}
+            deltas, self._deltas = self._deltas, {}
+            timestamps, self._timestamps = self._timestamps, {}
+            self._window_start = None
+
+        updates = 0
+        failed = 0
+        for key_value, amount in deltas.items():
+            timestamp = timestamps.get(key_value)
+            try:
+                with timed('storage.add_clicks'):
+                    applied = self.apply(key_value, amount, timestamp)
+            except Exception as e:
+                # Timeouts and connection errors aren't ClientErrors, so the
+                # storage layer lets them through; they mustn't cost the rest
+                # of the flush.
+                logger.error("Error applying click delta for %s: %s", key_value, e)
+                applied = False
+            if applied:
+                updates += 1
+            else:
+                # Keep the delta so the next flush retries it instead of losing
+                # clicks; it isn't a new increment.
+                failed += 1
+                with self._lock:
+                    self._add(key_value, amount, timestamp)
+
+        self.updates += updates
+        self.failed += failed
+        logger.debug("Counter flush: %d updates, %d failed", updates, failed)
+        return {"updates": updates, "failed": failed}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            pending = len(self._deltas)
+        return {
+            "increments": self.increments,
+            "updates": self.updates,
+            "failed": self.failed,
+            "pending": pending
+        }
@@ -0,0 +1,215 @@
+import csv
+import ipaddress
+import os
+from array import array
+from bisect import bisect_right
+from typing import Optional, Dict, List, Tuple, TYPE_CHECKING
+from app.utils.cache import LRUCache, MISSING
+from app.utils.logger import logger
+from app.utils.metrics import metrics, timed
+
+if TYPE_CHECKING:
+    import httpx
+
+GEO_DB_PATH = os.environ.get('GEO_DB_PATH')
+# Opt in with 'ip-api': it sends visitors' raw IPs to ip-api.com over plain
+# HTTP. Off, lookups only use the GEO_DB_PATH table and unknown IPs stay Unknown.
+GEO_REMOTE_PROVIDER = os.environ.get('GEO_REMOTE_PROVIDER', 'none')
+GEO_REMOTE_TIMEOUT = float(os.environ.get('GEO_REMOTE_TIMEOUT', '2.0'))
+GEO_CACHE_SIZE = int(os.environ.get('GEO_CACHE_SIZE', '10000'))
+GEO_CACHE_TTL = float(os.environ.get('GEO_CACHE_TTL', '3600'))
+GEO_NEGATIVE_CACHE_TTL = float(os.environ.get('GEO_NEGATIVE_CACHE_TTL', '60'))
+
+UNKNOWN_LOCATION = {
+    "country": "Unknown",
+    "region": "Unknown",
+    "city": "Unknown"
+}
+
+def parse_ip(ip: str) -> Optional[ipaddress._BaseAddress]:
+    try:
+        return ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+
+def is_public_ip(address: ipaddress._BaseAddress) -> bool:
+    return address.is_global and not address.is_multicast
+
+class LocalGeoEngine:
+    # Range table loaded from a CSV of start_ip,end_ip,country,region,city rows.
+    # IPv4 ranges live in parallel unsigned arrays, IPv6 ranges in sorted lists
+    # (their integers don't fit a fixed-width array); both use binary search.
+    def __init__(self):
+        self._v4_starts = array('I')
+        self._v4_ends = array('I')
+        self._v4_locations = array('I')
+        self._v6_starts: List[int] = []
+        self._v6_ends: List[int] = []
+        self._v6_locations: List[int] = []
+        self._locations: List[Dict[str, str]] = []
+
+    @classmethod
+    def from_csv(cls, path: str) -> "LocalGeoEngine":
+        engine = cls()
+        location_ids: Dict[Tuple[str, str, str], int] = {}
+        v4_rows: List[Tuple[int, int, int]] = []
+        v6_rows: List[Tuple[int, int, int]] = []
+
+        with open(path, newline='') as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith('#') or len(row) < 5:
+                    continue
+                start, end = ipaddress.ip_address(_to_ip(row[0])), ipaddress.ip_address(_to_ip(row[1]))
+                location = (row[2] or "Unknown", row[3] or "Unknown", row[4] or "Unknown")
+                location_id = location_ids.setdefault(location, len(location_ids))
+                rows = v4_rows if start.version == 4 else v6_rows
+                rows.append((int(start), int(end), location_id))
+
+        engine._locations = [
+            {"country": country, "region": region, "city": city}
+            for country, region, city in location_ids
+        ]
+        v4_rows.sort()
+        v6_rows.sort()
+        for start, end, location_id in v4_rows:
+            engine._v4_starts.append(start)
+            engine._v4_ends.append(end)
+            engine._v4_locations.append(location_id)
+        for start, end, location_id in v6_rows:
+            engine._v6_starts.append(start)
+            engine._v6_ends.append(end)
+            engine._v6_locations.append(location_id)
+
+        logger.info("Loaded %d IPv4 and %d IPv6 geolocation ranges from %s", len(v4_rows), len(v6_rows), path)
+        return engine
+
+    def lookup(self, address: ipaddress._BaseAddress) -> Optional[Dict[str, str]]:
+        if address.version == 4:
+            starts, ends, locations = self._v4_starts, self._v4_ends, self._v4_locations
+        else:
+            starts, ends, locations = self._v6_starts, self._v6_ends, self._v6_locations
+        value = int(address)
+        index = bisect_right(starts, value) - 1
+        if index >= 0 and value <= ends[index]:
+            return self._locations[locations[index]]
+        return None
+
+    def __len__(self) -> int:
+        return len(self._v4_starts) + len(self._v6_starts)
+
+def _to_ip(value: str) -> str:
+    value = value.strip()
+    return str(ipaddress.ip_address(int(value))) if value.isdigit() else value
+
+class IpApiProvider:
+    def __init__(self, timeout: float = GEO_REMOTE_TIMEOUT):
+        self.timeout = timeout
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        if self._client is None or self._client.is_closed:
+            # httpx is only needed once a lookup misses the cache and local table.
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+        return self._client
+
+    async def lookup(self, ip: str) -> Optional[Dict[str, str]]:
+        try:
+            response = await self._get_client().get(f"http://ip-api.com/json/{ip}")
+            if response.status_code != 200:
+                logger.warning("Geolocation API returned HTTP %d", response.status_code)
+            else:
+                data = response.json()
+                if data.get("status") == "success":
+                    return {
+                        "country": data.get("country", "Unknown"),
+                        "region": data.get("regionName", "Unknown"),
+                        "city": data.get("city", "Unknown")
+                    }
+                logger.warning("Geolocation API returned status %s: %s", data.get('status'), data.get('message', 'No message'))
+        except Exception as e:
+            logger.error("Error calling geolocation API: %s", e)
+        return None
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class Geolocator:
+    def __init__(
+        self, local: Optional[LocalGeoEngine] = None,
+        remote: Optional[IpApiProvider] = None,
+        cache: Optional[LRUCache] = None,
+        negative_ttl: float = GEO_NEGATIVE_CACHE_TTL
+    ):
+        self.local = local
+        self.remote = remote
+        self.cache = cache if cache is not None else LRUCache(GEO_CACHE_SIZE, GEO_CACHE_TTL)
+        self.negative_ttl = negative_ttl
+
+    async def lookup(self, ip: str) -> Dict[str, str]:
+        cached = self.cache.get(ip)
+        if cached is not MISSING:
+            return cached
+
+        address = parse_ip(ip)
+        if address is None or not is_public_ip(address):
+            self.cache.set(ip, UNKNOWN_LOCATION)
+            return UNKNOWN_LOCATION
+
+        location = self.local.lookup(address) if self.local is not None else None
+        if location is None and self.remote is not None:
+            with timed('geolocation.remote'):
+                location = await self.remote.lookup(ip)
+
+        if location is None:
+            self.cache.set(ip, UNKNOWN_LOCATION, ttl=self.negative_ttl)
+            return UNKNOWN_LOCATION
+
+        self.cache.set(ip, location)
+        return location
+
+    async def aclose(self) -> None:
+        if self.remote is not None:
+            await self.remote.aclose()
+
+def build_geolocator() -> Geolocator:
+    local = None
+    if GEO_DB_PATH:
+        try:
+            local = LocalGeoEngine.from_csv(GEO_DB_PATH)
+        except (OSError, ValueError) as e:
+            logger.error("Error loading geolocation table %s: %s", GEO_DB_PATH, e)
+    remote = IpApiProvider() if GEO_REMOTE_PROVIDER == 'ip-api' else None
+    return Geolocator(local=local, remote=remote)
+
+_geolocator: Optional[Geolocator] = None
+
+def get_geolocator() -> Geolocator:
+    # Built on first click rather than at import: loading the range table is
+    # analytics-only work that redirects and cold starts shouldn't pay for.
+    global _geolocator
+    if _geolocator is None:
+        _geolocator = build_geolocator()
+    return _geolocator
+
+async def close_geolocator() -> None:
+    global _geolocator
+    if _geolocator is not None:
+        await _geolocator.aclose()
+        _geolocator = None
+
+def _collect_geolocation_cache():
+    # Reports nothing until the first click builds the geolocator.
+    if _geolocator is None:
+        return []
+    return [
+        (f"tinylinker_geolocation_cache_{name}", 'gauge', f"Geolocation cache: {name}", {}, float(value))
+        for name, value in _geolocator.cache.stats().items()
+    ]
+
+metrics.register_collector(_collect_geolocation_cache)
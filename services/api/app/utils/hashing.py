@@ -1,16 +1,56 @@
 import hashlib
 import os
-from datetime import datetime
-from app.utils.logger import logger
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+IP_SALT_SECRET = os.environ.get('IP_SALT_SECRET', 'default-salt')
+
+DAY_SECONDS = 86400
 
 def hash_string(input_str: str) -> str:
-    hashed = hashlib.sha256(input_str.encode()).hexdigest()
-    logger.info("String hashed successfully")
-    return hashed
+    return hashlib.sha256(input_str.encode()).hexdigest()
+
+class IpHasher:
+    # IP hashes are only comparable within one UTC day: each day gets its own
+    # BLAKE2b key derived from the secret, so yesterday's hashes can't be joined
+    # to today's. The keyed state is built once per day and copied per IP.
+    def __init__(self, secret: str = IP_SALT_SECRET, digest_size: int = 32):
+        self._secret = hashlib.blake2b(secret.encode(), digest_size=64).digest()
+        self.digest_size = digest_size
+        self._state: Optional["hashlib._Hash"] = None
+        self._expires_at = 0.0
+
+    def _rotate(self, now: float) -> "hashlib._Hash":
+        day_start = now - now % DAY_SECONDS
+        date = datetime.fromtimestamp(day_start, tz=timezone.utc).strftime('%Y-%m-%d')
+        day_key = hashlib.blake2b(date.encode(), key=self._secret, digest_size=32).digest()
+        state = hashlib.blake2b(key=day_key, digest_size=self.digest_size)
+        self._state, self._expires_at = state, day_start + DAY_SECONDS
+        return state
+
+    def _current_state(self) -> "hashlib._Hash":
+        now = time.time()
+        state = self._state
+        if state is None or now >= self._expires_at:
+            state = self._rotate(now)
+        return state
+
+    def hash(self, ip: str) -> str:
+        digest = self._current_state().copy()
+        digest.update(ip.encode())
+        return digest.hexdigest()
+
+    def hash_many(self, ips: Iterable[str]) -> List[str]:
+        state = self._current_state()
+        hashes = []
+        for ip in ips:
+            digest = state.copy()
+            digest.update(ip.encode())
+            hashes.append(digest.hexdigest())
+        return hashes
+
+ip_hasher = IpHasher()
 
 def hash_ip(ip: str) -> str:
-    date = datetime.utcnow().strftime('%Y-%m-%d')
-    salt = os.environ.get('IP_SALT_SECRET', 'default-salt')
-    hashed = hash_string(f"{ip}{date}{salt}")
-    logger.info(f"IP hashed for date: {date}")
-    return hashed
\ No newline at end of file
+    return ip_hasher.hash(ip)
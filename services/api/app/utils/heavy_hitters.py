@@ -0,0 +1,130 @@
+import heapq
+import math
+from array import array
+from hashlib import blake2b
+from operator import add
+from typing import Dict, List, Optional, Tuple
+
+def key_hashes(key: str) -> Tuple[int, int]:
+    # Two 64-bit hashes from one digest; row i uses h1 + i * h2
+    # (Kirsch-Mitzenmacher), so a key is hashed once for every sketch it feeds.
+    digest = blake2b(key.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+# Count-Min sketch: `depth` rows of `width` counters. Estimates never
+# undercount, and overcount by more than e / width * N (N = everything
+# added) with probability at most e^-depth. Merging adds counters, so the
+# bound holds for a merged sketch with N its combined total.
+class CountMinSketch:
+    def __init__(self, width: int, depth: int, counters: Optional[array] = None, total: int = 0):
+        if width < 1 or depth < 1:
+            raise ValueError("Count-Min sketch needs a positive width and depth")
+        self.width = width
+        self.depth = depth
+        self.counters = counters if counters is not None else array('I', bytes(4 * width * depth))
+        self.total = total
+
+    @classmethod
+    def for_error(cls, epsilon: float, delta: float) -> "CountMinSketch":
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    @property
+    def epsilon(self) -> float:
+        return math.e / self.width
+
+    @property
+    def delta(self) -> float:
+        return math.exp(-self.depth)
+
+    def add_hashes(self, h1: int, h2: int, count: int = 1) -> None:
+        counters, width = self.counters, self.width
+        for row in range(self.depth):
+            counters[row * width + (h1 + row * h2) % width] += count
+        self.total += count
+
+    def add(self, key: str, count: int = 1) -> None:
+        self.add_hashes(*key_hashes(key), count)
+
+    def estimate_hashes(self, h1: int, h2: int) -> int:
+        counters, width = self.counters, self.width
+        return min(counters[row * width + (h1 + row * h2) % width] for row in range(self.depth))
+
+    def estimate(self, key: str) -> int:
+        return self.estimate_hashes(*key_hashes(key))
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge Count-Min sketches of different sizes")
+        self.counters = array('I', map(add, self.counters, other.counters))
+        self.total += other.total
+
+# Space-Saving top-k summary (Metwally et al.) over at most `capacity` keys.
+# A key's count overestimates its true count by at most its `error`, which is
+# at most N / capacity; a key that isn't in the summary occurred at most
+# min_count() <= N / capacity times. So every key with more than N / capacity
+# occurrences is in it.
+class SpaceSaving:
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError("Space-Saving needs a positive capacity")
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.total = 0
+        # One (count, key) entry per key. Counts only grow, so an entry may lag
+        # its key's count; _pop_min re-files lagging entries until the top is
+        # exact, which is then the true minimum.
+        self._heap: List[Tuple[int, str]] = []
+
+    @classmethod
+    def from_entries(cls, capacity: int, entries: List[Tuple[str, int, int]], total: int) -> "SpaceSaving":
+        summary = cls(capacity)
+        for key, count, error in entries:
+            summary.counts[key] = count
+            summary.errors[key] = error
+        summary._heap = [(count, key) for key, count in summary.counts.items()]
+        heapq.heapify(summary._heap)
+        summary.total = total
+        return summary
+
+    def entries(self) -> List[Tuple[str, int, int]]:
+        return [(key, count, self.errors[key]) for key, count in self.counts.items()]
+
+    def _settle(self) -> None:
+        heap, counts = self._heap, self.counts
+        while True:
+            count, key = heap[0]
+            current = counts[key]
+            if count == current:
+                return
+            heapq.heapreplace(heap, (current, key))
+
+    def _pop_min(self) -> Tuple[int, str]:
+        self._settle()
+        return heapq.heappop(self._heap)
+
+    def min_count(self) -> int:
+        # Only touches the heap when an entry lags, so a summary nothing adds
+        # to any more can be read from several threads.
+        if len(self.counts) < self.capacity:
+            return 0
+        self._settle()
+        return self._heap[0][0]
+
+    def add(self, key: str, count: int = 1) -> None:
+        self.total += count
+        counts = self.counts
+        if key in counts:
+            counts[key] += count
+            return
+        if len(counts) < self.capacity:
+            counts[key] = count
+            self.errors[key] = 0
+            heapq.heappush(self._heap, (count, key))
+            return
+        floor, evicted = self._pop_min()
+        del counts[evicted]
+        del self.errors[evicted]
+        counts[key] = floor + count
+        self.errors[key] = floor
+        heapq.heappush(self._heap, (floor + count, key))
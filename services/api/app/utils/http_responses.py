@@ -0,0 +1,14 @@
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+from typing import Optional
+
+class PrebuiltRedirectResponse(Response):
+    # RedirectResponse quotes the URL and builds a header list on every
+    # request; this takes the already-encoded Location value instead. The
+    # header list is new per response (middleware may append to it), while
+    # the byte strings in it are shared.
+    def __init__(self, location: bytes, status_code: int = 307, background: Optional[BackgroundTask] = None):
+        self.status_code = status_code
+        self.background = background
+        self.body = b""
+        self.raw_headers = [(b"location", location), (b"content-length", b"0")]
@@ -1,18 +1,167 @@
+import atexit
+import contextvars
+import json
 import logging
+import os
+import queue
+import random
 import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, Dict, Any
+
+ENVIRONMENT = os.environ.get('ENVIRONMENT', 'development')
+# Per-request detail is logged at DEBUG, so at the default levels the hot
+# paths only pay for an isEnabledFor check.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING' if ENVIRONMENT == 'production' else 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+# Records are handed to a background thread that formats and writes them.
+LOG_ASYNC = os.environ.get('LOG_ASYNC', 'true').lower() == 'true'
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+# Fraction of requests whose DEBUG records are kept when DEBUG is enabled.
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+
+# Fields added to every record logged while handling the current request.
+_request_context: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar('log_request_context', default=None)
+_debug_sampled: contextvars.ContextVar[Optional[bool]] = contextvars.ContextVar('log_debug_sampled', default=None)
+
+# LogRecord attributes that aren't caller-supplied `extra` fields.
+_RECORD_FIELDS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line: fixed fields first, then the request context
+    # and anything passed as `extra`.
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        context = getattr(record, 'context', None)
+        if context:
+            entry.update(context)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and key != 'context':
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+JsonFormatter.converter = time.gmtime
+
+class ContextFilter(logging.Filter):
+    # Attaches the request context and drops DEBUG records of requests that
+    # weren't sampled. Runs on the logger, before anything is queued.
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and LOG_DEBUG_SAMPLE_RATE < 1.0:
+            sampled = _debug_sampled.get()
+            if sampled is None:
+                sampled = random.random() < LOG_DEBUG_SAMPLE_RATE
+            if not sampled:
+                return False
+        record.context = _request_context.get()
+        return True
+
+class DroppingQueueHandler(QueueHandler):
+    # A full queue drops the record instead of blocking the request thread.
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now (they may be mutated after the call returns)
+        # and leave the rest of the formatting to the listener thread.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+
+def _build_formatter() -> logging.Formatter:
+    if LOG_FORMAT == 'json':
+        return JsonFormatter()
+    return logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 def setup_logger(name: str = "tinylinker") -> logging.Logger:
+    global _listener, _queue_handler
     logger = logging.getLogger(name)
 
     if not logger.handlers:
         handler = logging.StreamHandler(sys.stdout)
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-        )
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-        logger.setLevel(logging.INFO)
+        handler.setFormatter(_build_formatter())
+        if LOG_ASYNC:
+            log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+            _queue_handler = DroppingQueueHandler(log_queue)
+            _listener = QueueListener(log_queue, handler)
+            _listener.start()
+            atexit.register(_listener.stop)
+            logger.addHandler(_queue_handler)
+        else:
+            logger.addHandler(handler)
+        logger.addFilter(ContextFilter())
+        logger.setLevel(LOG_LEVEL)
+        # The Lambda runtime puts its own handler on the root logger.
+        logger.propagate = False
 
     return logger
 
-logger = setup_logger()
\ No newline at end of file
+def set_request_context(**fields: Any) -> contextvars.Token:
+    # Called at the start of a request; the sampling decision is made once so
+    # a sampled request keeps all of its DEBUG records.
+    if LOG_DEBUG_SAMPLE_RATE < 1.0:
+        _debug_sampled.set(random.random() < LOG_DEBUG_SAMPLE_RATE)
+    return _request_context.set(fields)
+
+def reset_request_context(token: contextvars.Token) -> None:
+    _request_context.reset(token)
+    _debug_sampled.set(None)
+
+class RequestContextMiddleware:
+    # Tags every record logged during a request with its id, taken from the
+    # Lambda context when Mangum provides one.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        aws_context = scope.get('aws.context')
+        request_id = getattr(aws_context, 'aws_request_id', None) or os.urandom(8).hex()
+        token = set_request_context(requestId=request_id, method=scope['method'], path=scope['path'])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            reset_request_context(token)
+
+def flush_logs(timeout: float = 1.0) -> bool:
+    # Waits for the listener to drain the queue, e.g. before Lambda freezes
+    # the container after an invocation.
+    if _queue_handler is None:
+        return True
+    deadline = time.monotonic() + timeout
+    while _queue_handler.queue.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.001)
+    return True
+
+def log_stats() -> Dict[str, int]:
+    if _queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
+
+logger = setup_logger()
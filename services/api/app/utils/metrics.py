@@ -0,0 +1,265 @@
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_EMF_ENABLED = os.environ.get('METRICS_EMF_ENABLED', 'false').lower() == 'true'
+METRICS_EMF_INTERVAL = float(os.environ.get('METRICS_EMF_INTERVAL', '60'))
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'TinyLinker')
+
+# Seconds; spans in-process work (microseconds) up to slow remote calls.
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+# A collector returns (name, type, help, labels, value) samples at scrape time.
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; stored per-bucket, exported cumulative.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+def quantile(buckets: Tuple[float, ...], counts: List[int], q: float) -> float:
+    # Upper bound of the bucket holding the q-th observation, as Prometheus'
+    # histogram_quantile would report it without interpolation.
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for index, count in enumerate(counts):
+        seen += count
+        if seen >= rank:
+            return buckets[index] if index < len(buckets) else buckets[-1]
+    return buckets[-1]
+
+class MetricsRegistry:
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        self.histogram(name, **labels).observe(value)
+
+    def register_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        self._collectors.append(collector)
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        typed = set()
+
+        def header(name: str, metric_type: str, help_text: Optional[str] = None) -> None:
+            if name in typed:
+                return
+            typed.add(name)
+            lines.append(f"# HELP {name} {help_text or self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda entry: entry[0])
+
+        for (name, labels), value in counters:
+            header(name, 'counter')
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), histogram in histograms:
+            header(name, 'histogram')
+            counts, total, count = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(histogram.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for collector in self._collectors:
+            for name, metric_type, help_text, labels, value in collector():
+                header(name, metric_type, help_text)
+                lines.append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    def histogram_snapshots(self, name: str) -> Dict[Labels, Tuple[Tuple[float, ...], List[int], float, int]]:
+        with self._lock:
+            histograms = [(key[1], histogram) for key, histogram in self._histograms.items() if key[0] == name]
+        return {labels: (histogram.buckets, *histogram.snapshot()) for labels, histogram in histograms}
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+metrics = MetricsRegistry()
+
+STAGE_METRIC = 'tinylinker_stage_duration_seconds'
+REQUEST_METRIC = 'tinylinker_request_duration_seconds'
+metrics.describe(STAGE_METRIC, "Time spent per processing stage")
+metrics.describe(REQUEST_METRIC, "HTTP request latency by route")
+metrics.describe('tinylinker_requests_total', "HTTP requests by route and status")
+
+class StageTimer:
+    # Context manager around one stage: `with timed('storage.get_url'): ...`.
+    # The histogram is resolved once per stage name and reused.
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: Optional[Histogram]):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def __enter__(self) -> "StageTimer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.histogram is not None:
+            self.histogram.observe(time.perf_counter() - self.start)
+
+_stage_histograms: Dict[str, Histogram] = {}
+
+def timed(stage: str) -> StageTimer:
+    if not METRICS_ENABLED:
+        return StageTimer(None)
+    histogram = _stage_histograms.get(stage)
+    if histogram is None:
+        histogram = _stage_histograms[stage] = metrics.histogram(STAGE_METRIC, stage=stage)
+    return StageTimer(histogram)
+
+def stats_collector(prefix: str, stats: Callable[[], Dict[str, Any]], help_text: str, **labels: str) -> Callable[[], List[Sample]]:
+    # Exposes a component's stats() dict as gauges: {"hits": 3} on prefix
+    # "tinylinker_url_cache" becomes tinylinker_url_cache_hits 3.
+    def collect() -> List[Sample]:
+        return [
+            (f"{prefix}_{_snake_case(name)}", 'gauge', f"{help_text}: {name}", labels, float(value))
+            for name, value in stats().items()
+            if isinstance(value, (int, float))
+        ]
+    return collect
+
+def _snake_case(name: str) -> str:
+    return ''.join(f"_{char.lower()}" if char.isupper() else char for char in name)
+
+class MetricsMiddleware:
+    # Request latency by route template (not raw path, which would make one
+    # series per short code).
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get('route')
+            path = getattr(route, 'path', None) or 'unmatched'
+            metrics.observe(REQUEST_METRIC, time.perf_counter() - start, route=path, method=scope['method'])
+            metrics.inc('tinylinker_requests_total', route=path, method=scope['method'], status=str(status))
+
+_last_emf: Dict[Labels, Tuple[List[int], float, int]] = {}
+_next_emf = 0.0
+_emf_lock = threading.Lock()
+
+def emit_emf(force: bool = False, stream=None) -> bool:
+    # CloudWatch Embedded Metric Format: one JSON log line per stage with the
+    # count, total time and estimated p50/p99 since the previous emission.
+    # CloudWatch extracts them as metrics with a "Stage" dimension.
+    global _next_emf
+    now = time.time()
+    with _emf_lock:
+        if not force and now < _next_emf:
+            return False
+        _next_emf = now + METRICS_EMF_INTERVAL
+        snapshots = metrics.histogram_snapshots(STAGE_METRIC)
+        previous = dict(_last_emf)
+        _last_emf.update({labels: (counts, total, count) for labels, (_, counts, total, count) in snapshots.items()})
+
+    stream = stream or sys.stdout
+    for labels, (buckets, counts, total, count) in snapshots.items():
+        before_counts, before_total, before_count = previous.get(labels, ([0] * len(counts), 0.0, 0))
+        delta = [after - prior for after, prior in zip(counts, before_counts)]
+        if count == before_count:
+            continue
+        stream.write(json.dumps({
+            "_aws": {
+                "Timestamp": int(now * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["Stage"]],
+                    "Metrics": [
+                        {"Name": "StageCount", "Unit": "Count"},
+                        {"Name": "StageTime", "Unit": "Milliseconds"},
+                        {"Name": "StageP50", "Unit": "Milliseconds"},
+                        {"Name": "StageP99", "Unit": "Milliseconds"}
+                    ]
+                }]
+            },
+            "Stage": dict(labels).get('stage', 'unknown'),
+            "StageCount": count - before_count,
+            "StageTime": (total - before_total) * 1000,
+            "StageP50": quantile(buckets, delta, 0.5) * 1000,
+            "StageP99": quantile(buckets, delta, 0.99) * 1000
+        }) + "\n")
+    stream.flush()
+    return True
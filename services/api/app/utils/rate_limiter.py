@@ -0,0 +1,296 @@
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Tuple
+from app.storage.base import StorageBackend, get_storage
+from app.utils.hashing import hash_ip, hash_string
+from app.utils.logger import logger
+from app.utils.metrics import metrics, stats_collector
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_WINDOW_SECONDS = int(os.environ.get('RATE_LIMIT_WINDOW_SECONDS', '60'))
+RATE_LIMIT_CREATE_LIMIT = int(os.environ.get('RATE_LIMIT_CREATE_LIMIT', '30'))
+# Links per window through /shorten/batch. It has its own budget so one
+# full-size batch fits; sized to SHORTEN_BATCH_MAX_ITEMS unless set.
+RATE_LIMIT_BATCH_LINK_LIMIT = int(
+    os.environ.get('RATE_LIMIT_BATCH_LINK_LIMIT', os.environ.get('SHORTEN_BATCH_MAX_ITEMS', '10000'))
+)
+RATE_LIMIT_REDIRECT_LIMIT = int(os.environ.get('RATE_LIMIT_REDIRECT_LIMIT', '600'))
+RATE_LIMIT_LEASE_FRACTION = float(os.environ.get('RATE_LIMIT_LEASE_FRACTION', '0.1'))
+RATE_LIMIT_MAX_TRACKED = int(os.environ.get('RATE_LIMIT_MAX_TRACKED', '10000'))
+# After a store error, refills grant a lease without asking the store for
+# this long (or until the window ends), so an outage doesn't make every
+# request wait out the client's retries.
+RATE_LIMIT_ERROR_BACKOFF_SECONDS = float(os.environ.get('RATE_LIMIT_ERROR_BACKOFF_SECONDS', '5'))
+
+# SHA-256 hex digests of the issued API keys, comma separated. A request
+# with one of them gets the key's own bucket; any other X-Api-Key is ignored
+# and the request is limited by IP, so made-up keys can't mint fresh buckets.
+RATE_LIMIT_API_KEY_HASHES = frozenset(
+    digest.strip().lower() for digest in os.environ.get('RATE_LIMIT_API_KEY_HASHES', '').split(',') if digest.strip()
+)
+
+API_KEY_HEADER = b'x-api-key'
+RESERVED_PATHS = {'/health', '/docs', '/redoc', '/metrics', '/trending'}
+# Single-segment routes that look like short codes; the redirect rule skips
+# them so they don't spend a client's redirect budget.
+ROUTE_NAMES = sorted({path.lstrip('/') for path in RESERVED_PATHS} | {'shorten'})
+
+@dataclass
+class RateLimitRule:
+    name: str
+    methods: Tuple[str, ...]
+    path: "re.Pattern"
+    limit: int
+
+DEFAULT_RULES = [
+    RateLimitRule('create-batch', ('POST',), re.compile(r'^/shorten/batch$'), RATE_LIMIT_BATCH_LINK_LIMIT),
+    RateLimitRule('create', ('POST',), re.compile(r'^/shorten(/.*)?$'), RATE_LIMIT_CREATE_LIMIT),
+    RateLimitRule('redirect', ('GET', 'HEAD'), re.compile(rf"^/(?!(?:{'|'.join(ROUTE_NAMES)})$)[0-9A-Za-z]{{3,20}}$"), RATE_LIMIT_REDIRECT_LIMIT),
+]
+
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_at: float
+
+    def retry_after(self, now: Optional[float] = None) -> int:
+        return max(1, math.ceil(self.reset_at - (now if now is not None else time.time())))
+
+    def headers(self) -> List[Tuple[bytes, bytes]]:
+        headers = [
+            (b'x-ratelimit-limit', str(self.limit).encode()),
+            (b'x-ratelimit-remaining', str(self.remaining).encode()),
+            (b'x-ratelimit-reset', str(int(math.ceil(self.reset_at))).encode())
+        ]
+        if not self.allowed:
+            headers.append((b'retry-after', str(self.retry_after()).encode()))
+        return headers
+
+@dataclass
+class RateLimitCharge:
+    # Left in the request state by the middleware so a route can charge more
+    # than one token once it knows what the request costs (a batch of creates).
+    limiter: "RateLimiter"
+    identifier: str
+    limit: int
+    decision: RateLimitDecision
+
+class LocalBucket:
+    # Tokens leased from the shared window row. Requests are decided against
+    # the local balance; the store is only consulted when it runs dry.
+    __slots__ = ('window_start', 'tokens', 'global_count', 'exhausted')
+
+    def __init__(self, window_start: int):
+        self.window_start = window_start
+        self.tokens = 0
+        self.global_count = 0
+        self.exhausted = False
+
+class RateLimiter:
+    def __init__(
+        self, storage: StorageBackend, window_seconds: int = RATE_LIMIT_WINDOW_SECONDS,
+        lease_fraction: float = RATE_LIMIT_LEASE_FRACTION,
+        max_tracked: int = RATE_LIMIT_MAX_TRACKED,
+        error_backoff: float = RATE_LIMIT_ERROR_BACKOFF_SECONDS
+    ):
+        self.storage = storage
+        self.window_seconds = window_seconds
+        self.lease_fraction = lease_fraction
+        self.max_tracked = max_tracked
+        self.error_backoff = error_backoff
+        self._buckets: Dict[str, LocalBucket] = {}
+        # One store refill in flight per identifier; concurrent requests that
+        # find the bucket empty wait for it instead of each leasing more.
+        self._refills: Dict[str, "asyncio.Future"] = {}
+        self._backoff_until = 0.0
+        self._decisions = 0
+        self._store_calls = 0
+        self._store_errors = 0
+        self._fail_open = 0
+
+    def _lease_size(self, limit: int) -> int:
+        return max(1, int(limit * self.lease_fraction))
+
+    def _prune(self, current_window: int) -> None:
+        stale = [key for key, bucket in self._buckets.items() if bucket.window_start < current_window]
+        for key in stale:
+            del self._buckets[key]
+        while len(self._buckets) >= self.max_tracked:
+            self._buckets.pop(next(iter(self._buckets)))
+
+    async def check(self, identifier: str, limit: int, now: Optional[float] = None, cost: int = 1) -> RateLimitDecision:
+        now = time.time() if now is None else now
+        window = int(now // self.window_seconds) * self.window_seconds
+        reset_at = float(window + self.window_seconds)
+
+        self._decisions += 1
+        bucket = self._buckets.get(identifier)
+        if bucket is None or bucket.window_start != window:
+            if bucket is None and len(self._buckets) >= self.max_tracked:
+                self._prune(window)
+            bucket = self._buckets[identifier] = LocalBucket(window)
+
+        # A charge the whole window couldn't cover is refused outright, before
+        # it can reach the store or a fail-open grant.
+        if cost > limit:
+            remaining = max(0, limit - bucket.global_count) + bucket.tokens
+            return RateLimitDecision(False, limit, remaining, reset_at)
+
+        # A refill someone else started may leave too little for this charge
+        # once the other waiters have taken theirs; then try again, until this
+        # request's own refill has run.
+        while bucket.tokens < cost and not bucket.exhausted:
+            refill = self._refills.get(identifier)
+            if refill is not None:
+                await asyncio.shield(refill)
+                continue
+            refill = self._refills[identifier] = asyncio.ensure_future(
+                self._refill(identifier, bucket, limit, now, reset_at, cost - bucket.tokens)
+            )
+            refill.add_done_callback(lambda done, identifier=identifier: self._refill_done(identifier, done))
+            await asyncio.shield(refill)
+            break
+
+        remaining = max(0, limit - bucket.global_count) + bucket.tokens
+        if bucket.tokens >= cost:
+            bucket.tokens -= cost
+            return RateLimitDecision(True, limit, remaining - cost, reset_at)
+
+        # A charge larger than what's left takes nothing.
+        return RateLimitDecision(False, limit, remaining, reset_at)
+
+    def _refill_done(self, identifier: str, refill: "asyncio.Future") -> None:
+        if self._refills.get(identifier) is refill:
+            del self._refills[identifier]
+
+    def _grant_fail_open(self, bucket: LocalBucket, limit: int, needed: int) -> None:
+        # Fail open: a store outage shouldn't take redirects down with it. A
+        # normal lease keeps requests local until the backoff ends.
+        self._fail_open += 1
+        bucket.tokens += max(self._lease_size(limit), needed)
+
+    async def _refill(
+        self, identifier: str, bucket: LocalBucket, limit: int, now: float, reset_at: float, needed: int = 1
+    ) -> None:
+        if now < self._backoff_until:
+            self._grant_fail_open(bucket, limit, needed)
+            return
+        window_start_ms = bucket.window_start * 1000
+        # Rows outlive their window by one more window; DynamoDB TTL reads epoch seconds.
+        expires_at = int(reset_at) + self.window_seconds
+        # A full lease first, then just what's needed: near the limit the full
+        # lease no longer fits but individual requests still do.
+        for amount in sorted({max(self._lease_size(limit), needed), needed}, reverse=True):
+            self._store_calls += 1
+            try:
+                count = await self.storage.aacquire_rate_limit(identifier, window_start_ms, amount, limit, expires_at)
+            except Exception as e:
+                self._store_errors += 1
+                self._backoff_until = min(reset_at, now + self.error_backoff)
+                logger.error("Rate limit store error for %s, failing open until %.0f: %s", identifier, self._backoff_until, e)
+                self._grant_fail_open(bucket, limit, needed)
+                return
+            if count is not None:
+                bucket.tokens += amount
+                bucket.global_count = count
+                return
+        # Only a single token failing means the window is used up; a larger
+        # charge may just not fit.
+        if needed == 1:
+            bucket.exhausted = True
+            bucket.global_count = limit
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tracked": len(self._buckets),
+            "decisions": self._decisions,
+            "storeCalls": self._store_calls,
+            "storeErrors": self._store_errors,
+            "failOpen": self._fail_open
+        }
+
+class RateLimitMiddleware:
+    def __init__(
+        self, app, limiter: Optional[RateLimiter] = None, rules: Optional[List[RateLimitRule]] = None,
+        api_key_hashes: frozenset = RATE_LIMIT_API_KEY_HASHES
+    ):
+        self.app = app
+        self.limiter = limiter if limiter is not None else RateLimiter(get_storage())
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.api_key_hashes = api_key_hashes
+        metrics.register_collector(stats_collector('tinylinker_rate_limiter', self.limiter.stats, "Rate limiter"))
+
+    def _match(self, method: str, path: str) -> Optional[RateLimitRule]:
+        if path in RESERVED_PATHS:
+            return None
+        for rule in self.rules:
+            if method in rule.methods and rule.path.match(path):
+                return rule
+        return None
+
+    def _client_identifier(self, scope: Dict[str, Any]) -> str:
+        for name, value in scope.get('headers', ()):
+            if name == API_KEY_HEADER and value and self.api_key_hashes:
+                digest = hash_string(value.decode('latin-1'))
+                if digest in self.api_key_hashes:
+                    return f"key:{digest[:32]}"
+                break
+        client = scope.get('client')
+        return f"ip:{hash_ip(client[0] if client else 'unknown')[:32]}"
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        rule = self._match(scope['method'], scope['path'])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        identifier = f"{rule.name}#{self._client_identifier(scope)}"
+        decision = await self.limiter.check(identifier, rule.limit)
+
+        if not decision.allowed:
+            body = json.dumps({"detail": "Rate limit exceeded"}).encode()
+            await send({
+                'type': 'http.response.start',
+                'status': 429,
+                'headers': [
+                    (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode())
+                ] + decision.headers()
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            return
+
+        charge = RateLimitCharge(self.limiter, identifier, rule.limit, decision)
+        scope.setdefault('state', {})['rate_limit'] = charge
+
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start':
+                message = dict(message)
+                message['headers'] = list(message.get('headers', [])) + charge.decision.headers()
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+async def charge_rate_limit(request, cost: int) -> Optional[RateLimitDecision]:
+    # Charges `cost` more tokens against the rule that matched the request.
+    # None when the request isn't rate limited.
+    charge = request.scope.get('state', {}).get('rate_limit')
+    if charge is None or cost <= 0:
+        return None
+    decision = await charge.limiter.check(charge.identifier, charge.limit, cost=cost)
+    # With what the request already paid, a charge of the whole limit can
+    # never fit. That's the request's size, not the client's rate, so the
+    # response keeps the first decision's headers and no Retry-After.
+    if decision.allowed or cost < charge.limit:
+        charge.decision = decision
+    return decision
@@ -0,0 +1,295 @@
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Dict, Any, Iterable, Iterator, Tuple
+from app.utils.bloom_filter import file_lock
+from app.utils.cache import MISSING
+from app.utils.time_utils import get_current_timestamp
+
+# Segment layout: a fixed header, GENERATIONS change counters, then `slots`
+# fixed-size slots. Each slot is a small header, the short code and the
+# target URL:
+#   seq, checksum, state, flags, code length, url length, expires_at, cached_until
+MAGIC = b'TLHT'
+VERSION = 2
+HEADER = struct.Struct('<4sHxxII')  # magic, version, slots, slot bytes
+HEADER_SIZE = 64
+# A code's counter (shared by the codes that hash alike) moves whenever it's
+# created or invalidated, so a reader can tell whether its "not found" is
+# still current.
+GENERATIONS = 4096
+GENERATION = struct.Struct('<I')
+SLOTS_OFFSET = HEADER_SIZE + GENERATIONS * GENERATION.size
+SLOT = struct.Struct('<IIBBBxHqq')
+SEQ = struct.Struct('<I')
+META = struct.Struct('<BBqq')
+CODE_MAX = 20
+
+EMPTY = 0
+LINK = 1
+ABSENT = 2
+DELETED = 3
+
+SAFE = 1
+NO_EXPIRY = -1
+
+# Linear probing is bounded: a lookup touches at most this many slots, and an
+# insert with no free slot in its window evicts the entry closest to expiry.
+MAX_PROBES = 16
+READ_RETRIES = 8
+
+@contextmanager
+def _untracked() -> Iterator[None]:
+    # Before Python 3.13 every SharedMemory registers itself with the resource
+    # tracker, which unlinks the segment as soon as any process that opened it
+    # exits. The server owns the segment's lifetime here, so the tracker is
+    # kept out of it entirely. Only called at startup and shutdown.
+    register, unregister = resource_tracker.register, resource_tracker.unregister
+
+    def skip_shared_memory(original):
+        def call(name, rtype):
+            if rtype != 'shared_memory':
+                original(name, rtype)
+        return call
+
+    resource_tracker.register = skip_shared_memory(register)
+    resource_tracker.unregister = skip_shared_memory(unregister)
+    try:
+        yield
+    finally:
+        resource_tracker.register, resource_tracker.unregister = register, unregister
+
+def _open_segment(name: str, create: bool = False, size: int = 0) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:
+        with _untracked():
+            return shared_memory.SharedMemory(name=name, create=create, size=size)
+
+def _checksum(state: int, flags: int, expires_at: int, cached_until: int, key: bytes, payload: bytes) -> int:
+    return zlib.crc32(payload, zlib.crc32(key, zlib.crc32(META.pack(state, flags, expires_at, cached_until))))
+
+class SharedLinkTable:
+    # shortCode -> target URL, in a shared memory segment every worker maps.
+    # Reads take no lock and make no system call: each slot is guarded by a
+    # sequence counter that writers make odd while they change the slot, and
+    # a reader that sees it change (or odd) reads again. A checksum over the
+    # slot catches a torn read the counter alone can't on weakly ordered CPUs.
+    # Writers serialise on an flock, so a create or invalidation in one worker
+    # is what every other worker reads next.
+    def __init__(self, segment: shared_memory.SharedMemory, owner: bool = False):
+        magic, version, slots, slot_bytes = HEADER.unpack_from(segment.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            segment.close()
+            raise ValueError(f"Shared memory segment {segment.name} is not a hot link table")
+        self.segment = segment
+        self.name = segment.name.lstrip('/')
+        self.owner = owner
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.url_capacity = slot_bytes - SLOT.size - CODE_MAX
+        self.lock_path = os.path.join(tempfile.gettempdir(), self.name)
+        self._buf = segment.buf
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.retries = 0
+        self.evictions = 0
+        self.oversize = 0
+
+    @classmethod
+    def create(cls, name: str, slots: int, slot_bytes: int = 512) -> "SharedLinkTable":
+        if slots <= 0 or slot_bytes <= SLOT.size + CODE_MAX:
+            raise ValueError("Hot link table needs at least one slot and room for a URL in each")
+        segment = _open_segment(name, create=True, size=SLOTS_OFFSET + slots * slot_bytes)
+        HEADER.pack_into(segment.buf, 0, MAGIC, VERSION, slots, slot_bytes)
+        return cls(segment, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedLinkTable":
+        return cls(_open_segment(name))
+
+    def _probe(self, key: bytes) -> Iterator[int]:
+        # crc32 rather than hash(): string hashes are salted per process.
+        index = zlib.crc32(key) % self.slots
+        for i in range(min(MAX_PROBES, self.slots)):
+            yield SLOTS_OFFSET + (index + i) % self.slots * self.slot_bytes
+
+    @staticmethod
+    def _generation_offset(key: bytes) -> int:
+        return HEADER_SIZE + zlib.crc32(key) % GENERATIONS * GENERATION.size
+
+    def generation(self, short_code: str) -> int:
+        # Taken before reading the table; see set_missing.
+        return GENERATION.unpack_from(self._buf, self._generation_offset(short_code.encode()))[0]
+
+    def _bump(self, key: bytes) -> None:
+        # Under the writer lock.
+        offset = self._generation_offset(key)
+        GENERATION.pack_into(self._buf, offset, (GENERATION.unpack_from(self._buf, offset)[0] + 1) & 0xFFFFFFFF)
+
+    def _read_slot(self, offset: int, key: bytes) -> Optional[Tuple[int, int, int, int, Optional[bytes]]]:
+        # A consistent (state, flags, expires_at, cached_until, url) for the
+        # slot, with url only read when the slot holds `key`; None if a writer
+        # kept it busy for every retry.
+        buf = self._buf
+        code_start = offset + SLOT.size
+        url_start = code_start + CODE_MAX
+        for _ in range(READ_RETRIES):
+            seq, checksum, state, flags, code_length, url_length, expires_at, cached_until = SLOT.unpack_from(buf, offset)
+            if seq & 1:
+                self.retries += 1
+                continue
+            if state == EMPTY or state == DELETED or code_length != len(key) or buf[code_start:code_start + code_length] != key:
+                payload = None
+            else:
+                payload = bytes(buf[url_start:url_start + url_length])
+                if _checksum(state, flags, expires_at, cached_until, key, payload) != checksum:
+                    self.retries += 1
+                    continue
+            if SEQ.unpack_from(buf, offset)[0] != seq:
+                self.retries += 1
+                continue
+            return state, flags, expires_at, cached_until, payload
+        return None
+
+    def get(self, short_code: str) -> Any:
+        # (url, expires_at, is_safe) for a cached link, None for a code cached
+        # as missing, MISSING when the table doesn't know.
+        key = short_code.encode()
+        now = get_current_timestamp()
+        for offset in self._probe(key):
+            slot = self._read_slot(offset, key)
+            if slot is None or slot[0] == EMPTY:
+                break
+            state, flags, expires_at, cached_until, payload = slot
+            if payload is None:
+                continue
+            if cached_until <= now:
+                break
+            self.hits += 1
+            if state == ABSENT:
+                return None
+            return payload.decode(), (None if expires_at == NO_EXPIRY else expires_at), bool(flags & SAFE)
+        self.misses += 1
+        return MISSING
+
+    def _write_slot(self, offset: int, state: int, flags: int, key: bytes, payload: bytes, expires_at: int, cached_until: int) -> None:
+        buf = self._buf
+        seq = SEQ.unpack_from(buf, offset)[0]
+        SEQ.pack_into(buf, offset, (seq + 1) & 0xFFFFFFFF)
+        code_start = offset + SLOT.size
+        url_start = code_start + CODE_MAX
+        buf[code_start:code_start + len(key)] = key
+        buf[url_start:url_start + len(payload)] = payload
+        checksum = _checksum(state, flags, expires_at, cached_until, key, payload)
+        SLOT.pack_into(buf, offset, (seq + 1) & 0xFFFFFFFF, checksum, state, flags, len(key), len(payload), expires_at, cached_until)
+        SEQ.pack_into(buf, offset, (seq + 2) & 0xFFFFFFFF)
+
+    def _find_slot(self, key: bytes, now: int) -> Tuple[int, bool]:
+        # Called under the writer lock: the slot holding `key`, else the first
+        # free or stale one in its window, else the one expiring soonest.
+        buf = self._buf
+        free = None
+        victim, victim_until = None, None
+        for offset in self._probe(key):
+            _, _, state, _, code_length, _, _, cached_until = SLOT.unpack_from(buf, offset)
+            code_start = offset + SLOT.size
+            if state == EMPTY:
+                return (free if free is not None else offset), False
+            if state != DELETED and code_length == len(key) and buf[code_start:code_start + code_length] == key:
+                return offset, False
+            if free is None and (state == DELETED or cached_until <= now):
+                free = offset
+            if victim_until is None or cached_until < victim_until:
+                victim, victim_until = offset, cached_until
+        if free is not None:
+            return free, False
+        return victim, True
+
+    def _store(
+        self, short_code: str, state: int, flags: int, payload: bytes, expires_at: int, ttl: float,
+        generation: Optional[int] = None
+    ) -> bool:
+        key = short_code.encode()
+        if len(key) > CODE_MAX or len(payload) > self.url_capacity:
+            self.oversize += 1
+            return False
+        now = get_current_timestamp()
+        cached_until = now + int(ttl * 1000)
+        if cached_until <= now:
+            self.delete(short_code)
+            return False
+        with self._lock, file_lock(self.lock_path):
+            if generation is not None and GENERATION.unpack_from(self._buf, self._generation_offset(key))[0] != generation:
+                # The code was created or invalidated since the caller read
+                # the store; what it saw is stale.
+                return True
+            offset, evicted = self._find_slot(key, now)
+            self._write_slot(offset, state, flags, key, payload, expires_at, cached_until)
+            if state == LINK:
+                self._bump(key)
+        if evicted:
+            self.evictions += 1
+        return True
+
+    def set(self, short_code: str, url: str, expires_at: Optional[int], is_safe: bool, ttl: float) -> bool:
+        return self._store(
+            short_code, LINK, SAFE if is_safe else 0, url.encode(),
+            NO_EXPIRY if expires_at is None else int(expires_at), ttl
+        )
+
+    def set_missing(self, short_code: str, ttl: float, generation: Optional[int] = None) -> bool:
+        # With the generation() taken before the read that missed, nothing is
+        # written if a create or invalidation got in between; that still
+        # counts as handled.
+        return self._store(short_code, ABSENT, 0, b'', NO_EXPIRY, ttl, generation)
+
+    def delete_many(self, short_codes: Iterable[str]) -> None:
+        keys = [code.encode() for code in short_codes]
+        buf = self._buf
+        with self._lock, file_lock(self.lock_path):
+            for key in keys:
+                self._bump(key)
+                for offset in self._probe(key):
+                    _, _, state, _, code_length, _, _, _ = SLOT.unpack_from(buf, offset)
+                    if state == EMPTY:
+                        break
+                    code_start = offset + SLOT.size
+                    if state != DELETED and code_length == len(key) and buf[code_start:code_start + code_length] == key:
+                        self._write_slot(offset, DELETED, 0, b'', b'', NO_EXPIRY, 0)
+                        break
+
+    def delete(self, short_code: str) -> None:
+        self.delete_many((short_code,))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "slots": self.slots,
+            "bytes": SLOTS_OFFSET + self.slots * self.slot_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "retries": self.retries,
+            "evictions": self.evictions,
+            "oversize": self.oversize
+        }
+
+    def close(self) -> None:
+        self._buf = None
+        self.segment.close()
+
+    def unlink(self) -> None:
+        # Owner only, once every worker is gone.
+        with _untracked():
+            try:
+                self.segment.unlink()
+            except FileNotFoundError:
+                pass
+        try:
+            os.remove(f"{self.lock_path}.lock")
+        except FileNotFoundError:
+            pass
@@ -1,4 +1,7 @@
+from array import array
+from collections import Counter
 from datetime import datetime, timezone
+from typing import List, Tuple
 
 def get_current_timestamp() -> int:
     return int(datetime.now(timezone.utc).timestamp() * 1000)
@@ -10,4 +13,69 @@ def add_days(timestamp: int, days: int) -> int:
     return timestamp + (days * 24 * 60 * 60 * 1000)
 
 def get_hour_boundary(timestamp: int) -> int:
-    return (timestamp // (60 * 60 * 1000)) * (60 * 60 * 1000)
\ No newline at end of file
+    return (timestamp // (60 * 60 * 1000)) * (60 * 60 * 1000)
+
+def get_day_boundary(timestamp: int) -> int:
+    return (timestamp // (24 * 60 * 60 * 1000)) * (24 * 60 * 60 * 1000)
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+WEEK_MS = 7 * DAY_MS
+# The epoch was a Thursday; weeks start on Monday, four days later.
+WEEK_OFFSET_MS = 4 * DAY_MS
+
+TIME_RANGE_UNITS = {
+    'm': MINUTE_MS,
+    'h': HOUR_MS,
+    'd': DAY_MS,
+    'w': WEEK_MS
+}
+
+BUCKET_SIZES = {
+    'hour': (HOUR_MS, 0),
+    'day': (DAY_MS, 0),
+    'week': (WEEK_MS, WEEK_OFFSET_MS)
+}
+
+def parse_time_range(value: str) -> int:
+    unit = TIME_RANGE_UNITS.get(value[-1:])
+    if unit is None or not value[:-1].isdigit():
+        raise ValueError(f"Invalid time range: {value}")
+    return int(value[:-1]) * unit
+
+def to_iso(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).isoformat()
+
+def _month_start(timestamp: int) -> int:
+    date = datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc)
+    return int(datetime(date.year, date.month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+def bucket_timestamps(timestamps: array, group_by: str) -> List[Tuple[int, int]]:
+    # Counts per bucket start, sorted. Uses NumPy over the int64 column when it
+    # is installed, and an equivalent pure-Python pass otherwise.
+    if not timestamps:
+        return []
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None:
+        values = np.frombuffer(timestamps, dtype=np.int64)
+        if group_by == 'month':
+            buckets = values.astype('datetime64[ms]').astype('datetime64[M]').astype('datetime64[ms]').astype(np.int64)
+        else:
+            size, offset = BUCKET_SIZES[group_by]
+            buckets = (values - offset) // size * size + offset
+        starts, counts = np.unique(buckets, return_counts=True)
+        return list(zip(starts.tolist(), counts.tolist()))
+
+    if group_by == 'month':
+        # Bucket by day first so calendar math only runs once per distinct day.
+        months: Counter = Counter()
+        for day, count in Counter(ts // DAY_MS * DAY_MS for ts in timestamps).items():
+            months[_month_start(day)] += count
+        return sorted(months.items())
+    size, offset = BUCKET_SIZES[group_by]
+    return sorted(Counter((ts - offset) // size * size + offset for ts in timestamps).items())
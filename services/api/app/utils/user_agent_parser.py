@@ -1,51 +1,91 @@
-from typing import Dict
-from app.utils.logger import logger
+import os
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List
+from app.utils.metrics import metrics, stats_collector
 
-def parse_user_agent(user_agent: str) -> Dict[str, str]:
-    logger.info("Parsing user agent string")
-    ua_lower = user_agent.lower()
-    device = detect_device(ua_lower)
-    browser = detect_browser(ua_lower)
-    os = detect_os(ua_lower)
+UA_CACHE_SIZE = int(os.environ.get('UA_CACHE_SIZE', '4096'))
 
-    logger.info(f"User agent parsed: {device}, {browser}, {os}")
-    return {
-        'device': device,
-        'browser': browser,
-        'os': os
-    }
+# Every keyword the rules below look at, matched in one pass. Alternation is
+# tried left to right, so longer keywords that share a prefix come first and
+# browser tokens like "crios"/"fxios" are consumed before a bare "ios".
+UA_TOKENS = (
+    'windows phone', 'windows', 'macintosh', 'mac os', 'macos',
+    'iphone', 'ipad', 'ipod', 'android', 'blackberry',
+    'tablet', 'mobile', 'linux', 'x11',
+    'edg', 'opr', 'opera', 'chrome', 'crios', 'firefox', 'fxios', 'safari', 'ios'
+)
+UA_PATTERN = re.compile('|'.join(re.escape(token) for token in UA_TOKENS))
 
-def detect_device(ua: str) -> str:
-    if any(keyword in ua for keyword in ['mobile', 'android', 'iphone', 'ipod', 'blackberry', 'windows phone']):
-        return 'mobile'
-    elif any(keyword in ua for keyword in ['ipad', 'tablet']):
+MOBILE_TOKENS = frozenset({'mobile', 'android', 'iphone', 'ipod', 'blackberry', 'windows phone'})
+DESKTOP_TOKENS = frozenset({'windows', 'macintosh', 'linux', 'x11'})
+
+def _tokens(user_agent: str) -> FrozenSet[str]:
+    return frozenset(UA_PATTERN.findall(user_agent.lower()))
+
+def _device(tokens: FrozenSet[str]) -> str:
+    # Tablets first: iPad UAs carry "Mobile", and Android tablets are the
+    # Android UAs without it.
+    if 'ipad' in tokens or 'tablet' in tokens or ('android' in tokens and 'mobile' not in tokens):
         return 'tablet'
-    elif any(keyword in ua for keyword in ['windows', 'macintosh', 'linux', 'x11']):
+    if tokens & MOBILE_TOKENS:
+        return 'mobile'
+    if tokens & DESKTOP_TOKENS:
         return 'desktop'
     return 'unknown'
 
-def detect_browser(ua: str) -> str:
-    if 'edg' in ua:
+def _browser(tokens: FrozenSet[str]) -> str:
+    # Edge and Opera both also announce Chrome and Safari, so they go first.
+    if 'edg' in tokens:
         return 'Edge'
-    elif 'chrome' in ua and 'edg' not in ua:
+    if 'opr' in tokens or 'opera' in tokens:
+        return 'Opera'
+    if 'chrome' in tokens or 'crios' in tokens:
         return 'Chrome'
-    elif 'firefox' in ua:
+    if 'firefox' in tokens or 'fxios' in tokens:
         return 'Firefox'
-    elif 'safari' in ua and 'chrome' not in ua:
+    if 'safari' in tokens:
         return 'Safari'
-    elif 'opera' in ua or 'opr' in ua:
-        return 'Opera'
     return 'Unknown'
 
-def detect_os(ua: str) -> str:
-    if 'windows' in ua:
+def _os(tokens: FrozenSet[str]) -> str:
+    # iOS UAs say "like Mac OS X", and Android UAs say "Linux".
+    if 'windows' in tokens or 'windows phone' in tokens:
         return 'Windows'
-    elif 'mac os' in ua or 'macos' in ua:
+    if 'iphone' in tokens or 'ipad' in tokens or 'ipod' in tokens or 'ios' in tokens:
+        return 'iOS'
+    if 'android' in tokens:
+        return 'Android'
+    if 'mac os' in tokens or 'macos' in tokens:
         return 'macOS'
-    elif 'linux' in ua and 'android' not in ua:
+    if 'linux' in tokens:
         return 'Linux'
-    elif 'android' in ua:
-        return 'Android'
-    elif 'ios' in ua or 'iphone' in ua or 'ipad' in ua:
-        return 'iOS'
-    return 'Unknown'
\ No newline at end of file
+    return 'Unknown'
+
+@lru_cache(maxsize=UA_CACHE_SIZE)
+def parse_user_agent(user_agent: str) -> Dict[str, str]:
+    # Memoised on the raw string; callers must treat the result as read-only.
+    tokens = _tokens(user_agent)
+    return {
+        'device': _device(tokens),
+        'browser': _browser(tokens),
+        'os': _os(tokens)
+    }
+
+def parse_cache_stats() -> Dict[str, int]:
+    info = parse_user_agent.cache_info()
+    return {"size": info.currsize, "hits": info.hits, "misses": info.misses}
+
+metrics.register_collector(stats_collector('tinylinker_user_agent_cache', parse_cache_stats, "User agent parse cache"))
+
+def parse_many(user_agents: Iterable[str]) -> List[Dict[str, str]]:
+    return [parse_user_agent(user_agent) for user_agent in user_agents]
+
+def detect_device(ua: str) -> str:
+    return _device(_tokens(ua))
+
+def detect_browser(ua: str) -> str:
+    return _browser(_tokens(ua))
+
+def detect_os(ua: str) -> str:
+    return _os(_tokens(ua))
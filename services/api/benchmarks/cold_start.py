@@ -0,0 +1,127 @@
+"""Cold-start benchmark for the Lambda handler.
+
+Each sample runs in a fresh interpreter, the way a new Lambda container does:
+
+* import time of ``app.main``, parsed from ``python -X importtime``;
+* time to first response: importing ``app.main`` and serving one API Gateway
+  proxy event through ``handler`` (``/health`` by default, so no AWS calls).
+
+Results are printed as JSON. ``--max-import-ms`` / ``--max-first-response-ms``
+turn it into a regression gate: the script exits non-zero when the median of
+either measurement exceeds its budget.
+
+    python benchmarks/cold_start.py --runs 5 --max-import-ms 600
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+API_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_RESPONSE_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from app.main import handler
+imported = time.perf_counter()
+event = {
+    "resource": "/{proxy+}", "path": sys.argv[1], "httpMethod": "GET",
+    "headers": {"user-agent": "cold-start-benchmark"}, "multiValueHeaders": {},
+    "queryStringParameters": None, "multiValueQueryStringParameters": None,
+    "pathParameters": {"proxy": sys.argv[1].lstrip("/")}, "stageVariables": None,
+    "requestContext": {"resourcePath": "/{proxy+}", "httpMethod": "GET", "path": sys.argv[1],
+                       "stage": "bench", "identity": {"sourceIp": "127.0.0.1"}, "requestId": "bench"},
+    "body": None, "isBase64Encoded": False,
+}
+response = handler(event, None)
+done = time.perf_counter()
+print(json.dumps({
+    "status": response["statusCode"],
+    "import_ms": (imported - start) * 1000,
+    "first_response_ms": (done - start) * 1000,
+}))
+"""
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    env["PYTHONPATH"] = API_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+def measure_importtime(top: int):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        cwd=API_ROOT, env=_env(), capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace("import time:", "|", 1).split("|")]
+        if not self_us.isdigit():
+            continue
+        modules.append((name, int(self_us), int(cumulative_us)))
+
+    total_us = next((cumulative for name, _, cumulative in modules if name == "app.main"), 0)
+    heaviest = sorted(modules, key=lambda module: module[1], reverse=True)[:top]
+    return total_us / 1000, [
+        {"module": name, "self_ms": self_us / 1000, "cumulative_ms": cumulative_us / 1000}
+        for name, self_us, cumulative_us in heaviest
+    ]
+
+def measure_first_response(path: str):
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_RESPONSE_SCRIPT, path],
+        cwd=API_ROOT, env=_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--top", type=int, default=15, help="heaviest modules to report")
+    parser.add_argument("--max-import-ms", type=float)
+    parser.add_argument("--max-first-response-ms", type=float)
+    args = parser.parse_args()
+
+    import_samples = []
+    first_response_samples = []
+    heaviest = []
+    for _ in range(args.runs):
+        total_ms, heaviest = measure_importtime(args.top)
+        import_samples.append(total_ms)
+        first_response_samples.append(measure_first_response(args.path)["first_response_ms"])
+
+    report = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "path": args.path,
+        "import_ms": {
+            "median": statistics.median(import_samples),
+            "min": min(import_samples),
+            "max": max(import_samples)
+        },
+        "first_response_ms": {
+            "median": statistics.median(first_response_samples),
+            "min": min(first_response_samples),
+            "max": max(first_response_samples)
+        },
+        "heaviest_imports": heaviest
+    }
+
+    failures = []
+    if args.max_import_ms is not None and report["import_ms"]["median"] > args.max_import_ms:
+        failures.append(f"import time {report['import_ms']['median']:.1f}ms > {args.max_import_ms}ms")
+    if args.max_first_response_ms is not None and report["first_response_ms"]["median"] > args.max_first_response_ms:
+        failures.append(f"first response {report['first_response_ms']['median']:.1f}ms > {args.max_first_response_ms}ms")
+    report["failures"] = failures
+
+    print(json.dumps(report, indent=2))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+"""Endpoint latency and throughput benchmark.
+
+Drives the FastAPI app in-process through httpx's ASGI transport. There is no
+network, AWS or real geolocation involved:
+
+* storage is the in-memory backend (``STORAGE_BACKEND=memory``);
+* geolocation goes through a stub provider with optional simulated latency;
+* rate limiting is off, so the numbers measure the request path itself.
+
+The benchmark seeds ``--links`` short links plus ``--seed-clicks`` clicks spread
+over them. It then runs each endpoint at every ``--concurrency`` level. Link
+popularity is either uniform or Zipfian: a few hot links take most of the
+traffic, which is what the caches see in production. Creates don't pick
+links, so ``shorten`` runs once per concurrency level.
+
+Results are printed as JSON. ``--baseline`` compares against an earlier
+report; the script exits non-zero when any scenario's p95 regresses by more
+than ``--max-regression``, or when a p99 exceeds ``--max-p99-ms``.
+
+    python benchmarks/endpoints.py --concurrency 1,16,64 --requests 2000 > run.json
+    python benchmarks/endpoints.py --baseline run.json --max-regression 0.2
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+API_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_ROOT)
+
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ.setdefault("GEO_REMOTE_PROVIDER", "none")
+os.environ.setdefault("ENVIRONMENT", "benchmark")
+
+ENDPOINTS = ("redirect", "shorten", "preview", "analytics")
+DISTRIBUTIONS = ("uniform", "zipf")
+CLIENT_IPS = 64
+USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_0) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36",
+)
+COUNTRIES = ("US", "DE", "IN", "BR", "GB", "FR", "JP")
+
+class StubGeoProvider:
+    # Stands in for ip-api: a deterministic country per IP after a fixed delay.
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+
+    async def lookup(self, ip: str) -> Dict[str, str]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        country = COUNTRIES[hashlib.blake2b(ip.encode(), digest_size=1).digest()[0] % len(COUNTRIES)]
+        return {"country": country, "region": "Unknown", "city": "Unknown"}
+
+    async def aclose(self) -> None:
+        pass
+
+class LinkPicker:
+    def __init__(self, codes: List[str], distribution: str, zipf_s: float, rng: random.Random):
+        self.codes = codes
+        self.rng = rng
+        self.cumulative: Optional[List[float]] = None
+        if distribution == "zipf":
+            # Rank k gets weight 1/k^s.
+            self.cumulative = list(itertools.accumulate(1 / (rank ** zipf_s) for rank in range(1, len(codes) + 1)))
+
+    def pick(self) -> str:
+        if self.cumulative is None:
+            return self.codes[self.rng.randrange(len(self.codes))]
+        return self.codes[bisect_left(self.cumulative, self.rng.random() * self.cumulative[-1])]
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def build_clients(app):
+    import httpx
+    clients = []
+    for i in range(CLIENT_IPS):
+        # Public addresses, so clicks exercise the (stubbed) geolocation path.
+        ip = f"8.{(i * 37) % 256}.{(i * 101) % 256}.{i + 1}"
+        transport = httpx.ASGITransport(app=app, client=(ip, 40000 + i))
+        clients.append(httpx.AsyncClient(transport=transport, base_url="http://bench"))
+    return clients
+
+def make_request(endpoint: str, client, picker: Optional[LinkPicker], sequence: int):
+    user_agent = USER_AGENTS[sequence % len(USER_AGENTS)]
+    if endpoint == "redirect":
+        return client.get(f"/{picker.pick()}", headers={"user-agent": user_agent})
+    if endpoint == "preview":
+        return client.get(f"/preview/{picker.pick()}")
+    if endpoint == "analytics":
+        return client.get(f"/analytics/{picker.pick()}")
+    return client.post("/shorten", json={"url": f"https://example.com/bench/{sequence}"})
+
+async def run_scenario(endpoint: str, clients, picker: Optional[LinkPicker], concurrency: int, requests: int) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = itertools.count()
+
+    async def worker(worker_id: int) -> None:
+        nonlocal errors
+        client = clients[worker_id % len(clients)]
+        while True:
+            sequence = next(counter)
+            if sequence >= requests:
+                return
+            start = time.perf_counter()
+            response = await make_request(endpoint, client, picker, sequence)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "mean": statistics.fmean(latencies) if latencies else 0.0,
+            "max": latencies[-1] if latencies else 0.0
+        }
+    }
+
+async def run(args) -> Dict:
+    from app.main import app
+    from app.services.click_pipeline import click_pipeline
+    from app.utils import geolocation
+    from app.utils.geolocation import Geolocator
+
+    logging.getLogger("tinylinker").setLevel(logging.WARNING)
+    geolocation._geolocator = Geolocator(remote=StubGeoProvider(args.geo_latency_ms))
+    rng = random.Random(args.seed)
+    clients = build_clients(app)
+
+    codes: List[str] = []
+    for start in range(0, args.links, 1000):
+        batch = [{"url": f"https://example.com/seed/{i}"} for i in range(start, min(args.links, start + 1000))]
+        response = await clients[0].post("/shorten/batch", json=batch)
+        codes.extend(result["result"]["shortCode"] for result in response.json()["results"] if result["status"] == 201)
+
+    # Clicks follow the Zipf curve, so hot links carry deep analytics histories.
+    seed_picker = LinkPicker(codes, "zipf", args.zipf_s, rng)
+    await run_scenario("redirect", clients, seed_picker, 32, args.seed_clicks)
+    await click_pipeline.flush()
+
+    results = []
+    for endpoint in args.endpoints:
+        for distribution in (args.distributions if endpoint != "shorten" else ("n/a",)):
+            picker = LinkPicker(codes, distribution, args.zipf_s, rng) if endpoint != "shorten" else None
+            for concurrency in args.concurrency:
+                result = await run_scenario(endpoint, clients, picker, concurrency, args.requests)
+                await click_pipeline.flush()
+                results.append({
+                    "endpoint": endpoint,
+                    "distribution": distribution,
+                    "concurrency": concurrency,
+                    **result
+                })
+
+    for client in clients:
+        await client.aclose()
+    return {
+        "python": sys.version.split()[0],
+        "config": {
+            "links": len(codes),
+            "seed_clicks": args.seed_clicks,
+            "requests": args.requests,
+            "zipf_s": args.zipf_s,
+            "geo_latency_ms": args.geo_latency_ms,
+            "seed": args.seed
+        },
+        "results": results
+    }
+
+def scenario_key(result: Dict) -> str:
+    return f"{result['endpoint']}/{result['distribution']}/{result['concurrency']}"
+
+def check(report: Dict, baseline: Optional[Dict], max_regression: Optional[float], max_p99_ms: Optional[float]) -> List[str]:
+    failures = []
+    previous = {scenario_key(result): result for result in (baseline or {}).get("results", [])}
+    for result in report["results"]:
+        key = scenario_key(result)
+        p95 = result["latency_ms"]["p95"]
+        if max_p99_ms is not None and result["latency_ms"]["p99"] > max_p99_ms:
+            failures.append(f"{key}: p99 {result['latency_ms']['p99']:.2f}ms > {max_p99_ms}ms")
+        if max_regression is not None and key in previous:
+            before = previous[key]["latency_ms"]["p95"]
+            if before and p95 > before * (1 + max_regression):
+                failures.append(f"{key}: p95 {p95:.2f}ms vs baseline {before:.2f}ms")
+        if result["errors"]:
+            failures.append(f"{key}: {result['errors']} error responses")
+    return failures
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--distributions", default=",".join(DISTRIBUTIONS))
+    parser.add_argument("--concurrency", default="1,16,64")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--links", type=int, default=10000)
+    parser.add_argument("--seed-clicks", type=int, default=20000)
+    parser.add_argument("--zipf-s", type=float, default=1.1)
+    parser.add_argument("--geo-latency-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed p95 growth vs baseline")
+    parser.add_argument("--max-p99-ms", type=float)
+    args = parser.parse_args()
+    args.endpoints = [name for name in args.endpoints.split(",") if name]
+    args.distributions = [name for name in args.distributions.split(",") if name]
+    args.concurrency = [int(level) for level in args.concurrency.split(",") if level]
+    unknown = set(args.endpoints) - set(ENDPOINTS) | set(args.distributions) - set(DISTRIBUTIONS)
+    if unknown:
+        parser.error(f"unknown endpoints/distributions: {', '.join(sorted(unknown))}")
+
+    report = asyncio.run(run(args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    report["failures"] = check(report, baseline, args.max_regression if baseline else None, args.max_p99_ms)
+
+    print(json.dumps(report, indent=2))
+    return 1 if report["failures"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
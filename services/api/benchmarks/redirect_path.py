@@ -0,0 +1,175 @@
+"""Microbenchmark for the redirect fast path.
+
+Compares the per-request work the redirect and JSON endpoints used to do with
+what they do now, one operation at a time:
+
+* ``record``: turning a stored item into the cached record. Before, a full
+  ``ShortUrl`` (pydantic validation on every cache miss); now a ``ResolvedLink``
+  built straight from the item, validation having happened at write time.
+* ``redirect_response``: building the 307. Before, ``RedirectResponse`` (URL
+  quoting and header encoding per request); now ``PrebuiltRedirectResponse``
+  with the Location value encoded once per cached link.
+* ``json_render``: rendering an analytics-shaped body with ``JSONResponse``
+  versus ``ORJSONResponse``.
+
+``cached_record`` reports the memory each cache entry holds. ``asgi_redirect``
+drives a cache-hit redirect through the whole app in-process (memory storage,
+no network) as the end-to-end figure.
+
+CPU time is ``time.process_time`` per operation; allocation is the tracemalloc
+peak per operation, measured in a separate pass so tracing doesn't skew the
+timings. Results are printed as JSON.
+
+    python benchmarks/redirect_path.py --iterations 20000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+API_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_ROOT)
+
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["METRICS_ENABLED"] = "false"
+os.environ.setdefault("GEO_REMOTE_PROVIDER", "none")
+os.environ.setdefault("ENVIRONMENT", "benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+ITEM = {
+    "shortCode": "aB3xY9z",
+    "originalUrl": "https://example.com/articles/2024/how-we-cut-redirect-latency?utm_source=newsletter&utm_medium=email",
+    "userId": "user-1234",
+    "createdAt": 1718000000000,
+    "expiresAt": 4102444800000,
+    "clickCount": 1523,
+    "customAlias": False,
+    "isSafe": True
+}
+
+def analytics_payload() -> Dict[str, Any]:
+    return {
+        "shortCode": ITEM["shortCode"],
+        "totalClicks": 1523,
+        "uniqueVisitors": 977,
+        "countries": {f"C{i:02d}": 100 - i for i in range(40)},
+        "devices": {"mobile": 801, "desktop": 655, "tablet": 67},
+        "browsers": {"Chrome": 900, "Safari": 400, "Firefox": 150, "Edge": 73},
+        "referrers": {f"https://ref{i}.example.com/": 50 - i for i in range(25)},
+        "timeSeries": [{"timestamp": 1718000000000 + i * 3600000, "clicks": i % 17} for i in range(168)]
+    }
+
+def cpu_per_op(operation: Callable[[], Any], iterations: int) -> float:
+    gc.collect()
+    start = time.process_time()
+    for _ in range(iterations):
+        operation()
+    return (time.process_time() - start) / iterations * 1e6
+
+def peak_bytes_per_op(operation: Callable[[], Any], iterations: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    total = 0
+    for _ in range(iterations):
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        operation()
+        total += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return total / iterations
+
+def measure(operation: Callable[[], Any], iterations: int) -> Dict[str, float]:
+    for _ in range(min(iterations, 1000)):
+        operation()
+    return {
+        "cpu_us": cpu_per_op(operation, iterations),
+        "peak_bytes": peak_bytes_per_op(operation, max(1, iterations // 10))
+    }
+
+def compare(before: Callable[[], Any], after: Callable[[], Any], iterations: int) -> Dict[str, Any]:
+    result = {"before": measure(before, iterations), "after": measure(after, iterations)}
+    result["cpu_speedup"] = result["before"]["cpu_us"] / result["after"]["cpu_us"] if result["after"]["cpu_us"] else None
+    return result
+
+def retained_bytes(factory: Callable[[], Any], count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    records: List[Any] = [factory() for _ in range(count)]
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del records
+    return retained / count
+
+async def asgi_redirect(app, short_code: str, iterations: int) -> Dict[str, float]:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": f"/{short_code}", "raw_path": f"/{short_code}".encode(),
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"bench"), (b"user-agent", b"redirect-bench")],
+        "client": ("8.8.8.8", 40000), "server": ("bench", 80)
+    }
+    statuses: List[int] = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    async def run(count: int) -> None:
+        for _ in range(count):
+            await app(dict(scope), receive, send)
+
+    await run(min(iterations, 1000))
+    gc.collect()
+    start = time.process_time()
+    await run(iterations)
+    cpu_us = (time.process_time() - start) / iterations * 1e6
+    if any(status != 307 for status in statuses):
+        raise RuntimeError(f"unexpected redirect statuses: {sorted(set(statuses))}")
+    return {"cpu_us": cpu_us}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--cached-records", type=int, default=10000)
+    args = parser.parse_args()
+
+    from fastapi.responses import JSONResponse, ORJSONResponse, RedirectResponse
+    from app.models.database import ResolvedLink, ShortUrl
+    from app.utils.http_responses import PrebuiltRedirectResponse
+
+    link = ResolvedLink.from_item(ITEM)
+    payload = analytics_payload()
+    report: Dict[str, Any] = {
+        "iterations": args.iterations,
+        "record": compare(lambda: ShortUrl(**ITEM), lambda: ResolvedLink.from_item(ITEM), args.iterations),
+        "redirect_response": compare(
+            lambda: RedirectResponse(url=ITEM["originalUrl"], status_code=307),
+            lambda: PrebuiltRedirectResponse(link.location),
+            args.iterations
+        ),
+        "json_render": compare(lambda: JSONResponse(payload), lambda: ORJSONResponse(payload), args.iterations),
+        "cached_record": {
+            "before_bytes": retained_bytes(lambda: ShortUrl(**dict(ITEM)), args.cached_records),
+            "after_bytes": retained_bytes(lambda: ResolvedLink.from_item(dict(ITEM)), args.cached_records)
+        }
+    }
+
+    from app.main import app
+    from app.services.url_service import storage
+    storage.put_url_if_absent(dict(ITEM))
+    report["asgi_redirect"] = asyncio.run(asgi_redirect(app, ITEM["shortCode"], args.iterations))
+
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
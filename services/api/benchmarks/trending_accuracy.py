@@ -0,0 +1,186 @@
+"""Accuracy check for the trending sketches.
+
+Feeds a synthetic click stream to ``TrendingTracker`` and, at
+``--evaluations`` points along the way, compares every window's answer with
+exact counts computed on the side. Link popularity is
+Zipfian (``--zipf-s``) and shifts every ``--shift-minutes``, so the hot set
+changes over the day the way trending links do.
+
+At every evaluation point it checks the documented bounds for each window:
+
+* each reported ``clicks`` is >= the true count and <= true + ``errorBound``;
+* ``errorBound`` <= N / capacity;
+* ``minClicks`` <= the true count;
+* every link with more than ``errorBound`` clicks that belongs in the top
+  ``--top`` is reported (recall of the true top list);
+* the fraction of reported links over true + epsilon * N stays within delta.
+
+It also writes a checkpoint, restores it in a fresh tracker as a restarted
+process would, and checks that the answers are unchanged.
+
+Results are printed as JSON; the script exits non-zero when a guaranteed bound
+is violated.
+
+    python benchmarks/trending_accuracy.py --clicks 200000 --links 50000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+API_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_ROOT)
+
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ.setdefault("ENVIRONMENT", "benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+def zipf_cdf(n: int, s: float) -> List[float]:
+    weights = [1 / (rank ** s) for rank in range(1, n + 1)]
+    total = sum(weights)
+    cdf, running = [], 0.0
+    for weight in weights:
+        running += weight / total
+        cdf.append(running)
+    return cdf
+
+def exact_window(timestamps: List[int], clicks: List[tuple], first: int, fed: int) -> Counter:
+    return Counter(code for _, code in clicks[bisect_left(timestamps, first):fed])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clicks", type=int, default=200000)
+    parser.add_argument("--links", type=int, default=50000)
+    parser.add_argument("--hours", type=float, default=26, help="length of the simulated stream")
+    parser.add_argument("--zipf-s", type=float, default=1.1)
+    parser.add_argument("--shift-minutes", type=int, default=90, help="how often the popular links change")
+    parser.add_argument("--epsilon", type=float, default=0.002)
+    parser.add_argument("--delta", type=float, default=0.01)
+    parser.add_argument("--capacity", type=int, default=200)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--evaluations", type=int, default=8, help="evaluation points per window")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from app.services.trending import WINDOWS, TrendingTracker
+    from app.utils.time_utils import MINUTE_MS
+
+    rng = random.Random(args.seed)
+    cdf = zipf_cdf(args.links, args.zipf_s)
+    start = 1_700_000_000_000
+    span = int(args.hours * 60 * MINUTE_MS)
+    timestamps = sorted(start + rng.randrange(span) for _ in range(args.clicks))
+    clicks = []
+    for timestamp in timestamps:
+        rank = min(bisect_left(cdf, rng.random()), args.links - 1)
+        # Rotating ranks moves the hot set every shift period.
+        shift = (timestamp - start) // (args.shift_minutes * MINUTE_MS)
+        clicks.append((timestamp, f"link{(rank + shift * 7919) % args.links}"))
+
+    checkpoint_dir = tempfile.mkdtemp(prefix="trending-accuracy-")
+    tracker = TrendingTracker(args.epsilon, args.delta, args.capacity, checkpoint_dir=None, checkpoint_interval=0)
+    failures: List[str] = []
+    stats = {window: defaultdict(float) for window in WINDOWS}
+    query_ms = {window: [] for window in WINDOWS}
+    longest = max(size * count for size, count in WINDOWS.values())
+    # Evaluation points start once the longest window is full.
+    first_point = start + longest
+    step = max(1, (timestamps[-1] - first_point) // args.evaluations)
+    points = [first_point + step * (i + 1) for i in range(args.evaluations)]
+    add_seconds = 0.0
+
+    def evaluate(now: int, fed: int) -> None:
+        for window in WINDOWS:
+            began = time.perf_counter()
+            result = tracker.top(window, args.top, now=now)
+            query_ms[window].append((time.perf_counter() - began) * 1000)
+            window_stats = stats[window]
+            exact = exact_window(timestamps, clicks, result["from"], fed)
+            total = sum(exact.values())
+            bound = result["errorBound"]
+            window_stats["evaluations"] += 1
+            if result["totalClicks"] != total:
+                failures.append(f"{window}@{now}: totalClicks {result['totalClicks']} != {total}")
+            if bound > total / args.capacity:
+                failures.append(f"{window}@{now}: errorBound {bound} > N / capacity {total / args.capacity:.1f}")
+            for link in result["links"]:
+                true = exact[link["shortCode"]]
+                if not true <= link["clicks"] <= true + bound:
+                    failures.append(f"{window}@{now}: {link['shortCode']} clicks {link['clicks']} outside [{true}, {true + bound}]")
+                if link["minClicks"] > true:
+                    failures.append(f"{window}@{now}: {link['shortCode']} minClicks {link['minClicks']} > {true}")
+                if link["clicks"] > true + args.epsilon * total:
+                    window_stats["over_epsilon"] += 1
+                window_stats["reported"] += 1
+                window_stats["max_overcount"] = max(window_stats["max_overcount"], link["clicks"] - true)
+            reported = {link["shortCode"] for link in result["links"]}
+            true_top = exact.most_common(args.top)
+            cutoff = true_top[-1][1] if len(true_top) == args.top else 0
+            for code, true in true_top:
+                # Only links clear of the cut-off by more than the bound are
+                # guaranteed a place; ties and near-ties may swap.
+                if true > cutoff + bound and code not in reported:
+                    failures.append(f"{window}@{now}: {code} with {true} clicks missing from the top {args.top}")
+            window_stats["recall"] += len(reported & {code for code, _ in true_top}) / max(1, len(true_top))
+            window_stats["bound_fraction"] = max(window_stats["bound_fraction"], bound / total if total else 0.0)
+
+    for fed, (timestamp, code) in enumerate(clicks, 1):
+        began = time.perf_counter()
+        tracker.add(code, timestamp)
+        add_seconds += time.perf_counter() - began
+        # Evaluate on the last click before each point, with everything up to
+        # then fed and nothing after.
+        following = clicks[fed][0] if fed < len(clicks) else None
+        if points and (following is None or following > points[0]):
+            while points and (following is None or following > points[0]):
+                points.pop(0)
+            evaluate(timestamp, fed)
+    now = timestamps[-1]
+
+    report: Dict = {
+        "clicks": args.clicks,
+        "links": args.links,
+        "width": tracker.width,
+        "depth": tracker.depth,
+        "capacity": args.capacity,
+        "add_us": add_seconds / len(clicks) * 1e6,
+        "windows": {}
+    }
+    for window, window_stats in stats.items():
+        evaluations = window_stats["evaluations"] or 1
+        window_stats["recall"] /= evaluations
+        window_stats["over_epsilon_rate"] = window_stats["over_epsilon"] / window_stats["reported"] if window_stats["reported"] else 0.0
+        window_stats["query_ms_max"] = max(query_ms[window]) if query_ms[window] else 0.0
+        if window_stats["over_epsilon_rate"] > args.delta:
+            failures.append(f"{window}: {window_stats['over_epsilon_rate']:.3f} of estimates over epsilon * N (delta {args.delta})")
+        report["windows"][window] = dict(window_stats)
+
+    # Checkpoint round trip: a restarted tracker adopts the file and answers
+    # the same.
+    tracker.checkpoint_dir = checkpoint_dir
+    if not tracker.checkpoint():
+        failures.append("checkpoint failed")
+    restarted = TrendingTracker(args.epsilon, args.delta, args.capacity, checkpoint_dir=checkpoint_dir, checkpoint_interval=60)
+    # Its own file, so it's only adopted as the leftover of an earlier run.
+    restarted.restore()
+    for window in WINDOWS:
+        answer = tracker.top(window, args.top, now=now)
+        again = restarted.top(window, args.top, now=now)
+        if again["links"] != answer["links"] or again["totalClicks"] != answer["totalClicks"]:
+            failures.append(f"{window}: answer changed after restoring the checkpoint")
+    report["checkpoint"] = {"adopted": restarted.adopted, "files_left": len([name for name in os.listdir(checkpoint_dir) if name.endswith(".bin")])}
+    if restarted.adopted != 1:
+        failures.append(f"expected one adopted checkpoint, got {restarted.adopted}")
+
+    report["failures"] = failures
+    print(json.dumps(report, indent=2))
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
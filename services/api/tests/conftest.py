@@ -0,0 +1,9 @@
+import os
+import sys
+
+# Tests run against the in-memory backends; nothing here talks to AWS.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('STORAGE_BACKEND', 'memory')
+os.environ.setdefault('ENVIRONMENT', 'test')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('GEO_REMOTE_PROVIDER', 'none')
@@ -0,0 +1,49 @@
+from app.services.analytics_rollups import RollupAggregator, rollup_key
+from app.storage.memory import MemoryStorage
+from app.utils.time_utils import DAY_MS, HOUR_MS
+
+DAY = 1_700_006_400_000 // DAY_MS * DAY_MS
+
+def click(timestamp, country="US"):
+    return {
+        "shortCode": "abc", "timestamp": timestamp, "country": country, "city": "x",
+        "device": "desktop", "browser": "Firefox", "os": "Linux", "referrer": "direct"
+    }
+
+class FlakyStorage(MemoryStorage):
+    def __init__(self):
+        super().__init__()
+        self.down = True
+
+    def add_event_counters(self, *args):
+        if self.down:
+            raise TimeoutError("read timed out")
+        return super().add_event_counters(*args)
+
+    def put_event_if_newer(self, *args):
+        if self.down:
+            raise TimeoutError("read timed out")
+        return super().put_event_if_newer(*args)
+
+def test_rollups_are_one_item_per_day():
+    storage = MemoryStorage()
+    aggregator = RollupAggregator(storage)
+    for hour in range(48):
+        aggregator.add(click(DAY + hour * HOUR_MS))
+    aggregator.flush()
+    items = [item for page in storage.iter_event_pages(rollup_key("abc")) for item in page]
+    assert [(item["timestamp"], item["clicks"]) for item in items] == [(DAY, 24), (DAY + DAY_MS, 24)]
+
+def test_failed_writes_are_retried_on_the_next_flush():
+    storage = FlakyStorage()
+    aggregator = RollupAggregator(storage)
+    aggregator.add(click(DAY, "US"))
+    aggregator.add(click(DAY + DAY_MS, "DE"))
+    assert aggregator.flush() == {"updates": 0, "failed": 3}
+    assert aggregator.stats()["pending"] == 2
+
+    storage.down = False
+    assert aggregator.flush() == {"updates": 3, "failed": 0}
+    items = [item for page in storage.iter_event_pages(rollup_key("abc")) for item in page]
+    assert sum(item["clicks"] for item in items) == 2
+    assert len(storage.get_event("abc#recent", 0)["clicks"]) == 2
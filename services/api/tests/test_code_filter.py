@@ -0,0 +1,30 @@
+import time
+from app.services.code_filter import CodeFilter
+from app.storage.memory import MemoryStorage
+
+def put(storage, short_code):
+    assert storage.put_url_if_absent({"shortCode": short_code, "originalUrl": "https://example.com", "userId": "u", "createdAt": 1})
+
+def loaded(storage, path, max_age):
+    code_filter = CodeFilter(storage, mode="authoritative", path=path, capacity=1000, fp_rate=0.001, max_age=max_age)
+    code_filter.start()
+    code_filter._loader.join()
+    return code_filter
+
+def test_stale_snapshot_is_rebuilt(tmp_path):
+    storage = MemoryStorage()
+    put(storage, "first1")
+    path = str(tmp_path / "codes.bloom")
+    loaded(storage, path, max_age=0).filter.close()
+    # Created by another writer while nothing had the snapshot open.
+    put(storage, "second")
+
+    reused = loaded(storage, path, max_age=0)
+    assert reused.definitely_absent("second")
+    reused.filter.close()
+
+    time.sleep(0.02)
+    rebuilt = loaded(storage, path, max_age=0.01)
+    assert not rebuilt.definitely_absent("second")
+    assert not rebuilt.definitely_absent("first1")
+    assert rebuilt.definitely_absent("never1")
@@ -0,0 +1,39 @@
+from app.utils.dynamodb_client import BATCH_WRITE_SIZE, BatchWriter, CounterAggregator
+
+def test_counter_flush_keeps_deltas_that_raise():
+    calls = []
+
+    def apply(key, amount, timestamp):
+        calls.append(key)
+        if key == "b":
+            raise TimeoutError("read timed out")
+        return True
+
+    aggregator = CounterAggregator(apply)
+    for key in ("a", "b", "b", "c"):
+        aggregator.add(key, 1, 100)
+
+    assert aggregator.flush() == {"updates": 2, "failed": 1}
+    assert calls == ["a", "b", "c"]
+    # The failed delta is retried whole and isn't counted as new clicks.
+    aggregator.apply = lambda key, amount, timestamp: calls.append((key, amount, timestamp)) or True
+    assert aggregator.flush() == {"updates": 1, "failed": 0}
+    assert calls[-1] == ("b", 2, 100)
+    assert aggregator.stats()["increments"] == 4
+
+def test_batch_writer_retries_and_drops_chunks_that_raise():
+    calls = []
+
+    def write_batch(items):
+        calls.append(len(items))
+        if items[0]["id"] < BATCH_WRITE_SIZE:
+            raise ConnectionError("endpoint unreachable")
+        return []
+
+    writer = BatchWriter(write_batch, ("id",), max_retries=2, base_backoff=0, max_backoff=0)
+    for i in range(BATCH_WRITE_SIZE + 5):
+        writer.add({"id": i})
+
+    # The first chunk fails every attempt; the second is still written.
+    assert writer.flush() == {"flushed": 5, "retried": 2 * BATCH_WRITE_SIZE, "dropped": BATCH_WRITE_SIZE}
+    assert calls == [BATCH_WRITE_SIZE] * 3 + [5]
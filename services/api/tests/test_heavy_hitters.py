@@ -0,0 +1,106 @@
+import random
+from collections import Counter
+from app.services.trending import WINDOWS, TrendingTracker
+from app.utils.heavy_hitters import CountMinSketch, SpaceSaving
+from app.utils.time_utils import HOUR_MS
+
+EPSILON = 0.01
+DELTA = 0.01
+CAPACITY = 50
+START = 1_700_000_000_000
+
+def zipf_stream(clicks=20000, keys=2000, seed=7):
+    rng = random.Random(seed)
+    weights = [1 / rank ** 1.1 for rank in range(1, keys + 1)]
+    return rng.choices([f"link{i}" for i in range(keys)], weights=weights, k=clicks)
+
+def test_count_min_never_undercounts_and_stays_within_epsilon():
+    stream = zipf_stream()
+    exact = Counter(stream)
+    sketch = CountMinSketch.for_error(EPSILON, DELTA)
+    for key in stream:
+        sketch.add(key)
+    assert sketch.epsilon <= EPSILON and sketch.delta <= DELTA
+    over = 0
+    for key, true in exact.items():
+        estimate = sketch.estimate(key)
+        assert estimate >= true
+        over += estimate > true + EPSILON * len(stream)
+    assert over / len(exact) <= DELTA
+
+def test_count_min_merge_matches_one_sketch():
+    stream = zipf_stream()
+    whole, first, second = (CountMinSketch.for_error(EPSILON, DELTA) for _ in range(3))
+    for i, key in enumerate(stream):
+        whole.add(key)
+        (first if i % 2 else second).add(key)
+    first.merge(second)
+    assert first.total == whole.total
+    assert list(first.counters) == list(whole.counters)
+
+def test_space_saving_bounds():
+    stream = zipf_stream()
+    exact = Counter(stream)
+    summary = SpaceSaving(CAPACITY)
+    for key in stream:
+        summary.add(key)
+    bound = len(stream) / CAPACITY
+    floor = summary.min_count()
+    assert floor <= bound
+    present = {key for key, _, _ in summary.entries()}
+    for key, count, error in summary.entries():
+        assert exact[key] <= count <= exact[key] + error
+        assert error <= bound
+    for key, true in exact.items():
+        if key not in present:
+            assert true <= floor
+        if true > bound:
+            assert key in present
+
+def tracked_stream():
+    # Two hours of clicks, so every window is full by the end.
+    rng = random.Random(11)
+    stream = zipf_stream(clicks=30000, keys=3000, seed=11)
+    timestamps = sorted(START + rng.randrange(2 * HOUR_MS) for _ in stream)
+    return list(zip(timestamps, stream))
+
+def check_window(result, clicks):
+    exact = Counter(code for timestamp, code in clicks if result["from"] <= timestamp <= result["to"])
+    total = sum(exact.values())
+    assert result["totalClicks"] == total
+    assert result["errorBound"] <= total / CAPACITY
+    for link in result["links"]:
+        true = exact[link["shortCode"]]
+        assert link["minClicks"] <= true <= link["clicks"] <= true + result["errorBound"]
+    reported = {link["shortCode"] for link in result["links"]}
+    top = exact.most_common(10)
+    for code, true in top:
+        if true > top[-1][1] + result["errorBound"]:
+            assert code in reported
+
+def test_tracker_windows_stay_within_bounds():
+    clicks = tracked_stream()
+    tracker = TrendingTracker(EPSILON, DELTA, CAPACITY, checkpoint_dir=None, checkpoint_interval=0)
+    for timestamp, code in clicks:
+        tracker.add(code, timestamp)
+    now = clicks[-1][0]
+    for window in WINDOWS:
+        check_window(tracker.top(window, 10, now=now), clicks)
+
+def test_checkpoint_round_trip(tmp_path):
+    clicks = tracked_stream()
+    tracker = TrendingTracker(EPSILON, DELTA, CAPACITY, checkpoint_dir=str(tmp_path), checkpoint_interval=60)
+    for timestamp, code in clicks:
+        tracker.add(code, timestamp)
+    assert tracker.checkpoint()
+
+    # A restarted process adopts the file and answers the same.
+    restarted = TrendingTracker(EPSILON, DELTA, CAPACITY, checkpoint_dir=str(tmp_path), checkpoint_interval=60)
+    restarted.restore()
+    assert restarted.adopted == 1
+    assert not list(tmp_path.glob("*.bin"))
+    now = clicks[-1][0]
+    for window in WINDOWS:
+        answer = restarted.top(window, 10, now=now)
+        assert answer == tracker.top(window, 10, now=now)
+        check_window(answer, clicks)
@@ -0,0 +1,153 @@
+import asyncio
+import re
+from fastapi.testclient import TestClient
+from app.storage.memory import MemoryStorage
+from app.utils.hashing import hash_string
+from starlette.requests import Request
+from app.utils.rate_limiter import RateLimiter, RateLimitMiddleware, RateLimitRule, charge_rate_limit
+
+NOW = 1_000_030.0
+
+class FlakyStorage(MemoryStorage):
+    def __init__(self, fail: bool = False, delay: float = 0.0):
+        super().__init__()
+        self.fail = fail
+        self.delay = delay
+        self.calls = 0
+
+    async def aacquire_rate_limit(self, *args):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("store down")
+        return self.acquire_rate_limit(*args)
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_instances_sharing_a_store_never_exceed_the_limit():
+    storage = MemoryStorage()
+    limiters = [RateLimiter(storage, window_seconds=60, lease_fraction=0.1) for _ in range(3)]
+
+    async def go():
+        return [(await limiters[i % 3].check("client", 25, now=NOW)).allowed for i in range(60)]
+
+    assert sum(run(go())) == 25
+
+def test_most_decisions_are_local():
+    storage = FlakyStorage()
+    limiter = RateLimiter(storage, window_seconds=60, lease_fraction=0.1)
+
+    async def go():
+        for _ in range(100):
+            await limiter.check("client", 100, now=NOW)
+
+    run(go())
+    assert storage.calls == 10
+
+def test_window_resets():
+    limiter = RateLimiter(MemoryStorage(), window_seconds=60)
+
+    async def go():
+        for _ in range(5):
+            await limiter.check("client", 5, now=NOW)
+        denied = await limiter.check("client", 5, now=NOW)
+        later = await limiter.check("client", 5, now=NOW + 60)
+        return denied, later
+
+    denied, later = run(go())
+    assert not denied.allowed
+    assert denied.retry_after(NOW) == 50
+    assert later.allowed and later.remaining == 4
+
+def test_charge_larger_than_what_is_left_takes_nothing():
+    limiter = RateLimiter(MemoryStorage(), window_seconds=60)
+
+    async def go():
+        first = await limiter.check("client", 10, now=NOW, cost=8)
+        too_big = await limiter.check("client", 10, now=NOW, cost=5)
+        rest = await limiter.check("client", 10, now=NOW, cost=2)
+        return first, too_big, rest
+
+    first, too_big, rest = run(go())
+    assert first.allowed and first.remaining == 2
+    assert not too_big.allowed and too_big.remaining == 2
+    assert rest.allowed and rest.remaining == 0
+
+def test_charge_over_the_limit_is_refused():
+    # Even with the store down, where smaller charges fail open.
+    storage = FlakyStorage(fail=True)
+    limiter = RateLimiter(storage, window_seconds=60)
+    decision = run(limiter.check("client", 10, now=NOW, cost=11))
+    assert not decision.allowed and decision.remaining == 10
+    assert storage.calls == 0
+    assert MemoryStorage().acquire_rate_limit("client", 0, 11, 10, 0) is None
+
+def test_store_errors_fail_open_and_back_off():
+    storage = FlakyStorage(fail=True)
+    limiter = RateLimiter(storage, window_seconds=60, lease_fraction=0.1, error_backoff=5)
+
+    async def go(start):
+        return [(await limiter.check("client", 100, now=start + i * 0.01)).allowed for i in range(100)]
+
+    assert all(run(go(NOW)))
+    assert storage.calls == 1
+    assert limiter.stats()["storeErrors"] == 1
+    # Past the backoff the store is tried again.
+    run(go(NOW + 6))
+    assert storage.calls == 2
+
+def test_concurrent_requests_share_one_refill():
+    storage = FlakyStorage(delay=0.01)
+    limiter = RateLimiter(storage, window_seconds=60, lease_fraction=0.1)
+
+    async def go():
+        return await asyncio.gather(*[limiter.check("client", 100, now=NOW) for _ in range(30)])
+
+    assert all(decision.allowed for decision in run(go()))
+    assert storage.calls == 3
+
+async def ok_app(scope, receive, send):
+    await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'ok'})
+
+async def batch_app(scope, receive, send):
+    # Charges one token per link after the one the request paid for.
+    decision = await charge_rate_limit(Request(scope), int(scope['query_string'] or 1) - 1)
+    status = 200 if decision is None or decision.allowed else 429
+    await send({'type': 'http.response.start', 'status': status, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b''})
+
+def limited_client(api_key_hashes=frozenset(), app=ok_app):
+    rules = [RateLimitRule('create', ('POST',), re.compile(r'^/shorten$'), 5)]
+    limiter = RateLimiter(MemoryStorage(), window_seconds=60)
+    return TestClient(RateLimitMiddleware(app, limiter=limiter, rules=rules, api_key_hashes=api_key_hashes))
+
+def test_middleware_sets_headers_and_rejects():
+    client = limited_client()
+    responses = [client.post("/shorten") for _ in range(6)]
+    assert [response.status_code for response in responses] == [200] * 5 + [429]
+    assert responses[0].headers["x-ratelimit-limit"] == "5"
+    assert responses[0].headers["x-ratelimit-remaining"] == "4"
+    assert "retry-after" in responses[-1].headers
+    assert "x-ratelimit-limit" not in client.get("/other").headers
+
+def test_unknown_api_keys_share_the_ip_bucket():
+    client = limited_client(frozenset({hash_string("issued-key")}))
+    statuses = [client.post("/shorten", headers={"x-api-key": f"made-up-{i}"}).status_code for i in range(10)]
+    assert statuses.count(429) == 5
+    # An issued key gets a bucket of its own.
+    assert client.post("/shorten", headers={"x-api-key": "issued-key"}).status_code == 200
+
+def test_route_charges_only_retry_when_they_could_fit():
+    client = limited_client(app=batch_app)
+    # Bigger than the whole limit: refused without a Retry-After.
+    response = client.post("/shorten?6")
+    assert response.status_code == 429
+    assert "retry-after" not in response.headers
+    assert response.headers["x-ratelimit-remaining"] == "4"
+    assert client.post("/shorten?3").headers["x-ratelimit-remaining"] == "1"
+    # Would fit an empty window: worth retrying.
+    response = client.post("/shorten?3")
+    assert response.status_code == 429
+    assert "retry-after" in response.headers
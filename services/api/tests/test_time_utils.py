@@ -0,0 +1,15 @@
+import random
+import sys
+from array import array
+import pytest
+from app.utils.time_utils import BUCKET_SIZES, bucket_timestamps
+
+@pytest.mark.parametrize("group_by", sorted(BUCKET_SIZES) + ["month"])
+def test_numpy_and_pure_python_buckets_agree(group_by, monkeypatch):
+    pytest.importorskip("numpy")
+    rng = random.Random(3)
+    timestamps = array('q', sorted(rng.randrange(1_690_000_000_000, 1_720_000_000_000) for _ in range(5000)))
+    vectorized = bucket_timestamps(timestamps, group_by)
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    assert bucket_timestamps(timestamps, group_by) == vectorized
+    assert sum(count for _, count in vectorized) == len(timestamps)
@@ -0,0 +1,34 @@
+import asyncio
+import pytest
+from app.models.requests import CreateShortUrlRequest
+from app.services import url_service
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def test_previews_are_served_from_the_cache(monkeypatch):
+    created = run(url_service.create_short_url(CreateShortUrlRequest(url="https://example.com/preview")))
+    reads = []
+    read = url_service.storage.aget_url
+
+    async def counting_read(short_code):
+        reads.append(short_code)
+        return await read(short_code)
+
+    monkeypatch.setattr(url_service.storage, "aget_url", counting_read)
+    first = run(url_service.get_url_by_code(created.shortCode))
+    again = run(url_service.get_url_by_code(created.shortCode))
+    assert first.originalUrl == again.originalUrl == "https://example.com/preview"
+    assert len(reads) == 1
+
+    # Invalidating the link drops its preview too.
+    url_service._forget([created.shortCode])
+    run(url_service.get_url_by_code(created.shortCode))
+    assert len(reads) == 2
+
+def test_route_names_are_reserved_as_aliases():
+    for alias in ("trending", "Metrics", "health"):
+        with pytest.raises(ValueError, match="reserved"):
+            run(url_service.create_short_url(CreateShortUrlRequest(url="https://example.com", customAlias=alias)))
+    results = run(url_service.create_short_urls([(0, CreateShortUrlRequest(url="https://example.com", customAlias="shorten"))]))
+    assert [(result.status, result.error) for result in results] == [(400, "Custom alias 'shorten' is reserved")]